@@ -1,5 +1,6 @@
 import argparse
 import logging
+import signal
 import time
 import sys
 from lqmt.lqm.controller import LQMToolController
@@ -22,10 +23,12 @@ class LQMT(object):
     def __exit__(self, exc_type, exc_value, traceback):
         pass
 
-    def run(self, config=None):
+    def run(self, config=None, watch=False, interval=5):
         """
         Runs LQMT against user configuration.
         :param config: can supply directory path to user config directly here. Config file must be in toml format.
+        :param watch: If True, keep running and process new alert files as they arrive, until interrupted or terminated
+        :param interval: Maximum number of seconds between two checks for new alert files when watching
         """
         if config:
             self.user_config = config
@@ -42,7 +45,12 @@ class LQMT(object):
             sys.exit(1)
 
         try:
-            controller.run()
+            if watch:
+                # stop watching once the current batch is done, so the tools are committed and cleaned up
+                signal.signal(signal.SIGTERM, lambda signum, frame: controller.stop())
+                controller.watch(interval)
+            else:
+                controller.run()
 
         except Exception as e:
             if not LQMLogging.isDebug():
@@ -70,10 +78,17 @@ def main():
 
     parser = argparse.ArgumentParser(description="Parse CTI data and make it actionable in endpoint defense tools.")
     parser.add_argument('user_config_file', help='The path to the user configuration file. ')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and process new alert files as soon as they arrive in the source directories.')
+    parser.add_argument('--interval', type=float, default=5,
+                        help='Maximum number of seconds between two checks for new alert files in watch mode. '
+                             'Directories are polled at this interval where inotify is not available. (default: 5)')
     args = parser.parse_args()
+    if args.interval <= 0:
+        parser.error("--interval must be greater than 0")
 
     with LQMT(args.user_config_file) as lqmt:
-        lqmt.run()
+        lqmt.run(watch=args.watch, interval=args.interval)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,144 @@
+import logging
+import os
+import time
+
+
+class Checkpoints(object):
+    """
+    Decides when the toolchains are committed during a run and keeps track of the files processed since the last
+    commit. When checkpoints are enabled, processed files are only post-processed (moved, deleted or tracked) after the
+    alerts of the files were committed, so an interrupted run doesn't lose alerts of files that were post-processed.
+
+    The files committed by a checkpoint are written to the journal before they are post-processed. If the run is
+    interrupted while post-processing them, the next run post-processes the files of the journal before it starts, so
+    the committed files aren't processed again.
+    """
+
+    def __init__(self, files=0, interval=0, journal=None):
+        """
+        :param files: Number of processed files after which the toolchains are committed. 0 disables it.
+        :param interval: Number of seconds after which the toolchains are committed. 0 disables it.
+        :param journal: Path of the journal file. No journal is kept if None.
+        """
+        self._logger = logging.getLogger("LQMT.Checkpoint")
+        self._files = files
+        self._interval = interval
+        self._journal = journal
+        self._last = time.monotonic()
+        # (source, datafile) tuples of the files processed since the last commit
+        self.pending = []
+
+    def isEnabled(self):
+        return self._files > 0 or self._interval > 0
+
+    def add(self, src, datafile):
+        """Remember a processed file, which is post-processed by src after the next commit"""
+        self.pending.append((src, datafile))
+
+    def isDue(self):
+        """Return True if the toolchains should be committed"""
+        if self._files and len(self.pending) >= self._files:
+            return True
+        return bool(self._interval) and time.monotonic() - self._last >= self._interval
+
+    def committed(self, sources):
+        """
+        Called once the toolchains were committed. Journals the pending files.
+        :param sources: The configured sources, used to record the source of each file in the journal
+        :return: Returns the (source, datafile) tuples of the files that can be post-processed now
+        """
+        pending, self.pending = self.pending, []
+        self._last = time.monotonic()
+        if self._journal and pending:
+            indexes = dict((id(src), i) for i, src in enumerate(sources))
+            journalDir = os.path.dirname(self._journal)
+            if journalDir and not os.path.exists(journalDir):
+                os.makedirs(journalDir, 0o755, True)
+            with open(self._journal + ".tmp", 'w') as f:
+                for src, datafile in pending:
+                    f.write("{0}\t{1}\n".format(indexes[id(src)], datafile))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self._journal + ".tmp", self._journal)
+        return pending
+
+    def done(self):
+        """Called once the files of the last checkpoint were post-processed"""
+        if self._journal and os.path.exists(self._journal):
+            os.unlink(self._journal)
+
+    def recover(self, sources):
+        """
+        Return the files of the journal of an interrupted run.
+        :param sources: The configured sources
+        :return: Returns the (source, datafile) tuples of the committed files that weren't post-processed
+        """
+        if not self._journal or not os.path.exists(self._journal):
+            return []
+        recovered = []
+        with open(self._journal, 'r') as f:
+            for line in f:
+                index, sep, datafile = line.rstrip("\n").partition("\t")
+                if not sep or not index.isdigit() or int(index) >= len(sources):
+                    self._logger.warning("Ignoring invalid checkpoint journal entry: {0}".format(line.strip()))
+                    continue
+                recovered.append((sources[int(index)], datafile))
+        self._logger.info("Resuming interrupted run: post-processing {0} files committed by its last checkpoint".format(
+            len(recovered)))
+        return recovered
+
+
+def currentMemory():
+    """
+    :return: Returns the resident memory of this process in MB, or None if it can't be determined
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class FlushThreshold(object):
+    """
+    Decides when the toolchains should flush the alerts they hold in memory: after a number of alerts were processed
+    since the last flush, or when the memory of the process crossed a limit.
+    """
+
+    def __init__(self, alerts=0, memory=0):
+        """
+        :param alerts: Number of alerts after which the toolchains are flushed. 0 disables it.
+        :param memory: Resident memory in MB above which the toolchains are flushed. 0 disables it.
+        """
+        self._alerts = alerts
+        self._memory = memory
+        self._count = 0
+        # memory used after the last flush. Python doesn't always return freed memory to the system, so another flush
+        # is only done once the memory grew by a quarter of the limit since then.
+        self._baseline = 0
+        if memory and currentMemory() is None:
+            logging.getLogger("LQMT.Checkpoint").warning(
+                "The memory of the process can't be determined on this system. Ignoring 'flush_memory'.")
+            self._memory = 0
+
+    def add(self, numAlerts):
+        """
+        Count the alerts of a processed file.
+        :return: Returns True if the toolchains should be flushed now
+        """
+        self._count += numAlerts
+        if self._alerts and self._count >= self._alerts:
+            return self._flushed()
+        if self._memory:
+            memory = currentMemory()
+            if self._baseline is None:
+                self._baseline = memory
+            elif memory >= self._memory and memory - self._baseline >= max(self._memory // 4, 1):
+                return self._flushed()
+        return False
+
+    def _flushed(self):
+        self._count = 0
+        # measured when the next file was processed, i.e. after the flush
+        self._baseline = None
+        return True
@@ -8,6 +8,7 @@ import toml
 
 from lqmt.lqm.exceptions import ConfigurationError
 from lqmt.lqm.logging import LQMLogging
+from lqmt.lqm.schedule import FileScheduler
 from lqmt.lqm.sourcedir import DirectorySource
 from lqmt.lqm.sourcefilter import SourceFilters
 from lqmt.lqm.systemconfig import SystemConfig
@@ -37,6 +38,97 @@ class ToolInfo:
         return tool
 
 
+class ProcessingConfig(object):
+    """Holds the optional [Processing] section of the user configuration"""
+
+    def __init__(self, configData=None):
+        self._logger = logging.getLogger("LQMT.Config.Processing")
+        self.configData = configData if configData is not None else {}
+
+        # number of processes used to parse alert files. 1 keeps all parsing in the main process.
+        self.workers = self.validation('workers', int, default=1)
+        if self.workers < 1:
+            raise ConfigurationError("The 'workers' parameter in section 'Processing' must be at least 1")
+
+        # run discovery, metadata parsing, alert parsing and the toolchains as separate stages connected by queues
+        self.pipeline = self.validation('pipeline', bool, default=False)
+        self.queue_size = self.validation('queue_size', int, default=64)
+        if self.queue_size < 1:
+            raise ConfigurationError("The 'queue_size' parameter in section 'Processing' must be at least 1")
+
+        # number of threads used to traverse the source directories concurrently
+        self.discovery_threads = self.validation('discovery_threads', int, default=1)
+        if self.discovery_threads < 1:
+            raise ConfigurationError("The 'discovery_threads' parameter in section 'Processing' must be at least 1")
+
+        # SQLite database caching parsed metadata files between runs. No cache is used if not set.
+        self.metadata_cache = self.validation('metadata_cache', str)
+
+        # commit all toolchains every checkpoint_files files and/or every checkpoint_interval seconds. 0 disables it.
+        self.checkpoint_files = self.validation('checkpoint_files', int, default=0)
+        if self.checkpoint_files < 0:
+            raise ConfigurationError("The 'checkpoint_files' parameter in section 'Processing' must not be negative")
+        self.checkpoint_interval = self.validation('checkpoint_interval', (int, float), default=0)
+        if self.checkpoint_interval < 0:
+            raise ConfigurationError("The 'checkpoint_interval' parameter in section 'Processing' must not be negative")
+        # journal of the files committed by the last checkpoint, so an interrupted run can be resumed
+        self.checkpoint_journal = self.validation('checkpoint_journal', str)
+        if self.pipeline and (self.checkpoint_files or self.checkpoint_interval):
+            raise ConfigurationError("Checkpoints in section 'Processing' are not supported with 'pipeline'")
+
+        # flush the toolchains once this many alerts were processed or the process uses this many MB of memory
+        self.flush_alerts = self.validation('flush_alerts', int, default=0)
+        if self.flush_alerts < 0:
+            raise ConfigurationError("The 'flush_alerts' parameter in section 'Processing' must not be negative")
+        self.flush_memory = self.validation('flush_memory', int, default=0)
+        if self.flush_memory < 0:
+            raise ConfigurationError("The 'flush_memory' parameter in section 'Processing' must not be negative")
+
+        # order the accepted files by these metadata fields. Files are processed in the order they are found if not set.
+        self.schedule_by = self.validation('schedule_by', list)
+        if self.schedule_by is not None:
+            for field in self.schedule_by:
+                if field not in FileScheduler.fields:
+                    raise ConfigurationError(
+                        "Invalid value '{0}' for the 'schedule_by' parameter in section 'Processing'. Allowed values "
+                        "are: {1}".format(field, ", ".join(FileScheduler.fields)))
+        self.schedule_window = self.validation('schedule_window', int, default=1000)
+        if self.schedule_window < 0:
+            raise ConfigurationError("The 'schedule_window' parameter in section 'Processing' must not be negative")
+        self.site_priority = self._priorities('site_priority')
+        self.payload_type_priority = self._priorities('payload_type_priority')
+
+    def _priorities(self, value):
+        """Validate an optional table of priorities"""
+        priorities = self.validation(value, dict, default={})
+        for key, priority in priorities.items():
+            if not isinstance(priority, int) or isinstance(priority, bool):
+                raise ConfigurationError(
+                    "The priority of '{0}' in the '{1}' parameter in section 'Processing' must be an integer".format(
+                        key, value))
+        return priorities
+
+    def validation(self, value, expected_type, default=None):
+        """
+        Validate an optional value from the Processing section.
+        :param value: Key of the value in the Processing section
+        :param expected_type: The expected type of the value
+        :param default: Value returned if the key is absent
+        :return: The configured value, or the default if the key is absent
+        """
+        if value not in self.configData:
+            return default
+
+        data = self.configData[value]
+        # bool is a subclass of int, so it has to be rejected explicitly for numeric values
+        if not isinstance(data, expected_type) or (isinstance(data, bool) and expected_type is not bool):
+            raise ConfigurationError(
+                "The '{0}' parameter in section 'Processing' was expected to be of the type {1}, but ended up being "
+                "'{2}'.".format(value, expected_type, type(data))
+            )
+        return data
+
+
 class LQMToolConfig(object):
     """Holds the Configuration data for the LQMTool"""
 
@@ -44,12 +136,16 @@ class LQMToolConfig(object):
         self._logger = logging.getLogger("LQMT.Config")
         self._sources = []
         self._parsers = {}
+        self._parserSpecs = {}
         self._toolChains = {'pull': [], 'push': []}
         self._whitelist = None
         self._loggingCfg = None
         self._toolsList = []
         self._userConfig = {}
         self._pre_filters = []
+        self._processing = None
+        # directory of the user configuration file, None if the configuration was passed as a string
+        self._configDir = None
 
         # load config files
         self._loadSystemConfig()
@@ -123,10 +219,13 @@ class LQMToolConfig(object):
                     if type(parserinfo['format']) is list:
                         for p_format in parserinfo['format']:
                             self._parsers[p_format] = parserClass(parserinfo['configs'])
+                            self._parserSpecs[p_format] = (parserClass, parserinfo['configs'])
                     else:
                         self._parsers[parserinfo['format']] = parserClass(parserinfo['configs'])
+                        self._parserSpecs[parserinfo['format']] = (parserClass, parserinfo['configs'])
                 else:
                     self._parsers[parserinfo['format']] = parserClass()
+                    self._parserSpecs[parserinfo['format']] = (parserClass, None)
 
         self._logger.debug("Parsers loaded: %s" % ', '.join(self._parsers.keys()))
 
@@ -179,6 +278,7 @@ class LQMToolConfig(object):
             cfg = open(configFile)
             topLevelConfig = toml.loads(cfg.read())
             cfg.close()
+            self._configDir = os.path.dirname(os.path.abspath(configFile))
         else:
             configFile = io.StringIO(configFile)
             topLevelConfig = toml.load(configFile)
@@ -195,6 +295,9 @@ class LQMToolConfig(object):
         # Add any sources specified
         self._addSourcesConfig(self._userConfig)
 
+        # Processing options are optional, defaults keep everything in a single process
+        self._processing = ProcessingConfig(self._userConfig.get('Processing'))
+
         # If a whitelist was specified, create it
         if 'Whitelist' in self._userConfig:
             self._whitelist = MasterWhitelist(configData=self._userConfig['Whitelist'])
@@ -284,7 +387,7 @@ class LQMToolConfig(object):
         for key in srcCfgs:
             for cfg in srcCfgs[key]:
                 if key == "Directory":
-                    self._sources.append(DirectorySource(cfg))
+                    self._sources.append(DirectorySource(cfg, self._configDir))
                 elif key == "Filters":
                     self._pre_filters = SourceFilters(cfg)
 
@@ -296,6 +399,16 @@ class LQMToolConfig(object):
             return None
         return self._parsers[fmt]
 
+    def getParserSpecs(self):
+        """
+        :return: Returns a dictionary mapping each payload format to the parser class and parser configs used to create
+        its parser. Used to recreate the parsers in other processes.
+        """
+        return self._parserSpecs
+
+    def getProcessingConfig(self):
+        return self._processing
+
     def getToolChains(self):
         return self._toolChains
 
@@ -1,13 +1,25 @@
-import ast
+import itertools
 import logging
+import threading
+import time
 from lqmt.lqm.logging import LQMLogging
+from .checkpoint import Checkpoints, FlushThreshold
 from .config import LQMToolConfig
+from .metadata import MetadataReader
+from .parallel import ParsePool, TransferError, parseAlerts
+from .pipeline import Pipeline
+from .schedule import ExpiryScheduler, FileScheduler
+from .sources import ConcurrentFiles
+from .watch import waitForChanges
 
 
 # based on filename, place file either in the metafiles dict or the datafiles list
 # NOTE: Assumes metafiles begin with . and datafiles do not.
 
 class LQMToolController:
+    # number of times watch() processes a file that failed before giving up on it
+    _maxAttempts = 3
+
     def __init__(self, configfile):
         """
         Controller for LQMT.
@@ -20,7 +32,23 @@ class LQMToolController:
         self._config = LQMToolConfig(configfile)
         self.toolChains = self._config.getToolChains()
         self.numAlerts = 0
-        self.src = None
+        # source and metadata file of each discovered file, until the file has been post-processed
+        self._fileSources = {}
+        # files of the last batch of watch() that failed, and the number of failed attempts of each file
+        self._failedFiles = []
+        self._attempts = {}
+        # guards _fileSources and _attempts, which the stages of the pipeline update from their own threads
+        self._filesLock = threading.Lock()
+        processing = self._config.getProcessingConfig()
+        self._metadataReader = MetadataReader(processing.metadata_cache)
+        self._checkpoints = Checkpoints(processing.checkpoint_files, processing.checkpoint_interval,
+                                        processing.checkpoint_journal)
+        self._flushThreshold = self.newFlushThreshold()
+        self._scheduler = None
+        if processing.schedule_by:
+            self._scheduler = FileScheduler(processing.schedule_by, processing.schedule_window,
+                                            processing.site_priority, processing.payload_type_priority)
+        self._stopped = threading.Event()
 
     def run(self):
         """
@@ -40,17 +68,126 @@ class LQMToolController:
 
         alert_files = self._initialize()
         if alert_files:
-            for data, unparsed_metadata in alert_files:
-                metadata = self._parsemeta(unparsed_metadata)
-                if metadata:
-                    filters = self._config.getSourceFilters()
-                    if filters:
-                        if filters.checkAllFilters(metadata):
-                            self._parse(data, metadata)
-                    else:
-                        self._parse(data, metadata)
+            self._processFiles(alert_files)
         self._chainCleanup()
 
+    def watch(self, interval=5):
+        """
+        Runs LQMT as a long-running process. After processing all alert files, the sources are watched for new alert
+        files, which are processed and committed as they arrive. The toolchains stay initialized between batches and
+        are only cleaned up once the process is stopped by stop() or a KeyboardInterrupt. State that expires on the
+        devices, like Palo Alto blocks, is expired when it lapses, also when no new alert files arrive.
+        :param interval: Maximum number of seconds between two checks for new files. Sources that can't be watched with
+        inotify are checked at this interval.
+        """
+        self.pull()
+        if not self.toolChains['push']:
+            return
+
+        self._stopped.clear()
+        self._initChains()
+        sources = self._config.getSources()
+        # the watchers are created before the first traversal, so no file arriving during it is missed
+        watchers = [src.getWatcher() for src in sources]
+        expiries = ExpiryScheduler(self.toolChains['push'], interval)
+        try:
+            alert_files = self._allFiles()
+            if alert_files:
+                self._processFiles(alert_files)
+            self._collectFailedFiles()
+            self._commitChains()
+            expiries.update()
+            self._logger.info("Watching for new alert files")
+            while not self._stopped.is_set():
+                changes = waitForChanges(watchers, expiries.timeout(interval, time.time()), self._stopped)
+                self._expireChains(expiries)
+                changed = [(src, change) for src, change in zip(sources, changes) if change != []]
+                if not (changed or self._failedFiles) or self._stopped.is_set():
+                    continue
+                try:
+                    self._processFiles(itertools.chain(self._retryFiles(), itertools.chain.from_iterable(
+                        self._sourceFiles(src, src.getChangedFiles(change)) for src, change in changed)))
+                except Exception as e:
+                    self._logger.error("An error occurred while processing new alert files")
+                    self._logger.error(str(e))
+                self._collectFailedFiles()
+                self._commitChains()
+                expiries.update()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._logger.info("Stopped watching for new alert files")
+            for watcher in watchers:
+                if watcher is not None:
+                    watcher.close()
+            self._chainCleanup()
+
+    def _expireChains(self, expiries):
+        """
+        Lets the toolchains whose next expiry passed remove the expired state from their devices. A toolchain that
+        fails is retried with an increasing delay.
+        """
+        now = time.time()
+        chains = expiries.due(now)
+        for chain in chains:
+            self._logger.debug("Expiring toolchain '{0}'".format(chain.getName()))
+            try:
+                chain.expire(now)
+            except Exception as e:
+                expiries.failed(chain, now)
+                self._logger.error("An error occurred while expiring toolchain '{0}'".format(chain.getName()))
+                self._logger.error(str(e))
+            else:
+                expiries.succeeded(chain)
+        if chains:
+            expiries.update()
+
+    def _retryFiles(self):
+        """Generator over the files that failed in the last batch, which are processed again before the new files"""
+        failed, self._failedFiles = self._failedFiles, []
+        for src, datafile, metafile in failed:
+            yield from self._sourceFiles(src, [(datafile, metafile)])
+
+    def _collectFailedFiles(self):
+        """
+        Collects the files of the last batch that were neither post-processed nor rejected, so that they are processed
+        again by the next batch. A file is given up after _maxAttempts failed attempts.
+        """
+        with self._filesLock:
+            for datafile, (src, metafile) in self._fileSources.items():
+                attempts = self._attempts.get(datafile, 0) + 1
+                if attempts < self._maxAttempts:
+                    self._attempts[datafile] = attempts
+                    self._failedFiles.append((src, datafile, metafile))
+                else:
+                    self._attempts.pop(datafile, None)
+                    self._logger.error("Giving up on file '{0}' after {1} failed attempts".format(datafile,
+                                                                                                  attempts))
+            self._fileSources.clear()
+
+    def stop(self):
+        """Stops watch() once the current batch of files has been processed. May be called from a signal handler."""
+        self._stopped.set()
+
+    def _processFiles(self, alert_files):
+        """
+        Parses the alert files and passes the alerts to the toolchains.
+        :param alert_files: Iterable of (datafile, metafile) tuples
+        """
+        processing = self._config.getProcessingConfig()
+        if processing.pipeline:
+            Pipeline(self, processing.queue_size).run(alert_files)
+        else:
+            files = self._acceptedFiles(alert_files)
+            for data, metadata, alerts, whitelisted in self._parsedFiles(files):
+                try:
+                    self._dispatch(alerts, whitelisted, data, metadata)
+                except Exception as e:
+                    self._logParseError(data, e)
+                if self._checkpoints.isDue():
+                    self._logger.debug("Checkpoint: committing {0} files".format(len(self._checkpoints.pending)))
+                    self._commitChains()
+
     def pull(self):
         # TODO: All tool functions contained to this function. Should give pull tools their own chain type and break
         # out the other functions out to the chain class. Similar to how it's done for push tools now.
@@ -64,15 +201,35 @@ class LQMToolController:
         :return: Returns parsed metadata if the file path is valid. If not, then it returns None
         """
         try:
-            f = open(metafile, 'r')
-            meta = ast.literal_eval(f.read())
-            f.close()
-            return meta
+            return self._metadataReader.read(metafile)
         except Exception as inst:
             self._logger.error('An exception occurred while opening/parsing {0}:'.format(metafile))
             self._logger.error(str(inst))
             return None
 
+    def _acceptedFiles(self, alert_files):
+        """
+        Parses the metadata of each alert file and checks it against the source filters. The accepted files are
+        reordered by the scheduler, if one is configured.
+        :param alert_files: Iterable of (datafile, metafile) tuples
+        :return: Returns an iterator over (datafile, metadata) for each file that passed the source filters
+        """
+        files = self._filteredFiles(alert_files)
+        if self._scheduler is not None:
+            return self._scheduler.order(files)
+        return files
+
+    def _filteredFiles(self, alert_files):
+        """Generator that parses the metadata of each alert file and yields the files that passed the filters"""
+        filters = self._config.getSourceFilters()
+        for data, unparsed_metadata in alert_files:
+            metadata = self._parsemeta(unparsed_metadata)
+            if metadata:
+                if not filters or filters.checkAllFilters(metadata):
+                    yield data, metadata
+                else:
+                    self._rejected(data)
+
     def _initialize(self):
         """
         Initializes LQMT. This includes initializing toolchains and their respective tools, and then getting all alert
@@ -80,9 +237,11 @@ class LQMToolController:
         :return: Returns filesToProcess object, which is defined in sourcedir.py. It's an object that has a custom
         __iter__ method that is used to traverse the top level alert directories provided by the user in user config
         """
+        self._initChains()
+        return self._allFiles()
 
-        filesToProcess = None
-
+    def _initChains(self):
+        """Initializes the toolchains and their respective tools"""
         for chain in self.toolChains['push']:
             if chain._enabled:
                 chain.initialize()
@@ -91,66 +250,236 @@ class LQMToolController:
                                    "correctly configured for the toolchain.".format(chain.getName()))
             chain.updateEnabled()
 
-        if self._config.getSources():
-            for src in self._config.getSources():
-                self.src = src
-                filesToProcess = src.getFilesToProcess()
+    def _allFiles(self):
+        """
+        :return: Returns an iterator over all alert files of the sources defined in the user configuration, or None if
+        no sources are defined
+        """
+        filesToProcess = None
+        sources = self._config.getSources()
+        self._resume(sources)
+        if sources:
+            threads = self._config.getProcessingConfig().discovery_threads
+            iterators = [src.getFilesToProcess(threads) for src in sources]
+            if len(sources) == 1:
+                filesToProcess = self._sourceFiles(sources[0], iterators[0])
+            else:
+                filesToProcess = self._mergedSourceFiles(sources, ConcurrentFiles(iterators, threads))
 
         return filesToProcess
 
-    def _parse(self, data, metadata):
+    def _sourceFiles(self, src, files):
         """
-        Defines all parsers needed based on the metadata given. Once defined, the parsers are used to parse alert data
-        and pass the data to tools.
-        :param data: Alert data
-        :param metadata: Alert metadata
+        Generator remembering the source of each file, so that it is post-processed by that source. Files that are
+        already queued, e.g. because watch() traversed their directory twice, are skipped until they are
+        post-processed.
         """
+        for datafile, metafile in files:
+            if self._queueFile(datafile, src, metafile):
+                yield datafile, metafile
 
-        parser = self._config.getParser(metadata["PayloadFormat"])
+    def _mergedSourceFiles(self, sources, files):
+        """Generator remembering the source of each file of the merged sources"""
+        for index, (datafile, metafile) in files:
+            if self._queueFile(datafile, sources[index], metafile):
+                yield datafile, metafile
 
+    def _queueFile(self, datafile, src, metafile):
+        """
+        Remember the source of a discovered file.
+        :return: Returns False if the file is already queued
+        """
+        with self._filesLock:
+            if datafile in self._fileSources:
+                return False
+            self._fileSources[datafile] = (src, metafile)
+            return True
+
+    def _rejected(self, datafile):
+        """Forget a file that was rejected by the source filters, so that it isn't processed again by watch()"""
+        with self._filesLock:
+            self._fileSources.pop(datafile, None)
+            self._attempts.pop(datafile, None)
+
+    def _processed(self, datafile):
+        """
+        Post-process the file by the source it was found by. With checkpoints, the file is post-processed once its
+        alerts have been committed.
+        """
+        with self._filesLock:
+            queued = self._fileSources.pop(datafile, None)
+            self._attempts.pop(datafile, None)
+        if queued is None:
+            return
+        src = queued[0]
+        if self._checkpoints.isEnabled():
+            self._checkpoints.add(src, datafile)
+        else:
+            src.processed(datafile)
+
+    def _postProcess(self, files):
+        """Post-process the (source, datafile) tuples whose alerts were committed"""
+        for src, datafile in files:
+            try:
+                src.processed(datafile)
+            except Exception as e:
+                self._logger.error("Unable to post-process file '{0}'".format(datafile))
+                self._logger.error(str(e))
+
+    def _resume(self, sources):
+        """Post-process the files committed by the last checkpoint of an interrupted run"""
+        recovered = self._checkpoints.recover(sources)
+        if recovered:
+            self._postProcess(recovered)
+            for src in sources:
+                src.commit()
+            self._checkpoints.done()
+
+    def _parsedFiles(self, files):
+        """
+        Generator that parses alert files and checks the parsed alerts against the whitelist. Files are parsed in a pool
+        of processes if more than one worker is configured.
+        :param files: Iterable of (datafile, metadata) tuples
+        :return: Yields (datafile, metadata, alerts, whitelisted) for each file that was parsed, in the order of files
+        """
+        workers = self._config.getProcessingConfig().workers
+        whitelist = self._config.getWhitelist()
+        parseable = self._parseableFiles(files)
+
+        if workers <= 1:
+            for data, metadata in parseable:
+                try:
+                    alerts, whitelisted = parseAlerts(self._config.getParser(metadata["PayloadFormat"]), whitelist,
+                                                      data, metadata)
+                except Exception as e:
+                    self._logParseError(data, e)
+                    continue
+                yield data, metadata, alerts, whitelisted
+            return
+
+        pool = ParsePool(workers, self._config.getParserSpecs(), whitelist)
         try:
-            if parser is not None:
-                # tell each chain there is a new file
-                alerts = parser.parse(data, metadata)
-                if alerts:
-                    for chain in self.toolChains['push']:
-                        if chain.isEnabled():
-                            chain.fileBegin()
-                            self._process_alerts(alerts, chain, data, metadata)
-                            self.src.processed(data)
-                else:
-                    self._logger.error("Processing error occurred. No processed alert data returned to LQMT.")
-        except Exception as e:
-            msg = "An exception occurred while processing file '{0}'".format(data)
+            for data, metadata, result in pool.imap(parseable):
+                try:
+                    try:
+                        alerts, whitelisted = result.result()
+                    except TransferError as e:
+                        # some parsed data can't be sent back between processes, so parse it in this process
+                        self._logger.debug("Passing the alerts of '{0}' from the parser pool failed, parsing it "
+                                           "locally: {1}".format(data, e))
+                        alerts, whitelisted = parseAlerts(self._config.getParser(metadata["PayloadFormat"]),
+                                                          whitelist, data, metadata)
+                except Exception as e:
+                    self._logParseError(data, e)
+                    continue
+                yield data, metadata, alerts, whitelisted
+        finally:
+            pool.shutdown()
 
-            if not LQMLogging.isDebug():
-                self._logger.error(msg)
+    def _parseableFiles(self, files):
+        """Generator skipping the files without a parser for their payload format"""
+        for data, metadata in files:
+            if self._config.getParser(metadata["PayloadFormat"]) is not None:
+                yield data, metadata
             else:
-                self._logger.exception(msg)
-            self._logger.error(str(e))
+                self._rejected(data)
 
-    def _process_alerts(self, alerts, chain, datafile, metadata):
+    def _dispatch(self, alerts, whitelisted, data, metadata):
+        """
+        Passes parsed alerts to the enabled toolchains. The file is post-processed once all chains have consumed it.
+        :param alerts: Parsed alert data
+        :param whitelisted: List with the whitelist state of each alert
+        :param data: Path to the alert data file
+        :param metadata: Alert metadata
+        """
+        if alerts:
+            consumed = False
+            for chain in self.toolChains['push']:
+                if chain.isEnabled():
+                    # tell each chain there is a new file
+                    chain.fileBegin()
+                    self._process_alerts(alerts, whitelisted, chain, data, metadata)
+                    self.numAlerts += len(alerts)
+                    consumed = True
+            if consumed:
+                self._processed(data)
+                if self._flushThreshold.add(len(alerts)):
+                    self._flushChains(self.toolChains['push'])
+        else:
+            self._logger.error("Processing error occurred. No processed alert data returned to LQMT.")
+
+    def newFlushThreshold(self):
+        """
+        :return: Returns a FlushThreshold for the [Processing] configuration, e.g. for each consumer of the pipeline
+        """
+        processing = self._config.getProcessingConfig()
+        return FlushThreshold(processing.flush_alerts, processing.flush_memory)
+
+    def _flushChains(self, chains):
+        """Lets the toolchains write the alerts they hold in memory to their database or device"""
+        self._logger.debug("Flushing toolchains")
+        for chain in chains:
+            if chain.isEnabled():
+                try:
+                    chain.flush()
+                except Exception as e:
+                    self._logger.error("An error occurred while flushing toolchain '{0}'".format(chain.getName()))
+                    self._logger.error(str(e))
+
+    def _logParseError(self, data, e):
+        msg = "An exception occurred while processing file '{0}'".format(data)
+
+        if not LQMLogging.isDebug():
+            self._logger.error(msg)
+        else:
+            self._logger.exception(msg)
+        self._logger.error(str(e))
+
+    def _process_alerts(self, alerts, whitelisted, chain, datafile, metadata):
         """
         Takes alert data and passes it to active toolchains and their respective tools.
         :param alerts: Alert data
+        :param whitelisted: List with the whitelist state of each alert
         :param chain: Toolchain
         """
 
-        for alert in alerts:
-            self.numAlerts += 1
-            isWL = alert.isWhitelisted(self._config.getWhitelist())
-            chain.process(alert, isWL, datafile, metadata)
-            chain.fileDone()
+        chain.processFile(alerts, whitelisted, datafile, metadata)
+        chain.fileDone()
+
+    def _commitChains(self):
+        """
+        Commits the alerts processed since the last commit, e.g. at a checkpoint or between the batches of a watched
+        source. Files waiting for the commit are post-processed once all toolchains were committed.
+        """
+        committed = True
+        for chain in self.toolChains['push']:
+            if chain.isEnabled():
+                try:
+                    chain.commit()
+                except Exception as e:
+                    committed = False
+                    self._logger.error("An error occurred while committing toolchain '{0}'".format(chain.getName()))
+                    self._logger.error(str(e))
+        sources = self._config.getSources()
+        if committed:
+            self._postProcess(self._checkpoints.committed(sources))
+        for src in sources:
+            src.commit()
+        if committed:
+            self._checkpoints.done()
+        self._metadataReader.flush()
 
     def _chainCleanup(self):
         """
         Cleans up tools that are done processing and logs statistics on amount of processed alerts.
         """
 
+        self._commitChains()
         for chain in self.toolChains['push']:
             if chain.isEnabled():
-                chain.commit()
                 chain.cleanup()
 
         for src in self._config.getSources():
-            src.logStatistics(self.numAlerts)
\ No newline at end of file
+            src.logStatistics(self.numAlerts)
+
+        self._metadataReader.close()
\ No newline at end of file
@@ -1,3 +1,4 @@
+from operator import attrgetter
 from lqmt.whitelist.master import IndicatorTypes
 
 
@@ -31,9 +32,9 @@ class AlertFields(object):
 
     def getStringRepresentation(self, field, val):
         """Return a string representation of the specified field"""
-        if not self.isValid(field):
+        ftype = self._fields.get(field)
+        if ftype is None:
             raise Exception("Alert field {0} is not a valid field".format(field))
-        ftype = self._fields[field]
         if ftype == "I":
             if val is not None:
                 return val
@@ -56,8 +57,19 @@ class AlertFields(object):
 
 
 class Alert(object):
-    """The Alert object represents the LQM intermediate format"""
+    """
+    The Alert object represents the LQM intermediate format.
+    Each field is stored in a slot named after the field with a leading underscore, so alerts don't carry a per-instance
+    dictionary. Parsed files can hold a large number of alerts in memory at once.
+    """
     _alertFields = AlertFields()
+    _fieldNames = tuple(_alertFields.fields)
+    __slots__ = tuple("_" + field for field in _fieldNames)
+    # getters for the slot of each field, and for all slots at once in the order of _fieldNames
+    _fieldGetters = dict((field, attrgetter("_" + field)) for field in _fieldNames)
+    _allFieldsGetter = attrgetter(*__slots__)
+    # fields holding an action, which are validated when set from a dictionary
+    _actionFields = frozenset(["action1", "action2"])
 
     @staticmethod
     def isValidField(field):
@@ -101,90 +113,28 @@ class Alert(object):
 
     # setters
     def setFromDict(self, d):
-        """Set the fields from the dictionary"""
-        if 'dataItemID' in d:
-            self._dataItemID = d['dataItemID']
-        if 'fileID' in d:
-            self._fileID = d['fileID']
-        if 'detectedTime' in d:
-            self._detectedTime = d['detectedTime']
-        if 'reportedTime' in d:
-            self._reportedTime = d['reportedTime']
-        if 'processedTime' in d:
-            self._processedTime = d['processedTime']
-        if 'indicator' in d:
-            self._indicator = d['indicator']
-        if 'indicatorType' in d:
-            self._indicatorType = d['indicatorType']
-            if self._indicatorType == "URL":
-                pass
-        if 'indicatorDirection' in d:
-            self._indicatorDirection = d['indicatorDirection']
-        if 'secondaryIndicator' in d:
-            self._secondaryIndicator = d['secondaryIndicator']
-        if 'secondaryIndicatorType' in d:
-            self._secondaryIndicatorType = d['secondaryIndicatorType']
-        if 'secondaryIndicatorDirection' in d:
-            self._secondaryIndicatorDirection = d['secondaryIndicatorDirection']
-        if 'directSource' in d:
-            self._directSource = d['directSource']
-        if 'secondarySource' in d:
-            self._secondarySource = d['secondarySource']
-        if 'action1' in d:
-            self._action1 = AlertAction.get(d['action1'])
-        if 'duration1' in d:
-            self._duration1 = d['duration1']
-        if 'action2' in d:
-            self._action2 = AlertAction.get(d['action2'])
-        if 'duration2' in d:
-            self._duration2 = d['duration2']
-        if 'reason1' in d:
-            self._reason1 = d['reason1']
-        if 'reference1' in d:
-            self._reference1 = d['reference1']
-        if 'reason2' in d:
-            self._reason2 = d['reason2']
-        if 'reference2' in d:
-            self._reference2 = d['reference2']
-        if 'majorTags' in d:
-            self._majorTags = d['majorTags']
-        if 'minorTags' in d:
-            self._minorTags = d['minorTags']
-        if 'restriction' in d:
-            self._restriction = d['restriction']
-        if 'sensitivity' in d:
-            self._sensitivity = d['sensitivity']
-        if 'reconAllowed' in d:
-            self._reconAllowed = d['reconAllowed']
-        if 'priors' in d:
-            self._priors = d['priors']
-        if 'confidence' in d:
-            self._confidence = d['confidence']
-        if 'severity' in d:
-            self._severity = d['severity']
-        if 'relevancy' in d:
-            self._relevancy = d['relevancy']
-        if 'relatedID' in d:
-            self._relatedID = d['relatedID']
-        if 'relationType' in d:
-            self._relationType = d['relationType']
-        if 'comment' in d:
-            self._comment = d['comment']
-        if 'fileHasMore' in d:
-            self._fileHasMore = d['fileHasMore']
+        """Set the fields from the dictionary. Keys that are not alert fields are ignored."""
+        for field, value in d.items():
+            if field in Alert._fieldGetters:
+                if field in Alert._actionFields:
+                    value = AlertAction.get(value)
+                setattr(self, "_" + field, value)
 
     def isWhitelisted(self, wl):
         """Return whether or not this Alert is whitelisted"""
         if wl is None:
             return False
         # check both primary and secondary indicators (if they exist)
+        return any(wl.areWhitelisted(self.getIndicators()))
+
+    def getIndicators(self):
+        """Return the (indicator type, indicator) tuples of the primary and secondary indicators (if they exist)"""
+        indicators = []
         if self._indicator is not None:
-            if wl.isWhitelisted(self._getIndicatorType(self._indicatorType), self._indicator):
-                return True
+            indicators.append((self._getIndicatorType(self._indicatorType), self._indicator))
         if self._secondaryIndicator is not None:
-            if wl.isWhitelisted(self._getIndicatorType(self._secondaryIndicatorType), self._secondaryIndicator):
-                return True
-        return False
+            indicators.append((self._getIndicatorType(self._secondaryIndicatorType), self._secondaryIndicator))
+        return indicators
 
     @staticmethod
     def _getIndicatorType(indType):
@@ -322,7 +272,7 @@ class Alert(object):
             return None
 
     def getIPToRevoke(self):
-        if self.getAction() == AlertAction.get('Revoke') and self._indicatorType != "IPv4Address":
+        if self.getAction() == AlertAction.get('Revoke') and self._indicatorType == "IPv4Address":
             return self._indicator
         else:
             return None
@@ -462,11 +412,10 @@ class Alert(object):
         return fields
 
     def _getField(self, field):
-        val = None
-        tfld = "_" + field
-        if hasattr(self, tfld):
-            val = getattr(self, tfld)
-        return val
+        getter = Alert._fieldGetters.get(field)
+        if getter is None:
+            return None
+        return getter(self)
 
     def getAllFields(self, dictionary=False, parseEmpty=False, emptyValue=None):
         """
@@ -476,13 +425,14 @@ class Alert(object):
         :param emptyValue: Option to fill in empty fields with a different value
         :return: Returns either a list or dictionary of all fields and their parsed value. Defaults to a list.
         """
-        keys = list(Alert._alertFields.fields.keys())
-        fields = self.getFields(keys)
+        keys = list(Alert._fieldNames)
+        toString = Alert._alertFields.getStringRepresentation
+        fields = [toString(field, value) for field, value in zip(keys, Alert._allFieldsGetter(self))]
         if dictionary:
             dict_fields = {}
             keys.reverse()
             for value in fields:
-                if value is not "":
+                if value != "":
                     dict_fields[keys.pop()] = value
                 elif parseEmpty:
                     keys.pop()
@@ -493,6 +443,125 @@ class Alert(object):
             return fields
 
 
+class AlertBatch(object):
+    """
+    Columnar container for the alerts of a parsed file.
+    Each alert field is stored as a column with one value per alert, so toolchains and tools supporting batches can
+    filter and process all alerts of a file at once. Tools processing alerts one at a time can still iterate over or
+    index the batch, which returns Alert objects.
+    """
+
+    def __init__(self, columns=None):
+        """
+        :param columns: Dictionary of alert field to the list of values of that field. Defaults to an empty batch.
+        """
+        if columns is None:
+            columns = dict((field, []) for field in Alert._fieldNames)
+        self._columns = columns
+        self._alerts = None  # Alert objects of the batch, created when first accessed
+
+    def __getstate__(self):
+        # the Alert objects can be recreated from the columns, so don't pass them between processes
+        return {'_columns': self._columns}
+
+    def __setstate__(self, state):
+        self._columns = state['_columns']
+        self._alerts = None
+
+    def addFromDict(self, d):
+        """Add an alert with the fields from the dictionary. Keys that are not alert fields are ignored."""
+        # validate the actions first, so an invalid alert doesn't leave the columns with different lengths
+        for field in Alert._actionFields:
+            if field in d:
+                AlertAction.get(d[field])
+        for field, column in self._columns.items():
+            column.append(d.get(field))
+        self._alerts = None
+
+    def addAlert(self, alert):
+        """Add the fields of the Alert object to the batch"""
+        for field, value in zip(Alert._fieldNames, Alert._allFieldsGetter(alert)):
+            self._columns[field].append(value)
+        self._alerts = None
+
+    def __len__(self):
+        return len(self._columns[Alert._fieldNames[0]])
+
+    def __getitem__(self, index):
+        return self._getAlerts()[index]
+
+    def __iter__(self):
+        return iter(self._getAlerts())
+
+    def _getAlerts(self):
+        if self._alerts is None:
+            alerts = []
+            for values in zip(*[self._columns[field] for field in Alert._fieldNames]):
+                alert = Alert.__new__(Alert)
+                for slot, value in zip(Alert.__slots__, values):
+                    setattr(alert, slot, value)
+                alerts.append(alert)
+            self._alerts = alerts
+        return self._alerts
+
+    def getColumn(self, field):
+        """Return the values of the field for all alerts in the batch"""
+        if field not in self._columns:
+            raise Exception("Alert field {0} is not a valid field".format(field))
+        return self._columns[field]
+
+    def getActions(self):
+        return self._columns['action1']
+
+    def getIndicatorTypes(self):
+        return self._columns['indicatorType']
+
+    def getIPsToBlock(self):
+        """Return the IP to block of each alert in the batch. See Alert.getIPToBlock"""
+        block = AlertAction.get('Block')
+        return [indicator if action == block and indType == "IPv4Address" else None
+                for action, indType, indicator in zip(self._columns['action1'], self._columns['indicatorType'],
+                                                      self._columns['indicator'])]
+
+    def getFields(self, fieldNames):
+        """Return the string representation of the fields of each alert in the batch. See Alert.getFields"""
+        if not fieldNames:
+            return [[] for _ in range(len(self))]
+        toString = Alert._alertFields.getStringRepresentation
+        columns = [[toString(field, value) for value in self.getColumn(field)] for field in fieldNames]
+        return [list(row) for row in zip(*columns)]
+
+    def actionMask(self, actions):
+        """Return whether or not the action of each alert is one of the actions. The All action matches every alert."""
+        if AlertAction.get('All') in actions:
+            return [True] * len(self)
+        return [action in actions for action in self._columns['action1']]
+
+    def whitelistMask(self, wl):
+        """Return whether or not each alert is whitelisted. All indicators of the batch are checked at once."""
+        mask = [False] * len(self)
+        if wl is None or not mask:
+            return mask
+        # gather the primary and secondary indicators (if they exist), remembering which alert each belongs to
+        indicators = []
+        owners = []
+        for indicatorField, typeField in (("indicator", "indicatorType"),
+                                          ("secondaryIndicator", "secondaryIndicatorType")):
+            for i, (indicator, indType) in enumerate(zip(self._columns[indicatorField], self._columns[typeField])):
+                if indicator is not None:
+                    indicators.append((Alert._getIndicatorType(indType), indicator))
+                    owners.append(i)
+        for i, whitelisted in zip(owners, wl.areWhitelisted(indicators)):
+            if whitelisted:
+                mask[i] = True
+        return mask
+
+    def select(self, mask):
+        """Return a new batch holding the alerts for which the mask is True"""
+        return AlertBatch(dict((field, [value for value, keep in zip(column, mask) if keep])
+                               for field, column in self._columns.items()))
+
+
 class StixFile(object):
     def __init__(self):
         self._rawfile = None
@@ -508,6 +577,11 @@ class StixFile(object):
         # TODO: currently not supporting white listing
         return False
 
+    def getIndicators(self):
+        """Return the indicators to check against the whitelist"""
+        # TODO: currently not supporting white listing
+        return []
+
     def getAction(self):
         return self._action
 
@@ -554,6 +628,11 @@ class RuleFile(object):
         # TODO: currently not supporting white listing
         return False
 
+    def getIndicators(self):
+        """Return the indicators to check against the whitelist"""
+        # TODO: currently not supporting white listing
+        return []
+
     def getAction(self):
         return self._action
 
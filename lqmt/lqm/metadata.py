@@ -0,0 +1,184 @@
+import ast
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# A single "key: value" entry of a flat metadata dictionary, including the separator that follows it. Values can be
+# strings without escapes, numbers, True, False or None. Anything else is left to ast.literal_eval.
+_ENTRY = re.compile(r"""\s*(?:'([^'\\\n]*)'|"([^"\\\n]*)")\s*:\s*"""
+                    r"""(?:'([^'\\\n]*)'|"([^"\\\n]*)"|(-?\d+\.\d*|-?\d+)|(True|False|None))\s*([,}])""")
+_CONSTANTS = {'True': True, 'False': False, 'None': None}
+
+
+def parseMetadata(text):
+    """
+    Parses the contents of a metadata file, which is a dictionary literal.
+    JSON and flat dictionaries of strings, numbers and constants are parsed directly. Everything else is parsed with
+    ast.literal_eval.
+    :param text: Contents of the metadata file
+    :return: Returns the parsed metadata
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    meta = _parseFlatDict(text)
+    if meta is None:
+        meta = ast.literal_eval(text)
+    return meta
+
+
+def _parseFlatDict(text):
+    """Parse a flat dictionary literal. Returns None if the text is not a flat dictionary."""
+    text = text.strip()
+    if not text.startswith("{"):
+        return None
+    meta = {}
+    pos = 1
+    if text[1:].strip() == "}":
+        return meta
+    end = len(text)
+    while True:
+        m = _ENTRY.match(text, pos)
+        if m is None:
+            return None
+        key = m.group(1) if m.group(1) is not None else m.group(2)
+        if m.group(3) is not None:
+            value = m.group(3)
+        elif m.group(4) is not None:
+            value = m.group(4)
+        elif m.group(5) is not None:
+            number = m.group(5)
+            value = float(number) if "." in number else int(number)
+        else:
+            value = _CONSTANTS[m.group(6)]
+        meta[key] = value
+        pos = m.end()
+        if m.group(7) == "}":
+            return meta if pos == end else None
+        # allow a trailing comma before the closing brace
+        if text[pos:].strip() == "}":
+            return meta
+
+
+class MetadataReader(object):
+    """
+    Reads and parses metadata files. Parsed metadata can be cached in a SQLite database keyed by the path, modification
+    time and size of the metadata file, so files seen in earlier runs (e.g. tracked or filtered out files) aren't parsed
+    again. Cache entries that haven't been used for a while are removed when the reader is closed.
+    """
+
+    # number of cache updates collected before they are written to the database
+    _batchSize = 500
+    # cache entries not used within this many seconds are removed
+    _retention = 30 * 24 * 60 * 60
+
+    def __init__(self, cacheFile=None):
+        """
+        :param cacheFile: Path of the SQLite cache database. No cache is used if None.
+        """
+        self._logger = logging.getLogger("LQMT.Metadata")
+        self._conn = None
+        self._lock = threading.Lock()
+        self._updates = []
+        self._used = []
+        self._now = int(time.time())
+        self.hits = 0
+        self.misses = 0
+        if cacheFile:
+            try:
+                self._openCache(cacheFile)
+            except Exception as e:
+                self._logger.error("Unable to open metadata cache {0}. Continuing without cache.".format(cacheFile))
+                self._logger.error(str(e))
+                self._conn = None
+
+    def _openCache(self, cacheFile):
+        cacheDir = os.path.dirname(cacheFile)
+        if cacheDir and not os.path.exists(cacheDir):
+            os.makedirs(cacheDir, 0o755, True)
+        # the reader may be used by the metadata stage of the pipeline, which runs in its own thread
+        self._conn = sqlite3.connect(cacheFile, check_same_thread=False)
+        self._conn.execute("create table if not exists metadata "
+                           "(path text primary key, mtime integer, size integer, used integer, meta text)")
+        self._conn.commit()
+
+    def read(self, metafile):
+        """
+        Read and parse a metadata file.
+        :param metafile: Path to the metadata file
+        :return: Returns the parsed metadata. Raises an exception if the file can't be read or parsed.
+        """
+        if self._conn is None:
+            return self._parseFile(metafile)
+
+        stat = os.stat(metafile)
+        with self._lock:
+            rec = self._conn.execute("select mtime, size, meta from metadata where path=?", (metafile,)).fetchone()
+        if rec is not None and rec[0] == stat.st_mtime_ns and rec[1] == stat.st_size:
+            # flush() swaps the lists under the lock, so they are only appended to while holding it
+            with self._lock:
+                self.hits += 1
+                self._used.append((self._now, metafile))
+                due = len(self._used) >= self._batchSize
+            if due:
+                self.flush()
+            return json.loads(rec[2])
+
+        with self._lock:
+            self.misses += 1
+        meta = self._parseFile(metafile)
+        try:
+            serialized = json.dumps(meta)
+        except (TypeError, ValueError):
+            # not representable as JSON, so it can't be cached
+            return meta
+        if json.loads(serialized) != meta:
+            # e.g. tuples or non-string keys, which don't survive the round trip
+            return meta
+        with self._lock:
+            self._updates.append((metafile, stat.st_mtime_ns, stat.st_size, self._now, serialized))
+            due = len(self._updates) >= self._batchSize
+        if due:
+            self.flush()
+        return meta
+
+    @staticmethod
+    def _parseFile(metafile):
+        with open(metafile, 'r') as f:
+            return parseMetadata(f.read())
+
+    def flush(self):
+        """Write the collected cache updates to the database"""
+        if self._conn is None:
+            return
+        with self._lock:
+            updates, self._updates = self._updates, []
+            used, self._used = self._used, []
+            self._conn.executemany("insert or replace into metadata (path, mtime, size, used, meta) "
+                                   "values (?, ?, ?, ?, ?)", updates)
+            self._conn.executemany("update metadata set used=? where path=?", used)
+            self._conn.commit()
+            # a long-running process marks the entries it uses later on with a later time
+            self._now = int(time.time())
+
+    def close(self):
+        """Write the remaining cache updates, remove stale cache entries and close the cache"""
+        if self._conn is None:
+            return
+        try:
+            self.flush()
+            with self._lock:
+                self._conn.execute("delete from metadata where used < ?", (self._now - self._retention,))
+                self._conn.commit()
+            self._logger.debug("Metadata cache: {0} hits, {1} misses".format(self.hits, self.misses))
+        except Exception as e:
+            self._logger.error("Unable to update metadata cache")
+            self._logger.error(str(e))
+        finally:
+            self._conn.close()
+            self._conn = None
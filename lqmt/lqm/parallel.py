@@ -0,0 +1,141 @@
+import logging
+import pickle
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from lqmt.lqm.data import AlertBatch
+from lqmt.whitelist.master import MasterWhitelist
+
+# Parsers and whitelist of a pool process. These are created by the first file parsed by the process, see _initWorker.
+_parsers = {}
+_whitelist = None
+_initialized = False
+
+
+class TransferError(Exception):
+    """The parsed alerts of a file couldn't be passed from a pool process to the main process"""
+
+
+def parseAlerts(parser, whitelist, datafile, metadata):
+    """
+    Parses an alert file and checks each of the parsed alerts against the whitelist.
+    :param parser: Parser used for the payload format of the file
+    :param whitelist: MasterWhitelist used for the whitelist checks. Can be None
+    :param datafile: Path to the alert data file
+    :param metadata: Parsed metadata of the alert data file
+    :return: Returns a tuple of the parsed alerts and a list with the whitelist state of each of the alerts
+    """
+    alerts = parser.parse(datafile, metadata)
+    if not alerts:
+        return alerts, []
+    if isinstance(alerts, AlertBatch):
+        return alerts, alerts.whitelistMask(whitelist)
+    whitelisted = [False] * len(alerts)
+    if whitelist is None:
+        return alerts, whitelisted
+
+    # check the indicators of all alerts of the file at once, remembering which alert each indicator belongs to
+    indicators = []
+    owners = []
+    for i, alert in enumerate(alerts):
+        for indicator in alert.getIndicators():
+            indicators.append(indicator)
+            owners.append(i)
+    for i, isWhitelisted in zip(owners, whitelist.areWhitelisted(indicators)):
+        if isWhitelisted:
+            whitelisted[i] = True
+    return alerts, whitelisted
+
+
+def _initWorker(parserSpecs, whitelistConfig):
+    """
+    Initializes a pool process, once. Parsers and the whitelist are recreated from their specs because neither can be
+    passed between processes. The whitelist database was already updated by the main process, so it is only read.
+    """
+    global _whitelist, _initialized
+    if _initialized:
+        return
+    for fmt, (parserClass, configs) in parserSpecs.items():
+        if configs:
+            _parsers[fmt] = parserClass(configs)
+        else:
+            _parsers[fmt] = parserClass()
+    if whitelistConfig is not None:
+        _whitelist = MasterWhitelist(configData=whitelistConfig, readOnly=True)
+    _initialized = True
+
+
+def _parseInWorker(parserSpecs, whitelistConfig, datafile, metadata):
+    """
+    Parses a file in a pool process. The result is pickled here, so that a result that can't be passed to the main
+    process is told apart from an error parsing the file.
+    """
+    _initWorker(parserSpecs, whitelistConfig)
+    result = parseAlerts(_parsers[metadata['PayloadFormat']], _whitelist, datafile, metadata)
+    try:
+        return pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        raise TransferError(str(e))
+
+
+class _PoolResult(object):
+    """Result of a file submitted to the ParsePool"""
+
+    def __init__(self, future):
+        self._future = future
+
+    def result(self):
+        """
+        :return: Returns the same tuple as parseAlerts. Raises TransferError if the parsed alerts couldn't be passed
+        from the pool, or the exception that occurred while parsing.
+        """
+        try:
+            data = self._future.result()
+        except BrokenProcessPool as e:
+            raise TransferError(str(e))
+        try:
+            return pickle.loads(data)
+        except Exception as e:
+            raise TransferError(str(e))
+
+
+class ParsePool(object):
+    """
+    Runs the parsing and whitelisting of alert files on a pool of processes. Results are handed back in the order the
+    files were submitted, so the toolchains see the files in the same order as they would without the pool.
+    """
+
+    def __init__(self, workers, parserSpecs, whitelist=None):
+        """
+        :param workers: Number of processes in the pool
+        :param parserSpecs: Dictionary of payload format to (parser class, parser configs). See
+        LQMToolConfig.getParserSpecs
+        :param whitelist: MasterWhitelist used by the controller. Each process opens its own connection to it.
+        """
+        self._logger = logging.getLogger("LQMT.ParsePool")
+        self._parserSpecs = parserSpecs
+        self._whitelistConfig = whitelist.getConfig() if whitelist is not None else None
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        # limit the number of files in flight so results don't pile up ahead of the toolchains
+        self._window = workers * 2
+        self._logger.debug("Started parser pool with {0} processes".format(workers))
+
+    def imap(self, files):
+        """
+        Submits each file to the pool and yields the files in submission order.
+        :param files: Iterable of (datafile, metadata) tuples
+        :return: Yields (datafile, metadata, result) tuples. result.result() returns the same tuple as parseAlerts. It
+        raises TransferError if the parsed alerts couldn't be passed from the pool, or the exception that occurred while
+        parsing.
+        """
+        pending = deque()
+        for datafile, metadata in files:
+            future = self._executor.submit(_parseInWorker, self._parserSpecs, self._whitelistConfig, datafile, metadata)
+            pending.append((datafile, metadata, _PoolResult(future)))
+            if len(pending) >= self._window:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+
+    def shutdown(self):
+        self._executor.shutdown()
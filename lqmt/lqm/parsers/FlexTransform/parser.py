@@ -4,7 +4,7 @@ Created on Jan 12, 2015
 @author: taxon
 """
 import FlexTransform
-from lqmt.lqm.data import Alert
+from lqmt.lqm.data import AlertBatch
 import os
 import inspect
 import logging
@@ -54,9 +54,9 @@ class FlexTransformParser(object):
         :param datafile: Contains path to the file containing the alert data.
         :param meta: Contains meta data about the datafile. Examples includes PayloadFormat, FileName, PayloadType, and
         more.
-        :return: Returns parsed alert data.
+        :return: Returns the parsed alert data as an AlertBatch.
         """
-        alerts = []
+        alerts = AlertBatch()
 
         # TODO: Stix-tlp parser currently doesn't support meta files. Until it does, meta files are for the cfm format
 
@@ -69,9 +69,7 @@ class FlexTransformParser(object):
                 "LQMT-FlexTransform-Parser: Error parsing file file='{0}' exception='{1}'".format(datafile, e))
         try:
             for d in data:
-                alert = Alert()
-                alert.setFromDict(d)
-                alerts.append(alert)
+                alerts.addFromDict(d)
         except Exception as e:
             self._logger.error("LQMT-FlexTransform-Parser: Problem with parsed data. Exception={0}".format(e))
         return alerts
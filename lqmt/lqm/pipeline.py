@@ -0,0 +1,201 @@
+import logging
+import queue
+import threading
+
+# Marks the end of the items passed between two stages
+_END = object()
+
+
+class _ParsedFile(object):
+    """A parsed alert file on its way through the toolchains. Tracks how many chains still have to consume it."""
+
+    def __init__(self, datafile, metadata, alerts, whitelisted, consumers):
+        self.datafile = datafile
+        self.metadata = metadata
+        self.alerts = alerts
+        self.whitelisted = whitelisted
+        self._remaining = consumers
+        self._failed = False
+        self._lock = threading.Lock()
+
+    def consumed(self, failed=False):
+        """
+        Called by each consumer once it is done with the file.
+        :param failed: True if the consumer failed to process the file
+        :return: Returns True if this was the last consumer and every consumer processed the file successfully
+        """
+        with self._lock:
+            self._remaining -= 1
+            self._failed = self._failed or failed
+            return self._remaining == 0 and not self._failed
+
+
+class Pipeline(object):
+    """
+    Staged producer/consumer pipeline between sources, parsers and toolchains.
+
+    File discovery, metadata parsing, alert parsing and each group of toolchains run in their own thread and are
+    connected by queues. The queues between the first stages are bounded. The parser puts each file on the queue of
+    every toolchain group without blocking and only waits while all of them hold queueSize files, so a slow toolchain
+    falls behind on its own queue instead of starving the others. Toolchains that share a tool are consumed by the same thread so a tool is never
+    called from two threads at once. A file is post-processed once every toolchain has consumed it.
+    """
+
+    def __init__(self, controller, queueSize):
+        """
+        :param controller: The LQMToolController the stages are run for
+        :param queueSize: Maximum number of items waiting between two stages
+        """
+        self._logger = logging.getLogger("LQMT.Pipeline")
+        self._controller = controller
+        self._queueSize = queueSize
+        self._groups = self._groupChains([chain for chain in controller.toolChains['push'] if chain.isEnabled()])
+        # unbounded, the parser limits how far it runs ahead of the fastest group instead
+        self._queues = [queue.Queue() for _ in self._groups]
+        self._lock = threading.Lock()
+        # notified whenever a toolchain group took a file off its queue
+        self._space = threading.Condition()
+        self._aborted = threading.Event()
+        self._error = None
+
+    @staticmethod
+    def _groupChains(chains):
+        """Group toolchains that share a tool instance, so that they are consumed by the same thread"""
+        groups = []
+        for chain in chains:
+            tools = set(id(tool) for tool in chain._tools)
+            merged = [chain]
+            for group in list(groups):
+                if tools & group[1]:
+                    groups.remove(group)
+                    merged = group[0] + merged
+                    tools |= group[1]
+            groups.append((merged, tools))
+        return [group[0] for group in groups]
+
+    def run(self, alert_files):
+        """
+        Runs all stages of the pipeline and waits for them to finish.
+        :param alert_files: Iterable of (datafile, metafile) tuples
+        """
+        files = queue.Queue(self._queueSize)
+        accepted = queue.Queue(self._queueSize)
+        threads = [
+            threading.Thread(target=self._stage, name="LQMT-discover",
+                             args=(lambda: alert_files, files)),
+            threading.Thread(target=self._stage, name="LQMT-metadata",
+                             args=(lambda: self._controller._acceptedFiles(self._drain(files)), accepted)),
+            threading.Thread(target=self._parse, name="LQMT-parse", args=(accepted,))
+        ]
+        for group, chainQueue in zip(self._groups, self._queues):
+            threads.append(threading.Thread(target=self._consume, name="LQMT-chain",
+                                            args=(group, chainQueue)))
+
+        self._logger.debug("Starting pipeline with {0} toolchain consumer(s)".format(len(self._groups)))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+    def _abort(self, e):
+        """Stop all stages because of an unexpected error in one of them"""
+        with self._lock:
+            if self._error is None:
+                self._error = e
+        self._aborted.set()
+
+    def _put(self, q, item):
+        """Put an item on a queue, giving up if the pipeline was aborted while waiting for space"""
+        while not self._aborted.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _waitForSpace(self):
+        """
+        Wait until at least one toolchain group has room on its queue. Returns False if the pipeline was aborted.
+        """
+        with self._space:
+            while self._queues and all(chainQueue.qsize() >= self._queueSize for chainQueue in self._queues):
+                if self._aborted.is_set():
+                    return False
+                self._space.wait(0.5)
+        return not self._aborted.is_set()
+
+    def _drain(self, q):
+        """Yield items from a queue until the end marker is received or the pipeline is aborted"""
+        while not self._aborted.is_set():
+            try:
+                item = q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if item is _END:
+                return
+            yield item
+
+    def _stage(self, items, out):
+        """Generic stage putting each item produced by items() on the out queue"""
+        try:
+            for item in items():
+                if not self._put(out, item):
+                    return
+        except Exception as e:
+            self._abort(e)
+        finally:
+            self._put(out, _END)
+
+    def _parse(self, accepted):
+        """Parse stage. Parses each accepted file and hands the result to every toolchain consumer."""
+        try:
+            for data, metadata, alerts, whitelisted in self._controller._parsedFiles(self._drain(accepted)):
+                if not alerts:
+                    self._logger.error("Processing error occurred. No processed alert data returned to LQMT.")
+                    continue
+                if not self._waitForSpace():
+                    return
+                parsed = _ParsedFile(data, metadata, alerts, whitelisted, len(self._queues))
+                for chainQueue in self._queues:
+                    chainQueue.put_nowait(parsed)
+        except Exception as e:
+            self._abort(e)
+        finally:
+            for chainQueue in self._queues:
+                chainQueue.put_nowait(_END)
+
+    def _consume(self, chains, chainQueue):
+        """Toolchain stage. Passes each parsed file to the toolchains of this group."""
+        # each group flushes its own chains, so the tools are only called from this thread
+        flushThreshold = self._controller.newFlushThreshold()
+        try:
+            for parsed in self._drain(chainQueue):
+                with self._space:
+                    self._space.notify()
+                failed = False
+                try:
+                    for chain in chains:
+                        chain.fileBegin()
+                        self._controller._process_alerts(parsed.alerts, parsed.whitelisted, chain, parsed.datafile,
+                                                         parsed.metadata)
+                        with self._lock:
+                            self._controller.numAlerts += len(parsed.alerts)
+                except Exception as e:
+                    failed = True
+                    self._controller._logParseError(parsed.datafile, e)
+                if flushThreshold.add(len(parsed.alerts)):
+                    self._controller._flushChains(chains)
+
+                if parsed.consumed(failed):
+                    try:
+                        with self._lock:
+                            self._controller._processed(parsed.datafile)
+                    except Exception as e:
+                        self._controller._logParseError(parsed.datafile, e)
+        except Exception as e:
+            self._abort(e)
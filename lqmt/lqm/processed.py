@@ -1,5 +1,26 @@
 import os
 import logging
+import queue
+import sqlite3
+import threading
+import time
+
+
+def _groupByDirectory(fpaths):
+    """Return a list of (directory, file names) tuples of the files, in the order the directories first occur"""
+    groups = {}
+    for fpath in fpaths:
+        file_dir, file_name = os.path.split(fpath)
+        groups.setdefault(file_dir, []).append(file_name)
+    return list(groups.items())
+
+
+def _exists(path, dir_fd=None):
+    try:
+        os.stat(path, dir_fd=dir_fd)
+        return True
+    except FileNotFoundError:
+        return False
 
 
 class ProcessedHandler(object):
@@ -10,6 +31,11 @@ class ProcessedHandler(object):
         """Called after the file (fpath) has been processed"""
         NotImplemented
 
+    def processedBatch(self, fpaths):
+        """Called with a batch of processed files (fpaths), in the order they were processed"""
+        for fpath in fpaths:
+            self.processed(fpath)
+
     def isProcessed(self, fpath):
         """Called to determine if the file (fpath) has been processed"""
         NotImplemented
@@ -27,6 +53,10 @@ class ProcessedHandler(object):
         Return True if the directory should be skipped"""
         pass
 
+    def commit(self):
+        """Called to make the post-processing of the processed files durable, e.g. at the end of a run"""
+        pass
+
 
 class ProcessHandlerMove(ProcessedHandler):
     """This class implements moving the processed file to another directory after processing"""
@@ -39,10 +69,35 @@ class ProcessHandlerMove(ProcessedHandler):
         self._logger = logging.getLogger("LQMT.PostProcess.Move")
 
     def processed(self, fpath):
-        # move the processed file to _pdir
+        # move the processed file to the _pdir of the directory the file is in. This isn't necessarily _curdir, as the
+        # directory source may have moved on to the next directory while the file was being processed.
         file_dir, file_name = os.path.split(fpath)
-        os.rename(os.path.join(file_dir, file_name), os.path.join(self._curdir, file_name))
-        os.rename(os.path.join(file_dir, "." + file_name), os.path.join(self._curdir, "." + file_name))
+        self._move(file_dir, file_name)
+
+    def processedBatch(self, fpaths):
+        # the files of a directory are moved relative to a descriptor of the directory, so its path is only resolved
+        # once per batch
+        if os.rename not in os.supports_dir_fd:
+            return super().processedBatch(fpaths)
+        for file_dir, file_names in _groupByDirectory(fpaths):
+            dir_fd = os.open(file_dir or ".", os.O_RDONLY)
+            try:
+                for file_name in file_names:
+                    self._move(file_dir, file_name, dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def _move(self, file_dir, file_name, dir_fd=None):
+        """Move the data and metadata file. Files that were already moved are skipped."""
+        for name in (file_name, "." + file_name):
+            src = name if dir_fd is not None else os.path.join(file_dir, name)
+            dst = os.path.join(self._processed_dir, name) if dir_fd is not None \
+                else os.path.join(file_dir, self._processed_dir, name)
+            try:
+                os.rename(src, dst, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+            except FileNotFoundError:
+                if not _exists(dst, dir_fd):
+                    raise
         self._logger.debug("File '{0}' was processed and moved to the processed directory located at '{1}''".format(
             file_name,
             file_dir+"/"+self._processed_dir
@@ -68,13 +123,101 @@ class ProcessHandlerDelete(ProcessedHandler):
     def processed(self, fpath):
         # delete the file
         fdir, fn = os.path.split(fpath)
-        os.unlink(os.path.join(fdir, fn))
-        os.unlink(os.path.join(fdir, "." + fn))
+        self._delete(os.path.join(fdir, fn))
+        self._delete(os.path.join(fdir, "." + fn))
+
+    def processedBatch(self, fpaths):
+        if os.unlink not in os.supports_dir_fd:
+            return super().processedBatch(fpaths)
+        for fdir, fns in _groupByDirectory(fpaths):
+            dir_fd = os.open(fdir or ".", os.O_RDONLY)
+            try:
+                for fn in fns:
+                    self._delete(fn, dir_fd)
+                    self._delete("." + fn, dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    @staticmethod
+    def _delete(path, dir_fd=None):
+        # files that were already deleted are skipped
+        try:
+            os.unlink(path, dir_fd=dir_fd)
+        except FileNotFoundError:
+            pass
 
     def isProcessed(self, fpath):
         return False
 
 
+class ProcessHandlerQueue(ProcessedHandler):
+    """This ProcessedHandler class queues the processed files and passes them to another handler in batches on a worker
+    thread, so moving or deleting the files doesn't hold up the processing of the next ones. The files are
+    post-processed in the order they were processed. commit() waits until all queued files are post-processed."""
+
+    # maximum number of files passed to the handler at once
+    _batchSize = 100
+
+    def __init__(self, handler):
+        """
+        :param handler: The ProcessedHandler that post-processes the files
+        """
+        self._handler = handler
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger("LQMT.PostProcess.Queue")
+
+    def processed(self, fpath):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="LQMT-postprocess", daemon=True)
+                self._worker.start()
+        self._queue.put(fpath)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self._batchSize:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._postProcess(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _postProcess(self, batch):
+        try:
+            self._handler.processedBatch(batch)
+        except Exception:
+            # post-processing is idempotent, so retry the files of the batch one at a time to find the failing ones
+            for fpath in batch:
+                try:
+                    self._handler.processed(fpath)
+                except Exception as e:
+                    self._logger.error("Unable to post-process file '{0}'".format(fpath))
+                    self._logger.error(str(e))
+
+    def isProcessed(self, fpath):
+        return self._handler.isProcessed(fpath)
+
+    def enteringDirectory(self, path):
+        self._handler.enteringDirectory(path)
+
+    def leavingDirectory(self, path):
+        self._handler.leavingDirectory(path)
+
+    def skipDirectory(self, path):
+        return self._handler.skipDirectory(path)
+
+    def commit(self):
+        self._queue.join()
+        self._handler.commit()
+
+
 class ProcessHandlerDoNothing(ProcessedHandler):
     """This ProcessedHandler class implements doing nothing after processing.
     This should only be used for debugging"""
@@ -93,17 +236,29 @@ class ProcessHandlerTrackFile(ProcessedHandler):
     def __init__(self, trackFile):
         self._processed = None
         self._pfile = None
+        self._curdir = None
         self._trackFile = trackFile
         self._logger = logging.getLogger("LQMT.PostProcess.Track")
+        # processed() may be called from a different thread than the directory traversal
+        self._lock = threading.Lock()
 
     def processed(self, fpath):
-        self._pfile.write(os.path.basename(fpath) + '\n')
-        self._pfile.flush()
+        file_dir, file_name = os.path.split(fpath)
+        with self._lock:
+            if os.path.normpath(file_dir) == self._curdir and self._pfile is not None:
+                self._pfile.write(file_name + '\n')
+                self._pfile.flush()
+                os.fsync(self._pfile.fileno())
+            else:
+                # the traversal has already left the directory of this file
+                with open(os.path.join(file_dir, self._trackFile), 'a') as pfile:
+                    pfile.write(file_name + '\n')
+                    pfile.flush()
+                    os.fsync(pfile.fileno())
         self._logger.debug("File '{0}' written to track file at location '{1}'".format(
-            os.path.basename(fpath),
+            file_name,
             self._trackFile
         ))
-        os.fsync(self._pfile.fileno())
 
     def isProcessed(self, fpath):
         """
@@ -123,16 +278,114 @@ class ProcessHandlerTrackFile(ProcessedHandler):
     def enteringDirectory(self, path):
         pfile = os.path.join(path, self._trackFile)
         try:
-            self._processed = {}
-            open(pfile, 'a').close()  # ensures file is writable
-            f = open(pfile, 'r')
-            for line in f:
-                self._processed[line.rstrip()] = 1
-            f.close()
-            self._pfile = open(pfile, 'a')
+            with self._lock:
+                self._processed = {}
+                open(pfile, 'a').close()  # ensures file is writable
+                f = open(pfile, 'r')
+                for line in f:
+                    self._processed[line.rstrip()] = 1
+                f.close()
+                self._pfile = open(pfile, 'a')
+                self._curdir = os.path.normpath(path)
         except IOError as e:
             raise ValueError('procfile (%s) generated an IO Error: %s\n' % (pfile, e.strerror))
 
     def leavingDirectory(self, path):
-        self._pfile.close()
-        self._processed = None
+        with self._lock:
+            self._pfile.close()
+            self._pfile = None
+            self._curdir = None
+            self._processed = None
+
+
+class ProcessHandlerTrackDB(ProcessedHandler):
+    """This ProcessedHandler class implements tracking the processed files in a SQLite database in WAL mode.
+    Lookups use the primary key of the database, so the history of a directory isn't loaded into memory, and the
+    tracked files are committed in batches instead of being synced to disk one at a time."""
+
+    # values of track_sync and the synchronous setting of the database used for them
+    syncModes = {"always": "FULL", "batch": "NORMAL", "off": "OFF"}
+
+    def __init__(self, trackDB, sync="batch", batchSize=100, importFile=None):
+        """
+        :param trackDB: Path of the tracking database
+        :param sync: "always" commits and syncs every tracked file. "batch" commits every batchSize files and when a
+        directory is left or the run ends. "off" commits like "batch", but leaves syncing to the operating system.
+        :param batchSize: Number of tracked files per commit
+        :param importFile: Name of the track file of the track file handler. Track files found in the directories are
+        imported into the database once, so files tracked before switching to the database aren't processed again.
+        """
+        self._logger = logging.getLogger("LQMT.PostProcess.TrackDB")
+        self._batchSize = 1 if sync == "always" else batchSize
+        self._importFile = importFile
+        self._pending = 0
+        # the handler is shared by the concurrent traversals of a source and processed() may be called from a
+        # different thread than the traversal
+        self._lock = threading.Lock()
+        dbDir = os.path.dirname(trackDB)
+        if dbDir and not os.path.exists(dbDir):
+            os.makedirs(dbDir, 0o755, True)
+        self._conn = sqlite3.connect(trackDB, check_same_thread=False, timeout=30)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute("pragma synchronous={0}".format(self.syncModes[sync]))
+        self._conn.execute("create table if not exists processed "
+                           "(dir text, name text, time integer, primary key (dir, name)) without rowid")
+        self._conn.execute("create table if not exists imported (dir text primary key)")
+        self._conn.commit()
+
+    @staticmethod
+    def _key(fpath):
+        file_dir, file_name = os.path.split(fpath)
+        return os.path.abspath(file_dir), file_name
+
+    def processed(self, fpath):
+        with self._lock:
+            self._conn.execute("insert or ignore into processed (dir, name, time) values (?, ?, ?)",
+                               self._key(fpath) + (int(time.time()),))
+            self._pending += 1
+            if self._pending >= self._batchSize:
+                self._commit()
+        self._logger.debug("File '{0}' tracked in the tracking database".format(fpath))
+
+    def isProcessed(self, fpath):
+        with self._lock:
+            rec = self._conn.execute("select 1 from processed where dir=? and name=?", self._key(fpath)).fetchone()
+        if rec is not None:
+            self._logger.debug("File {} was previously processed and tracked. It will not be processed again.".format(
+                os.path.basename(fpath)
+            ))
+            return True
+        return False
+
+    def enteringDirectory(self, path):
+        if self._importFile:
+            self._importTrackFile(path)
+
+    def leavingDirectory(self, path):
+        self.commit()
+
+    def commit(self):
+        with self._lock:
+            self._commit()
+
+    def _commit(self):
+        if self._pending:
+            self._conn.commit()
+            self._pending = 0
+
+    def _importTrackFile(self, path):
+        """Import the track file of the directory, if it hasn't been imported yet"""
+        key = os.path.abspath(path)
+        with self._lock:
+            if self._conn.execute("select 1 from imported where dir=?", (key,)).fetchone() is not None:
+                return
+            pfile = os.path.join(path, self._importFile)
+            if os.path.exists(pfile):
+                with open(pfile, 'r') as f:
+                    names = set(line.rstrip() for line in f if line.strip())
+                self._conn.executemany("insert or ignore into processed (dir, name, time) values (?, ?, ?)",
+                                       ((key, name, int(os.path.getmtime(pfile))) for name in names))
+                self._logger.info("Imported {0} tracked files from '{1}'".format(len(names), pfile))
+            self._conn.execute("insert into imported (dir) values (?)", (key,))
+            self._conn.commit()
+            self._pending = 0
@@ -0,0 +1,145 @@
+import heapq
+import itertools
+import logging
+
+import arrow
+
+# priority of sites and payload types without a configured priority, so they are processed after all configured ones
+_UNLISTED = float('inf')
+
+
+class FileScheduler(object):
+    """
+    Reorders the accepted alert files by their metadata, so that files from urgent feeds are processed first. Files are
+    ordered by the metadata fields in scheduleBy, in that order:
+    - SendingSite: the configured priority of the site. Lower values are processed first.
+    - PayloadType: the configured priority of the payload type. Lower values are processed first.
+    - SentTimestamp: older files are processed first.
+    Files with the same priority keep the order they were found in. Up to window files are kept in a heap, so discovery
+    doesn't have to finish before the first file is processed.
+    """
+
+    fields = ["SendingSite", "PayloadType", "SentTimestamp"]
+
+    def __init__(self, scheduleBy, window=1000, sitePriority=None, payloadTypePriority=None):
+        """
+        :param scheduleBy: List of the metadata fields the files are ordered by
+        :param window: Maximum number of files held to be reordered. 0 reads all files before processing the first.
+        :param sitePriority: Dictionary of SendingSite to priority
+        :param payloadTypePriority: Dictionary of PayloadType to priority
+        """
+        self._logger = logging.getLogger("LQMT.Scheduler")
+        self._scheduleBy = scheduleBy
+        self._window = window
+        self._priorities = {
+            "SendingSite": self._lower(sitePriority or {}),
+            "PayloadType": self._lower(payloadTypePriority or {})
+        }
+
+    @staticmethod
+    def _lower(priorities):
+        return dict((str(key).lower(), value) for key, value in priorities.items())
+
+    def _key(self, metadata):
+        """Return the sort key of a file"""
+        key = []
+        for field in self._scheduleBy:
+            value = metadata.get(field)
+            if field == "SentTimestamp":
+                key.append(self._timestamp(value))
+            else:
+                key.append(self._priorities[field].get(str(value).lower(), _UNLISTED) if value is not None
+                           else _UNLISTED)
+        return tuple(key)
+
+    @staticmethod
+    def _timestamp(value):
+        """Return the SentTimestamp as seconds since the epoch. Missing or invalid timestamps are processed last."""
+        if value is None:
+            return _UNLISTED
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            pass
+        try:
+            return arrow.get(value).float_timestamp
+        except Exception:
+            return _UNLISTED
+
+    def order(self, files):
+        """
+        Generator reordering the files.
+        :param files: Iterable of (datafile, metadata) tuples
+        :return: Yields the (datafile, metadata) tuples, most urgent first
+        """
+        heap = []
+        counter = itertools.count()
+        for datafile, metadata in files:
+            heapq.heappush(heap, (self._key(metadata), next(counter), datafile, metadata))
+            if self._window and len(heap) >= self._window:
+                key, seq, datafile, metadata = heapq.heappop(heap)
+                yield datafile, metadata
+        while heap:
+            key, seq, datafile, metadata = heapq.heappop(heap)
+            yield datafile, metadata
+
+
+class ExpiryScheduler(object):
+    """
+    Keeps a heap of the next time the state of each toolchain expires, e.g. the end of a Palo Alto block, so that a
+    watching controller can let the toolchains apply expirations although no new alert files arrive.
+    A toolchain that failed to expire its state, e.g. because its device is unreachable, is retried after a delay that
+    doubles with each consecutive failure, up to maxBackoff.
+    """
+
+    def __init__(self, chains, maxBackoff):
+        """
+        :param chains: The push toolchains
+        :param maxBackoff: Maximum number of seconds between two attempts of a failing toolchain
+        """
+        self._chains = chains
+        self._maxBackoff = maxBackoff
+        self._heap = []
+        # index of each failing toolchain -> (number of consecutive failures, time of the next attempt)
+        self._failures = {}
+
+    def update(self):
+        """Reads the next expiry of each toolchain. Called after the toolchains were committed or expired."""
+        self._heap = []
+        for index, chain in enumerate(self._chains):
+            if chain.isEnabled():
+                expiry = chain.nextExpiry()
+                if expiry is not None:
+                    if index in self._failures:
+                        expiry = max(expiry, self._failures[index][1])
+                    self._heap.append((expiry, index))
+        heapq.heapify(self._heap)
+
+    def timeout(self, interval, now):
+        """
+        :return: Returns the number of seconds to wait for new files until the next expiry, at most interval. Waits at
+        least a second, so expirations that are due are not checked in a busy loop.
+        """
+        if not self._heap:
+            return interval
+        return min(interval, max(self._heap[0][0] - now, 1))
+
+    def due(self, now):
+        """
+        :return: Returns the toolchains whose next expiry has passed. They are removed from the heap until update().
+        """
+        chains = []
+        while self._heap and self._heap[0][0] <= now:
+            chains.append(self._chains[heapq.heappop(self._heap)[1]])
+        return chains
+
+    def failed(self, chain, now):
+        """Delays the next attempt of a toolchain that failed to expire its state"""
+        index = self._chains.index(chain)
+        failures = self._failures.get(index, (0, None))[0] + 1
+        delay = min(2 ** (failures - 1), self._maxBackoff)
+        self._failures[index] = (failures, now + delay)
+
+    def succeeded(self, chain):
+        """Resets the delay of a toolchain once it expired its state"""
+        self._failures.pop(self._chains.index(chain), None)
@@ -1,30 +1,118 @@
 from . import processed
+import arrow
+import fnmatch
+import itertools
 import os
-from .sources import Source
+import re
+from .sources import Source, ConcurrentFiles
+from .sourcefilter import parseFileAge
+from .watch import createWatcher
 from lqmt.lqm.exceptions import ConfigurationError
 import logging
 
 
+class FilePrefilter(object):
+    """
+    Rejects alert files on their name, size and modification time while the directories are traversed, so that the
+    metadata of the rejected files is never read. A file is modified after it was sent, so a file whose modification
+    time is older than max_file_age would also be rejected by the max_file_age of the source filters.
+    """
+
+    def __init__(self, includes=None, excludes=None, minSize=0, maxAge=None):
+        """
+        :param includes: List of file name patterns (fnmatch) of the data files that are accepted. All data files are
+        accepted if it is empty.
+        :param excludes: List of file name patterns of the data files that are rejected
+        :param minSize: Minimum size in bytes of the data files
+        :param maxAge: Maximum age of the data files, e.g. "2 weeks"
+        """
+        self._includes = self._compile(includes)
+        self._excludes = self._compile(excludes)
+        self._minSize = minSize
+        self._shift = parseFileAge(maxAge) if maxAge is not None else None
+        self._cutoff = None
+
+    @staticmethod
+    def _compile(patterns):
+        """Compile the file name patterns into a single regular expression, or None if there are none"""
+        if not patterns:
+            return None
+        return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns))
+
+    def isEnabled(self):
+        return bool(self._includes or self._excludes or self._minSize or self._shift)
+
+    def start(self):
+        """Compute the modification time cutoff for the next traversal"""
+        if self._shift is not None:
+            self._cutoff = arrow.utcnow().shift(**self._shift).float_timestamp
+
+    def accept(self, entry):
+        """
+        :param entry: os.DirEntry of the data file
+        :return: Returns whether the file passed the prefilter
+        """
+        if self._includes is not None and not self._includes.match(entry.name):
+            return False
+        if self._excludes is not None and self._excludes.match(entry.name):
+            return False
+        if self._minSize or self._cutoff is not None:
+            try:
+                stat = entry.stat()
+            except OSError:
+                # removed since the directory was listed
+                return False
+            if stat.st_size < self._minSize:
+                return False
+            if self._cutoff is not None and stat.st_mtime <= self._cutoff:
+                return False
+        return True
+
+
 class FilesToProcess(object):
-    """Implements a directory traversal of each of the top-level dirs this object is initialized with"""
+    """
+    Implements a directory traversal of each of the top-level dirs this object is initialized with.
+    Each directory is listed once with os.scandir. Data files are paired with their metadata files (the data file's
+    name prefixed with a '.') from that listing, and the entry types cached by scandir are used instead of separate
+    stat calls for each entry.
+    """
 
-    def __init__(self, dirs, postProcess):
+    def __init__(self, dirs, postProcess, recursive=True, prefilter=None):
+        """
+        :param dirs: Top-level directories to traverse
+        :param postProcess: The ProcessedHandler of the files
+        :param recursive: If False, the sub-directories of the top-level directories aren't traversed
+        :param prefilter: FilePrefilter the data files have to pass, or None
+        """
         self._iters = []
         self._dirs = dirs
+        self._recursive = recursive
         self._dirIter = iter(self._dirs)
         self._curFiles = None
         self._curDir = None
         self._postProcess = postProcess
+        self._prefilter = prefilter
         self.numFiles = 0
         self.numDirs = 0
+        self.numRejected = 0
 
         self._getNextTLD()
 
+    @staticmethod
+    def _listDirectory(path):
+        """
+        List a directory.
+        :return: Returns the path, an iterator over the DirEntry objects of the directory and the set of entry names
+        """
+        # the scandir iterator is closed once it is exhausted. It is only a context manager since Python 3.6.
+        entries = list(os.scandir(path))
+        return path, iter(entries), set(entry.name for entry in entries)
+
     def _getNextTLD(self):
         # get the next top-level directory
         self._currentTLD = next(self._dirIter)
         # and put the iterator for the list of files in the directory on the _iters list
-        self._iters.append((self._currentTLD, iter(os.listdir(self._currentTLD))))
+        self._iters.append(self._listDirectory(self._currentTLD))
 
     def _advanceToNextFile(self):
         """Advance to the next file"""
@@ -32,42 +120,47 @@ class FilesToProcess(object):
         while not found:
             # while a valid file pair (file/metadata file) has not been found
             # get the last dir & iter on the iters list
-            dirName, cDirIter = self._iters[-1]
+            dirName, cDirIter, names = self._iters[-1]
             try:
                 # get the next entry from the dir
                 entry = next(cDirIter)
-                path = dirName + "/" + entry
-                if os.path.isdir(path):
+                path = dirName + "/" + entry.name
+                if entry.is_dir():
                     # if it is a path and it is not to be skipped,
                     # append an iterator of the directory's contents
-                    if not self._postProcess.skipDirectory(path):
-                        self._iters.append((path, iter(os.listdir(path))))
-                elif not entry.startswith("."):
-                    # otherwise, if the entry doesn't start with a '.'
-                    if os.path.isfile(path):
-                        # and it is a file, check to see if a metadata file exists
-                        if os.path.exists(dirName + "/." + entry):
-                            # if there is a matching metadata file
-                            # check to see if we have left a directory
-                            if self._curDir != dirName:
-                                # if we have, then tell the post processor
-                                if self._curDir is not None:
-                                    self._postProcess.leavingDirectory(self._curDir)
-                                self._curDir = dirName
-                                self._postProcess.enteringDirectory(self._curDir)
-                                self.numDirs += 1
+                    if self._recursive and not self._postProcess.skipDirectory(path):
+                        self._iters.append(self._listDirectory(path))
+                elif not entry.name.startswith("."):
+                    # otherwise, if the entry doesn't start with a '.' and it is a file,
+                    # check to see if a metadata file exists
+                    if "." + entry.name in names and entry.is_file():
+                        # if there is a matching metadata file
+                        # check to see if we have left a directory
+                        if self._curDir != dirName:
+                            # if we have, then tell the post processor
+                            if self._curDir is not None:
+                                self._postProcess.leavingDirectory(self._curDir)
                             self._curDir = dirName
-                            # if the file hasn't already been processed, then we found the next file
-                            if not self._postProcess.isProcessed(path):
-                                # so set the flag to exit the loop and save the file info for retrieval
-                                found = True
-                                self._curFiles = (path, dirName + "/." + entry)
+                            self._postProcess.enteringDirectory(self._curDir)
+                            self.numDirs += 1
+                        # if the file hasn't already been processed, then we found the next file
+                        if not self._postProcess.isProcessed(path):
+                            if self._prefilter is not None and not self._prefilter.accept(entry):
+                                self.numRejected += 1
+                                continue
+                            # so set the flag to exit the loop and save the file info for retrieval
+                            found = True
+                            self._curFiles = (path, dirName + "/." + entry.name)
             except StopIteration:
                 # if the iteration of the current dir is done
                 # get the next dir, if any, and continue
                 self._iters.pop()
                 if len(self._iters) == 0:
-                    self._getNextTLD()
+                    try:
+                        self._getNextTLD()
+                    except StopIteration:
+                        # all top-level directories have been traversed
+                        break
         if not found:
             if self._curDir is not None:
                 self._postProcess.leavingDirectory(self._curDir)
@@ -90,7 +183,12 @@ class DirectorySource(Source):
     its children that haven't already been processed (as determined by the post-processor specified
     in its configuration)."""
 
-    def __init__(self, config):
+    def __init__(self, config, configDir=None):
+        """
+        :param config: The Source.Directory section of the user configuration
+        :param configDir: Directory of the user configuration file, which relative paths of the configuration are
+        resolved against. Relative paths are resolved against the current directory if None.
+        """
         self._logger = logging.getLogger("LQMT.Source.Directory")
         self.files_to_process = None
         self.post_process = "move"
@@ -114,38 +212,161 @@ class DirectorySource(Source):
                 raise ConfigurationError(
                     "Invalid value for key: 'post_process' in section: 'Source.Directory': " + self.post_process)
 
+        self.track_backend = config.get('track_backend', "file")
+        if self.track_backend not in ["file", "sqlite"]:
+            raise ConfigurationError(
+                "Invalid value for key: 'track_backend' in section: 'Source.Directory': " + self.track_backend)
         if 'post_process_location' in config:
             self.post_process_location = config['post_process_location']
         else:
-            if self.post_process == "track":
+            if self.post_process == "track" and self.track_backend == "file":
                 self._logger.info(" Post process option is currently set to track, but a post_process_location was not"
                                   "provided in the user configuration. Using the default location of "
                                   "{0}".format(self.post_process_location))
 
+        # database of the sqlite track backend, relative paths are relative to the user configuration
+        self.track_db = config.get('track_db')
+        if self.post_process == "track" and self.track_backend == "sqlite":
+            if self.track_db is None:
+                raise ConfigurationError(
+                    "Missing required key: 'track_db' in section: 'Source.Directory' for track_backend 'sqlite'")
+            self.track_db = os.path.join(configDir or os.getcwd(), os.path.expanduser(self.track_db))
+        self.track_sync = config.get('track_sync', "batch")
+        if self.track_sync not in processed.ProcessHandlerTrackDB.syncModes:
+            raise ConfigurationError(
+                "Invalid value for key: 'track_sync' in section: 'Source.Directory': " + self.track_sync)
+        self.track_batch_size = config.get('track_batch_size', 100)
+        if not isinstance(self.track_batch_size, int) or isinstance(self.track_batch_size, bool) \
+                or self.track_batch_size < 1:
+            raise ConfigurationError(
+                "Invalid value for key: 'track_batch_size' in section: 'Source.Directory': {0}".format(
+                    self.track_batch_size))
+        self.track_import = config.get('track_import')
+        self.post_process_queue = config.get('post_process_queue', False)
+        if not isinstance(self.post_process_queue, bool):
+            raise ConfigurationError(
+                "Invalid value for key: 'post_process_queue' in section: 'Source.Directory': {0}".format(
+                    self.post_process_queue))
+        self._prefilter = self._getPrefilter(config)
+
+        # the tracking database is shared by all traversals of the source
+        self._trackDB = None
         self._processedHandler = self._getProcessedHandler()
+        self._walkers = []
+        # statistics of the traversals that are done, e.g. the earlier traversals of a watched source
+        self._numDirs = 0
+        self._numFiles = 0
+        self._numRejected = 0
+        # post-processor of each file found by the concurrent traversal, until the file has been processed
+        self._handlers = {}
+
+    def getFilesToProcess(self, threads=1):
+        """
+        Return an iterator over all file pairs of the source. If threads is greater than 1, the top-level directories
+        are traversed concurrently, each with its own post-processor.
+        """
+        self._handlers = {}
+        self._retireWalkers()
+        prefilter = self._startPrefilter()
+        if threads <= 1 or len(self._dirs) <= 1:
+            self.files_to_process = FilesToProcess(self._dirs, self._processedHandler, prefilter=prefilter)
+            self._walkers = [self.files_to_process]
+            return self.files_to_process
+
+        self._walkers = [FilesToProcess([dirName], self._getProcessedHandler(), prefilter=prefilter)
+                         for dirName in self._dirs]
+        self.files_to_process = ConcurrentFiles(self._walkers, threads)
+        return self._concurrentFiles(self.files_to_process)
+
+    def getWatcher(self):
+        return createWatcher(self._dirs, self._processedHandler.skipDirectory)
+
+    def getChangedFiles(self, changes):
+        """
+        Return an iterator over the file pairs of the changed directories.
+        :param changes: List of (directory, recursive) tuples as returned by the watcher of the source, or None to
+        traverse all directories
+        """
+        if changes is None:
+            return self.getFilesToProcess()
+        self._handlers = {}
+        self._retireWalkers()
+        deep = [dirName for dirName, recursive in changes if recursive]
+        flat = [dirName for dirName, recursive in changes if not recursive and dirName not in deep]
+        prefilter = self._startPrefilter()
+        self._walkers = [FilesToProcess(dirs, self._processedHandler, recursive, prefilter)
+                         for dirs, recursive in ((flat, False), (deep, True)) if dirs]
+        return itertools.chain(*self._walkers)
 
-    def getFilesToProcess(self):
-        self.files_to_process = FilesToProcess(self._dirs, self._processedHandler)
-        return self.files_to_process
+    @staticmethod
+    def _getPrefilter(config):
+        """Create the FilePrefilter of the source, or return None if no prefilter option is set"""
+        includes = config.get('file_includes', [])
+        excludes = config.get('file_excludes', [])
+        for key, patterns in (('file_includes', includes), ('file_excludes', excludes)):
+            if not isinstance(patterns, list) or not all(isinstance(pattern, str) for pattern in patterns):
+                raise ConfigurationError(
+                    "Invalid value for key: '{0}' in section: 'Source.Directory': {1}".format(key, patterns))
+        minSize = config.get('min_file_size', 0)
+        if not isinstance(minSize, int) or isinstance(minSize, bool) or minSize < 0:
+            raise ConfigurationError(
+                "Invalid value for key: 'min_file_size' in section: 'Source.Directory': {0}".format(minSize))
+        prefilter = FilePrefilter(includes, excludes, minSize, config.get('max_file_age'))
+        return prefilter if prefilter.isEnabled() else None
+
+    def _startPrefilter(self):
+        if self._prefilter is not None:
+            self._prefilter.start()
+        return self._prefilter
+
+    def _retireWalkers(self):
+        """Add the statistics of the previous traversal to the totals"""
+        self._numDirs += sum(walker.numDirs for walker in self._walkers)
+        self._numFiles += sum(walker.numFiles for walker in self._walkers)
+        self._numRejected += sum(walker.numRejected for walker in self._walkers)
+        self._walkers = []
+
+    def _concurrentFiles(self, files):
+        for index, (datafile, metafile) in files:
+            self._handlers[datafile] = self._walkers[index]._postProcess
+            yield datafile, metafile
 
     def _getProcessedHandler(self):
-        if self.post_process == "move":
+        if self.post_process in ["move", "delete"] and self.post_process_queue:
+            handler = processed.ProcessHandlerMove() if self.post_process == "move" else processed.ProcessHandlerDelete()
+            return processed.ProcessHandlerQueue(handler)
+        elif self.post_process == "move":
             return processed.ProcessHandlerMove()
         elif self.post_process == "delete":
             return processed.ProcessHandlerDelete()
+        elif self.post_process == "track" and self.track_backend == "sqlite":
+            if self._trackDB is None:
+                self._trackDB = processed.ProcessHandlerTrackDB(self.track_db, self.track_sync,
+                                                                self.track_batch_size, self.track_import)
+            return self._trackDB
         elif self.post_process == "track":
             return processed.ProcessHandlerTrackFile(self.post_process_location)
         else:
             return processed.ProcessHandlerDoNothing()
 
     def processed(self, datafile):
-        self._processedHandler.processed(datafile)
+        self._handlers.pop(datafile, self._processedHandler).processed(datafile)
+
+    def commit(self):
+        handlers = set(walker._postProcess for walker in self._walkers)
+        handlers.add(self._processedHandler)
+        for handler in handlers:
+            handler.commit()
 
     def logStatistics(self, numAlerts):
         self._logger.info(
             "dirs: {0} Directories Scanned: {1}, Files located: {2}".format(
                 ",".join(self._dirs),
-                self.files_to_process.numDirs,
-                self.files_to_process.numFiles
+                self._numDirs + sum(walker.numDirs for walker in self._walkers),
+                self._numFiles + sum(walker.numFiles for walker in self._walkers)
             )
         )
+        numRejected = self._numRejected + sum(walker.numRejected for walker in self._walkers)
+        if numRejected:
+            self._logger.info("dirs: {0} Files rejected by the prefilter: {1}".format(",".join(self._dirs),
+                                                                                     numRejected))
@@ -1,21 +1,61 @@
+import time
 import arrow
 from lqmt.lqm.exceptions import ConfigurationError
 
+# units of max_file_age and the arrow shift argument for each of them
+_AGE_UNITS = {}
+for _unit, _names in (('seconds', ['s', 'sec', 'secs', 'second', 'seconds']),
+                      ('minutes', ['m', 'min', 'minute', 'minutes']),
+                      ('hours', ['h', 'hr', 'hrs', 'hour', 'hours']),
+                      ('days', ['d', 'day', 'days']),
+                      ('weeks', ['w', 'week', 'weeks']),
+                      ('months', ['mon', 'month', 'months']),
+                      ('years', ['y', 'yr', 'yrs', 'year', 'years'])):
+    for _name in _names:
+        _AGE_UNITS[_name] = _unit
+
+
+def parseFileAge(value):
+    """
+    Parses a file age, e.g. "2 weeks", into the arguments of arrow's shift.
+    :param value: File age in the %d %s format
+    :return: Dictionary with the unit and the negative amount of the file age, e.g. {'weeks': -2}
+    """
+    cols = value.split(' ')
+    if cols[0].isdigit():
+        num = -1 * int(cols[0])
+    else:
+        raise ConfigurationError(
+            "Unable to parse file age \"{0}\" expecting %d %s format (e.g. 2 weeks)".format(value))
+
+    if len(cols) < 2 or cols[1] not in _AGE_UNITS:
+        raise ConfigurationError(
+            "Unable to determine time string in \"{0}\". Refer to documentation for accepted time strings.".format(value))
+
+    return {_AGE_UNITS[cols[1]]: num}
+
+
 class SourceFilters(object):
     def __init__(self, config):
         """
-        Initialization function for class handling file source filters
+        Initialization function for class handling file source filters. The configured values are lower cased into
+        frozensets once and the file age is parsed once, so checkAllFilters only does set lookups and a comparison of
+        the timestamp against a cached cutoff.
         :param config: Dictionary of the user configuration section for Sources.Filters
         :return: None
         """
-        self._site_includes = []
-        self._site_excludes = []
-        self._payload_types = []
-        self._payload_formats = []
-        self._sensitivities = []
-        self._restrictions = []
-        self._reconnaissance = []
+        self._site_includes = frozenset()
+        self._site_excludes = frozenset()
+        self._payload_types = frozenset()
+        self._payload_formats = frozenset()
+        self._sensitivities = frozenset()
+        self._restrictions = frozenset()
+        self._reconnaissance = frozenset()
         self._max_file_age = None
+        # the max_file_age the shift was parsed from and the arrow shift arguments
+        self._parsedAge = (None, None)
+        # the cutoff epoch of the file age filter and when it was computed
+        self._cutoff = (None, None)
 
         if 'site_includes' in config:
             self._site_includes = self.__list_lower(config['site_includes'])
@@ -33,41 +73,40 @@ class SourceFilters(object):
             self._reconnaissance = self.__list_lower(config['reconnaissance'])
         if 'max_file_age' in config:
             self._max_file_age = config['max_file_age']
+            # report invalid file ages when the configuration is loaded
+            self._getAgeShift()
 
     def __list_lower(self, value):
         """
         Lower cases a list that is provided.
         :param value: List of strings to be converted to lower case
-        :return ret: Converted list
+        :return ret: Frozenset of the converted strings
         """
-        ret = []
-
-        for i in value:
-            ret.append(i.lower())
-
-        return ret
+        return frozenset(i.lower() for i in value)
 
     def checkAllFilters(self, metafile):
         """
-        Performs all the available filter checks against the file meta-data.
+        Performs all the available filter checks against the file meta-data. Same as calling each of the check
+        methods, but filters that aren't configured are skipped.
         :param metafile: Meta-data file to compare to the filter parameters
         :return: Boolean for whether file has passed the pre-filtering settings
         """
-        if not self.checkSendingSite(metafile):
-            return False
-        if not self.checkPayloadType(metafile):
+        if metafile is None or 'SendingSite' not in metafile:
             return False
-        if not self.checkPayloadFormat(metafile):
-            return False
-        if not self.checkDataSensitivity(metafile):
-            return False
-        if not self.checkSharingRestrictions(metafile):
-            return False
-        if not self.checkReconPolicy(metafile):
-            return False
-        if not self.checkFileAge(metafile):
+        site = metafile['SendingSite'].lower()
+        if (self._site_includes and site not in self._site_includes) or site in self._site_excludes:
             return False
 
+        for field, allowed in (('PayloadType', self._payload_types), ('PayloadFormat', self._payload_formats),
+                               ('DataSensitivity', self._sensitivities), ('SharingRestrictions', self._restrictions),
+                               ('ReconPolicy', self._reconnaissance)):
+            if allowed:
+                value = metafile.get(field)
+                if value is None or value.lower() not in allowed:
+                    return False
+
+        if self._max_file_age is not None:
+            return self.checkFileAge(metafile)
         return True
 
     def checkSendingSite(self, metafile):
@@ -203,52 +242,44 @@ class SourceFilters(object):
         :param metafile: Meta-data file to compare to the filter parameters
         :return: Boolean for whether file has passed the pre-filtering settings
         """
-        ret = False
-        now = arrow.utcnow()
-        filetime = None
-        num = 0
-        second = ['s', 'sec', 'secs', 'second', 'seconds']
-        minute = ['m', 'min', 'minute', 'minutes']
-        hour = ['h', 'hr', 'hrs', 'hour', 'hours']
-        day = ['d', 'day', 'days']
-        week = ['w', 'week', 'weeks']
-        month = ['mon', 'month', 'months']
-        year = ['y', 'yr', 'yrs', 'year', 'years']
-
         if metafile is None:
             return False
 
         if self._max_file_age is None:
             return True
 
-        cols = self._max_file_age.split(' ')
-        if cols[0].isdigit():
-            num = -1 * int(cols[0])
-        else:
-            raise ConfigurationError(
-                "Unable to parse file age \"{0}\" expecting %d %s format (e.g. 2 weeks)".format(self._max_file_age))
-
-        if cols[1] in second:
-            shift = now.shift(seconds=num)
-        elif cols[1] in minute:
-            shift = now.shift(minutes=num)
-        elif cols[1] in hour:
-            shift = now.shift(hours=num)
-        elif cols[1] in day:
-            shift = now.shift(days=num)
-        elif cols[1] in week:
-            shift = now.shift(weeks=num)
-        elif cols[1] in month:
-            shift = now.shift(months=num)
-        elif cols[1] in year:
-            shift = now.shift(years=num)
-        else:
-            raise ConfigurationError(
-                "Unable to determine time string in \"{0}\". Refer to documentation for accepted time strings.".format(self._max_file_age))
-
         if 'SentTimestamp' in metafile:
-            filetime = arrow.get(metafile['SentTimestamp'])
-            if filetime > shift:
-                ret = True
+            return self._timestamp(metafile['SentTimestamp']) > self._getCutoff()
 
-        return ret
+        return False
+
+    def _getAgeShift(self):
+        """
+        Parses max_file_age into the arguments of arrow's shift. The result is cached until max_file_age changes.
+        :return: Dictionary with the unit and the negative amount of the file age, e.g. {'weeks': -2}
+        """
+        if self._parsedAge[0] != self._max_file_age:
+            self._parsedAge = (self._max_file_age, parseFileAge(self._max_file_age))
+            self._cutoff = (None, None)
+        return self._parsedAge[1]
+
+    def _getCutoff(self):
+        """
+        :return: Returns the epoch files have to be sent after to pass the file age filter. It is computed at most
+        once a second, so a long-running process still moves the cutoff along.
+        """
+        shift = self._getAgeShift()
+        cutoff, computed = self._cutoff
+        now = time.monotonic()
+        if cutoff is None or now - computed >= 1:
+            cutoff = arrow.utcnow().shift(**shift).float_timestamp
+            self._cutoff = (cutoff, now)
+        return cutoff
+
+    @staticmethod
+    def _timestamp(value):
+        """Return the SentTimestamp as seconds since the epoch. Numeric timestamps are converted without arrow."""
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return arrow.get(value).float_timestamp
@@ -1,14 +1,115 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Marks the end of the files of one iterator
+_END = object()
+
+
 class Source(object):
     """The superclass for all sources"""
     
-    def getFilesToProcess(self):
-        """Return an iterator that will return alert/metadta file tuples"""
+    def getFilesToProcess(self, threads=1):
+        """
+        Return an iterator that will return alert/metadta file tuples
+        :param threads: Number of threads the source may use to discover files concurrently
+        """
         NotImplementedError
 
+    def getWatcher(self):
+        """
+        Return a watcher (see watch.py) reporting the changes of the source, or None if the source can't be watched
+        """
+        return None
+
+    def getChangedFiles(self, changes):
+        """
+        Return an iterator over the alert/metadata file tuples affected by the changes reported by the watcher
+        :param changes: Changes returned by the watcher, or None to return all files
+        """
+        return self.getFilesToProcess()
+
     def processed(self,datafile):
         """A file pair has been processed"""
         NotImplementedError
         
+    def commit(self):
+        """Make the post-processing of the processed files durable. Called at the end of a run or batch of files."""
+        pass
+
     def logStatistics(self, numAlerts):
         """Print any statistics to loggers.  This is called when the source has been completely traversed"""
-        NotImplementedError
\ No newline at end of file
+        NotImplementedError
+
+
+class ConcurrentFiles(object):
+    """
+    Merges the files of several iterators into one iterator. Each iterator is traversed by a thread of a pool and the
+    files are returned in the order they were found, so slow iterators (e.g. on a different mount) don't hold up the
+    others.
+    """
+
+    def __init__(self, iterators, threads, queueSize=256):
+        """
+        :param iterators: The iterators to merge
+        :param threads: Maximum number of iterators traversed at once
+        :param queueSize: Maximum number of files found but not yet returned
+        """
+        self._iterators = iterators
+        self._threads = threads
+        self._queue = queue.Queue(queueSize)
+        self._stopped = threading.Event()
+        self._remaining = len(iterators)
+        self._executor = None
+
+    def _start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self._threads, thread_name_prefix="LQMT-discover")
+        for index, iterator in enumerate(self._iterators):
+            self._executor.submit(self._traverse, index, iterator)
+
+    def _traverse(self, index, iterator):
+        error = None
+        try:
+            for item in iterator:
+                if not self._put((index, item, None)):
+                    return
+        except Exception as e:
+            error = e
+        self._put((index, _END, error))
+
+    def _put(self, item):
+        """Put an item on the queue, giving up if the iteration was stopped while waiting for space"""
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """
+        :return: Returns a tuple of the index of the iterator that found the file and the file
+        """
+        if self._executor is None:
+            self._start()
+        while self._remaining:
+            index, item, error = self._queue.get()
+            if item is _END:
+                self._remaining -= 1
+                if error is not None:
+                    self.close()
+                    raise error
+                continue
+            return index, item
+        self.close()
+        raise StopIteration()
+
+    def close(self):
+        """Stop traversing the iterators"""
+        self._stopped.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -1,6 +1,6 @@
 import re
 import logging
-from lqmt.lqm.data import AlertAction
+from lqmt.lqm.data import AlertAction, AlertBatch
 from lqmt.lqm.unprocessed import UnprocessedAlertHandler
 from lqmt.lqm.exceptions import ConfigurationError
 
@@ -182,6 +182,34 @@ class Tool:
         """Process the alert."""
         NotImplementedError
 
+    # Will only be called for alerts this tool can process
+    def process_batch(self, alerts):
+        """
+        Process all alerts of a file at once. Tools that can handle a whole file more efficiently than one alert at a
+        time should override this.
+        :param alerts: The alerts to process, e.g. an AlertBatch
+        """
+        for alert in alerts:
+            self.process(alert)
+
+    def flush(self):
+        """
+        Called when the alerts held in memory crossed the configured threshold. Tools that collect alerts until they
+        are committed should write them to their database or device, so memory use stays bounded on large backlogs.
+        """
+        pass
+
+    def nextExpiry(self):
+        """
+        :return: Returns the time (seconds since the epoch) at which the state written to the device expires, e.g. the
+        end of the next block, or None if nothing expires. Used to expire the state when no new alerts arrive.
+        """
+        return None
+
+    def expire(self):
+        """Called once the time returned by nextExpiry passed, to remove the expired state from the device"""
+        pass
+
     def commit(self):
         """Called at the end of processing to allow the tool to perform any finalization"""
         NotImplementedError
@@ -280,6 +308,7 @@ class ToolChain:
                 self._actionsToProcess |= tool.getActionsToProcess()
         self._alertsProcessed = 0
         self._alertsNotProcessed = 0
+        self._dispatch = None
 
     def isEnabled(self):
         if self._enabled and self._tools:
@@ -290,6 +319,19 @@ class ToolChain:
         # tell all the tools to initialize
         for tool in self._tools:
             tool.initialize()
+        self._initDispatch()
+
+    def _initDispatch(self):
+        """
+        Decide once how alerts are passed to each tool: the data formats the tool accepts and whether the tool is given
+        the alert data file instead of the parsed alerts.
+        """
+        self._processAll = AlertAction.get('All') in self._actionsToProcess
+        self._dispatch = []
+        for tool in self._tools:
+            # FlexText and MBL require the datafile instead of the processed data.
+            fileTool = tool.toolName == "FlexText" or tool.toolName == 'MBL'
+            self._dispatch.append((tool, frozenset(tool.dataFormat), fileTool))
 
     def fileBegin(self):
         """A new file is about to be processed."""
@@ -314,18 +356,20 @@ class ToolChain:
          because the alert has to be reprocessed for FlexText
         """
         if self.isEnabled():
+            if self._dispatch is None:
+                self._initDispatch()
             # if the alert can be processed by this toolchain, then process it
-            if data.getAction() in self._actionsToProcess or AlertAction.get('All') in self._actionsToProcess:
+            if self._processAll or data.getAction() in self._actionsToProcess:
                 # if indicator isn't whitelisted, proceed with processing. Otherwise ignore processing
                 # and log the whitelist block.
                 if isWhitelisted is False:
                     # self._alertsProcessed += 1
                     alert_used = False
-                    for tool in self._tools:
-                        if type(data).__name__ in tool.dataFormat:
+                    dataFormat = type(data).__name__
+                    for tool, formats, fileTool in self._dispatch:
+                        if dataFormat in formats:
                             alert_used = True
-                            # FlexText requires the datafile instead of the processed data.
-                            if tool.toolName == "FlexText" or tool.toolName == 'MBL':
+                            if fileTool:
                                 tool.process(datafile, meta)
                             else:
                                 tool.process(data)
@@ -336,12 +380,58 @@ class ToolChain:
                     else:
                         self._alertsNotProcessed += 1
                 else:
-                    self._logger.info(
-                        "Alert not processed. IP Indicator is whitelisted. Whitelisted IP:{0}".format(
-                            data.getIPToBlock()))
+                    self._logWhitelisted(data.getIPToBlock())
             else:
                 self._alertsNotProcessed += 1
 
+    def processFile(self, alerts, whitelisted, datafile, meta):
+        """
+        Process all alerts parsed from a file using each tool in the toolchain. If the alerts are an AlertBatch, they
+        are filtered by action and whitelist state in bulk and each tool gets all remaining alerts with a single
+        process_batch call. Tools requiring the datafile are called once for the file. Other alert data is processed
+        one alert at a time.
+
+        :param alerts: the processed alert data of the file
+        :param whitelisted: list with the whitelist state of each alert
+        :param datafile: the directory location of the processed alert datafile
+        :param meta: used to provide parser with information not found in the source data.
+        """
+        if not self.isEnabled():
+            return
+        if not isinstance(alerts, AlertBatch):
+            for alert, isWhitelisted in zip(alerts, whitelisted):
+                self.process(alert, isWhitelisted, datafile, meta)
+            return
+        if self._dispatch is None:
+            self._initDispatch()
+
+        actionable = alerts.actionMask(self._actionsToProcess)
+        keep = [a and not wl for a, wl in zip(actionable, whitelisted)]
+        self._alertsNotProcessed += actionable.count(False)
+        for ip, a, wl in zip(alerts.getIPsToBlock(), actionable, whitelisted):
+            if a and wl:
+                self._logWhitelisted(ip)
+
+        numKept = keep.count(True)
+        if numKept == 0:
+            return
+        tools = [(tool, fileTool) for tool, formats, fileTool in self._dispatch if "Alert" in formats]
+        if not tools:
+            # if no tool maps to the format type, the alerts are not processed
+            self._alertsNotProcessed += numKept
+            return
+        if numKept < len(alerts):
+            alerts = alerts.select(keep)
+        for tool, fileTool in tools:
+            if fileTool:
+                tool.process(datafile, meta)
+            else:
+                tool.process_batch(alerts)
+        self._alertsProcessed += numKept
+
+    def _logWhitelisted(self, ip):
+        self._logger.info("Alert not processed. IP Indicator is whitelisted. Whitelisted IP:{0}".format(ip))
+
     def pull_process(self):
         if self.isEnabled():
             for tool in self._tools:
@@ -350,6 +440,27 @@ class ToolChain:
                 tool.commit()
                 tool.cleanup()
 
+    def flush(self):
+        """Called when the alerts held in memory crossed the configured threshold"""
+        if self.isEnabled():
+            for tool in self._tools:
+                tool.flush()
+
+    def nextExpiry(self):
+        """Return the earliest time the state of one of the tools expires, or None"""
+        expiries = [expiry for expiry in (tool.nextExpiry() for tool in self._tools if tool.isEnabled())
+                    if expiry is not None]
+        return min(expiries) if expiries else None
+
+    def expire(self, now):
+        """Lets the tools whose next expiry passed remove the expired state"""
+        if self.isEnabled():
+            for tool in self._tools:
+                if tool.isEnabled():
+                    expiry = tool.nextExpiry()
+                    if expiry is not None and expiry <= now:
+                        tool.expire()
+
     def commit(self):
         """Called at the end of processing to allow the tool chain to perform any finalization"""
         if self.isEnabled():
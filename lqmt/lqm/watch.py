@@ -0,0 +1,230 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import time
+
+# inotify event masks, see inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+# header of an inotify event: watch descriptor, mask, cookie and length of the name that follows
+_EVENT = struct.Struct("iIII")
+
+_libc = None
+
+
+def _getLibc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    return _libc
+
+
+def createWatcher(dirs, skipDirectory):
+    """
+    Create a watcher for the directory trees. inotify is used where it is available, otherwise the trees are polled.
+    :param dirs: Top-level directories to watch
+    :param skipDirectory: Function returning True for directories that aren't watched, e.g. the processed directories
+    :return: Returns an InotifyWatcher or a PollingWatcher
+    """
+    try:
+        return InotifyWatcher(dirs, skipDirectory)
+    except (OSError, AttributeError) as e:
+        logging.getLogger("LQMT.Watch").info("inotify is not available ({0}). Polling the directories instead.".format(e))
+        return PollingWatcher(dirs, skipDirectory)
+
+
+def waitForChanges(watchers, timeout, stopped):
+    """
+    Wait until one of the watchers saw changes, the timeout expired or the stopped event was set.
+    :param watchers: List of watchers. None stands for a source that can't be watched.
+    :param timeout: Maximum number of seconds to wait
+    :param stopped: threading.Event that ends the wait when it is set
+    :return: Returns the changes of each watcher (see DirectoryWatcher.changes). Sources that can't be watched are
+    returned as None, so they are traversed completely.
+    """
+    fds = [watcher.fileno() for watcher in watchers if watcher is not None and watcher.fileno() is not None]
+    if fds and len(fds) == len(watchers):
+        deadline = time.monotonic() + timeout
+        while not stopped.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # wait in short slices so that a stop request isn't delayed by a long interval
+            if select.select(fds, [], [], min(remaining, 0.5))[0]:
+                break
+    else:
+        stopped.wait(timeout)
+    return [watcher.changes() if watcher is not None else None for watcher in watchers]
+
+
+class DirectoryWatcher(object):
+    """
+    Superclass of the watchers of directory trees. A watcher reports the directories whose file pairs (alert/metadata)
+    changed since the last call of changes().
+    """
+
+    def __init__(self, dirs, skipDirectory):
+        self._logger = logging.getLogger("LQMT.Watch")
+        self._dirs = dirs
+        self._skipDirectory = skipDirectory
+
+    def fileno(self):
+        """Return a file descriptor that becomes readable when there are changes, or None if there is none"""
+        return None
+
+    def changes(self):
+        """
+        :return: Returns a list of (directory, recursive) tuples of the directories that have to be traversed again.
+        Sub-directories are only traversed if recursive is True. Returns None if the whole tree has to be traversed.
+        """
+        return []
+
+    def close(self):
+        pass
+
+    def _walk(self, path):
+        """Generator over the directories of the tree below path, including path, that aren't skipped"""
+        stack = [path]
+        while stack:
+            dirName = stack.pop()
+            yield dirName
+            try:
+                # listed completely, which closes the scandir iterator also before Python 3.6
+                for entry in list(os.scandir(dirName)):
+                    if entry.is_dir() and not self._skipDirectory(dirName + "/" + entry.name):
+                        stack.append(dirName + "/" + entry.name)
+            except OSError:
+                # the directory was removed while walking the tree
+                pass
+
+    @staticmethod
+    def _isPair(dirName, name):
+        """Return whether the file is the alert or metadata file of a complete file pair"""
+        if name.startswith("."):
+            name = name[1:]
+        return os.path.isfile(dirName + "/" + name) and os.path.isfile(dirName + "/." + name)
+
+
+class InotifyWatcher(DirectoryWatcher):
+    """
+    Watches the directory trees with inotify. A directory is reported once a data or metadata file of a complete file
+    pair was written (IN_CLOSE_WRITE) or moved into it (IN_MOVED_TO). Directories created in the tree are watched as
+    well and reported with their sub-directories.
+    """
+
+    def __init__(self, dirs, skipDirectory):
+        super().__init__(dirs, skipDirectory)
+        libc = _getLibc()
+        self._addWatch = libc.inotify_add_watch
+        self._addWatch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self._paths = {}
+        try:
+            for dirName in dirs:
+                self._watchTree(dirName)
+        except OSError:
+            self.close()
+            raise
+
+    def _watchTree(self, path):
+        for dirName in self._walk(path):
+            wd = self._addWatch(self._fd, os.fsencode(dirName), _WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOENT or err == errno.ENOTDIR:
+                    # removed before it could be watched
+                    continue
+                raise OSError(err, "Unable to watch {0}: {1}".format(dirName, os.strerror(err)))
+            self._paths[wd] = dirName
+
+    def fileno(self):
+        return self._fd
+
+    def _readEvents(self):
+        """Generator over the (watch descriptor, mask, name) of the pending events"""
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            pos = 0
+            while pos < len(buf):
+                wd, mask, cookie, length = _EVENT.unpack_from(buf, pos)
+                pos += _EVENT.size
+                name = os.fsdecode(buf[pos:pos + length].rstrip(b"\0"))
+                pos += length
+                yield wd, mask, name
+
+    def changes(self):
+        changed = {}
+        for wd, mask, name in self._readEvents():
+            if mask & IN_Q_OVERFLOW:
+                self._logger.warning("Too many file system events. Traversing all directories.")
+                for _ in self._readEvents():
+                    pass
+                return None
+            if mask & IN_IGNORED:
+                # the directory was removed
+                self._paths.pop(wd, None)
+                continue
+            dirName = self._paths.get(wd)
+            if dirName is None:
+                continue
+            path = dirName + "/" + name
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not self._skipDirectory(path):
+                    # a new directory, which may already contain files
+                    self._watchTree(path)
+                    changed[path] = True
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and self._isPair(dirName, name):
+                changed.setdefault(dirName, False)
+        # the directories below a new directory are traversed with it. Their events may already be read if files were
+        # written to them right after they were watched.
+        new = [path + "/" for path, recursive in changed.items() if recursive]
+        return [(dirName, recursive) for dirName, recursive in changed.items()
+                if not any(dirName.startswith(path) for path in new)]
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher(DirectoryWatcher):
+    """
+    Polls the directory trees with os.scandir. A directory is reported when its modification time changed, i.e. when
+    entries were added to, renamed in or removed from it.
+    """
+
+    def __init__(self, dirs, skipDirectory):
+        super().__init__(dirs, skipDirectory)
+        self._mtimes = self._snapshot()
+
+    def _snapshot(self):
+        mtimes = {}
+        for path in self._dirs:
+            for dirName in self._walk(path):
+                try:
+                    mtimes[dirName] = os.stat(dirName).st_mtime_ns
+                except OSError:
+                    pass
+        return mtimes
+
+    def changes(self):
+        mtimes = self._snapshot()
+        changed = [(dirName, False) for dirName, mtime in mtimes.items() if self._mtimes.get(dirName) != mtime]
+        self._mtimes = mtimes
+        return changed
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase, main
+from lqmt.lqm.checkpoint import Checkpoints, FlushThreshold, currentMemory
+from lqmt.lqm.config import ProcessingConfig
+from lqmt.lqm.exceptions import ConfigurationError
+
+
+class Source(object):
+    """Source recording the post-processed files"""
+
+    def __init__(self):
+        self.files = []
+
+    def processed(self, datafile):
+        self.files.append(datafile)
+
+
+class TestCheckpoints(TestCase):
+    """
+    Testing class for the periodic commits of the toolchains.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.journal = os.path.join(self.tmpdir, "journal", "checkpoint")
+        self.sources = [Source(), Source()]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_disabled(self):
+        checkpoints = Checkpoints()
+        self.assertFalse(checkpoints.isEnabled())
+        checkpoints.add(self.sources[0], "a")
+        self.assertFalse(checkpoints.isDue())
+
+    def test_due_after_files(self):
+        checkpoints = Checkpoints(files=2)
+        checkpoints.add(self.sources[0], "a")
+        self.assertFalse(checkpoints.isDue())
+        checkpoints.add(self.sources[0], "b")
+        self.assertTrue(checkpoints.isDue())
+        self.assertEqual(checkpoints.committed(self.sources), [(self.sources[0], "a"), (self.sources[0], "b")])
+        self.assertFalse(checkpoints.isDue())
+
+    def test_due_after_interval(self):
+        checkpoints = Checkpoints(interval=0.01)
+        self.assertTrue(checkpoints.isEnabled())
+        checkpoints._last -= 1
+        self.assertTrue(checkpoints.isDue())
+
+    def test_recover_journal(self):
+        checkpoints = Checkpoints(files=10, journal=self.journal)
+        checkpoints.add(self.sources[0], "/data/a.xml")
+        checkpoints.add(self.sources[1], "/data/b.xml")
+        checkpoints.committed(self.sources)
+        # the run is interrupted before the files are post-processed
+        recovered = Checkpoints(journal=self.journal).recover(self.sources)
+        self.assertEqual(recovered, [(self.sources[0], "/data/a.xml"), (self.sources[1], "/data/b.xml")])
+
+    def test_done_removes_journal(self):
+        checkpoints = Checkpoints(files=10, journal=self.journal)
+        checkpoints.add(self.sources[0], "/data/a.xml")
+        checkpoints.committed(self.sources)
+        checkpoints.done()
+        self.assertEqual(Checkpoints(journal=self.journal).recover(self.sources), [])
+
+    def test_config(self):
+        config = ProcessingConfig({'checkpoint_files': 100, 'checkpoint_interval': 1.5})
+        self.assertEqual(config.checkpoint_files, 100)
+        self.assertEqual(config.checkpoint_interval, 1.5)
+        self.assertRaises(ConfigurationError, ProcessingConfig, {'checkpoint_files': -1})
+        self.assertRaises(ConfigurationError, ProcessingConfig, {'checkpoint_interval': "60"})
+        # the pipeline commits the toolchains once all files have been processed
+        self.assertRaises(ConfigurationError, ProcessingConfig, {'pipeline': True, 'checkpoint_files': 100})
+        self.assertRaises(ConfigurationError, ProcessingConfig, {'pipeline': True, 'checkpoint_interval': 60})
+
+
+
+class TestFlushThreshold(TestCase):
+    """
+    Testing class for deciding when the toolchains flush their alerts.
+    """
+
+    def test_disabled(self):
+        threshold = FlushThreshold()
+        self.assertFalse(threshold.add(1000000))
+
+    def test_alerts(self):
+        threshold = FlushThreshold(alerts=10)
+        self.assertFalse(threshold.add(6))
+        self.assertTrue(threshold.add(6))
+        # the count starts over after a flush
+        self.assertFalse(threshold.add(6))
+
+    def test_memory(self):
+        if currentMemory() is None:
+            self.skipTest("memory of the process can't be determined")
+        threshold = FlushThreshold(memory=1)
+        self.assertTrue(threshold.add(1))
+        # the memory isn't returned to the system, so it doesn't flush again until the memory grew
+        self.assertFalse(threshold.add(1))
+        self.assertFalse(threshold.add(1))
+
+
+if __name__ == '__main__':
+    main()
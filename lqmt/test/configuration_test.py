@@ -1,4 +1,6 @@
 import os
+import shutil
+import tempfile
 import toml
 from unittest import TestCase, main
 from lqmt.lqm.tool import ToolConfig
@@ -27,7 +29,8 @@ class TestConfiguration(TestCase):
         self.logging = self.logging.replace("\\", "/")
         self.whitelist = self.directory + "/test_data/whitelist/whitelist.txt"
         self.whitelist = self.whitelist.replace("\\", "/")
-        self.whitelist_db = self.directory + "/test_data/whitelist/whitelist.db"
+        self.tmpdir = tempfile.mkdtemp()
+        self.whitelist_db = self.tmpdir + "/whitelist.db"
         self.whitelist_db = self.whitelist_db.replace("\\", "/")
 
         # configurations initialized
@@ -39,6 +42,10 @@ class TestConfiguration(TestCase):
         self.user_config = LQMToolConfig(config)
         self.toolConfig = ToolConfig(self.toml_config, csvToolInfo={""}, unhandledCSV={""})
 
+    def tearDown(self):
+        self.user_config.getWhitelist().conn.close()
+        shutil.rmtree(self.tmpdir)
+
     def test_user_sources(self):
         """
         Note the replace call. The alert path was replaced with 4 slashes above due to a TOML restriction. After TOML
@@ -0,0 +1,142 @@
+import pickle
+from unittest import TestCase, main
+from lqmt.lqm.data import Alert, AlertBatch
+from lqmt.whitelist.master import IndicatorTypes
+
+
+class TestAlert(TestCase):
+    """
+    Testing class for the Alert intermediate format object.
+    """
+
+    def setUp(self):
+        self.alert = Alert()
+        self.alert.setFromDict({'indicator': '10.10.10.10', 'indicatorType': 'IPv4Address',
+                                'indicatorDirection': 'source', 'action1': 'Block', 'duration1': '86400',
+                                'sensitivity': 'noSensitivity', 'notAField': 'ignored'})
+
+    def test_no_instance_dict(self):
+        self.assertFalse(hasattr(self.alert, '__dict__'))
+
+    def test_set_from_dict(self):
+        self.assertEqual(self.alert._indicator, '10.10.10.10')
+        self.assertEqual(self.alert.getAction(), 'Block')
+        self.assertEqual(self.alert.getSourceIP(), '10.10.10.10')
+        self.assertIsNone(self.alert.getDestIP())
+        self.assertIsNone(self.alert.getReason())
+
+    def test_set_invalid_action(self):
+        self.assertRaises(Exception, Alert().setFromDict, {'action1': 'Explode'})
+
+    def test_get_fields(self):
+        self.assertEqual(self.alert.getFields(['indicator', 'duration1', 'comment']), ['"10.10.10.10"', '86400', ''])
+
+    def test_get_invalid_field(self):
+        self.assertRaises(Exception, self.alert.getFields, ['notAField'])
+
+    def test_get_all_fields(self):
+        fields = self.alert.getAllFields()
+        self.assertEqual(len(fields), len(Alert._alertFields.fields))
+        self.assertIn('"Block"', fields)
+
+    def test_get_all_fields_dictionary(self):
+        fields = self.alert.getAllFields(dictionary=True, parseEmpty=True)
+        self.assertEqual(fields, {'indicator': '"10.10.10.10"', 'indicatorType': '"IPv4Address"',
+                                  'indicatorDirection': '"source"', 'action1': '"Block"', 'duration1': '86400',
+                                  'sensitivity': '"noSensitivity"'})
+
+    def test_get_all_fields_empty_value(self):
+        fields = self.alert.getAllFields(dictionary=True, emptyValue="none")
+        self.assertEqual(fields['comment'], '"none"')
+
+    def test_pickle(self):
+        alert = pickle.loads(pickle.dumps(self.alert))
+        self.assertEqual(alert.getAllFields(), self.alert.getAllFields())
+
+
+
+class FakeWhitelist(object):
+    """Whitelist whitelisting a fixed set of (indicator type, indicator) tuples"""
+
+    def __init__(self, whitelisted):
+        self.whitelisted = whitelisted
+        self.calls = 0
+
+    def areWhitelisted(self, indicators):
+        self.calls += 1
+        return [indicator in self.whitelisted for indicator in indicators]
+
+
+class TestAlertBatch(TestCase):
+    """
+    Testing class for the columnar AlertBatch container.
+    """
+
+    def setUp(self):
+        self.dicts = [
+            {'indicator': '10.10.10.10', 'indicatorType': 'IPv4Address', 'action1': 'Block', 'duration1': '86400'},
+            {'indicator': 'bad.example.com', 'indicatorType': 'DNSHostName', 'action1': 'Notify'},
+            {'indicator': '10.10.10.11', 'indicatorType': 'IPv4Address', 'action1': 'Revoke',
+             'secondaryIndicator': 'good.example.com', 'secondaryIndicatorType': 'DNSHostName'}
+        ]
+        self.batch = AlertBatch()
+        for d in self.dicts:
+            self.batch.addFromDict(d)
+        self.alerts = []
+        for d in self.dicts:
+            alert = Alert()
+            alert.setFromDict(d)
+            self.alerts.append(alert)
+
+    def test_len(self):
+        self.assertEqual(len(self.batch), 3)
+        self.assertFalse(AlertBatch())
+
+    def test_alerts(self):
+        self.assertIsInstance(self.batch[0], Alert)
+        self.assertEqual([alert.getAllFields() for alert in self.batch],
+                         [alert.getAllFields() for alert in self.alerts])
+
+    def test_add_alert(self):
+        batch = AlertBatch()
+        for alert in self.alerts:
+            batch.addAlert(alert)
+        self.assertEqual(batch.getColumn('indicator'), self.batch.getColumn('indicator'))
+
+    def test_add_invalid_action(self):
+        self.assertRaises(Exception, self.batch.addFromDict, {'action1': 'Explode'})
+        self.assertEqual(len(self.batch), 3)
+
+    def test_columns(self):
+        self.assertEqual(self.batch.getActions(), ['Block', 'Notify', 'Revoke'])
+        self.assertEqual(self.batch.getIndicatorTypes(), ['IPv4Address', 'DNSHostName', 'IPv4Address'])
+        self.assertRaises(Exception, self.batch.getColumn, 'notAField')
+
+    def test_get_fields(self):
+        fields = ['indicator', 'action1', 'duration1']
+        self.assertEqual(self.batch.getFields(fields), [alert.getFields(fields) for alert in self.alerts])
+
+    def test_action_mask(self):
+        self.assertEqual(self.batch.actionMask({'Block', 'Revoke'}), [True, False, True])
+        self.assertEqual(self.batch.actionMask({'All'}), [True, True, True])
+
+    def test_whitelist_mask(self):
+        wl = FakeWhitelist({(IndicatorTypes.host, 'good.example.com')})
+        self.assertEqual(self.batch.whitelistMask(wl), [False, False, True])
+        self.assertEqual(wl.calls, 1)
+        self.assertEqual(self.batch.whitelistMask(None), [False, False, False])
+
+    def test_select(self):
+        selected = self.batch.select([True, False, True])
+        self.assertEqual(selected.getColumn('indicator'), ['10.10.10.10', '10.10.10.11'])
+        self.assertEqual(len(self.batch), 3)
+
+    def test_pickle(self):
+        self.batch[0]
+        batch = pickle.loads(pickle.dumps(self.batch))
+        self.assertEqual([alert.getAllFields() for alert in batch],
+                         [alert.getAllFields() for alert in self.batch])
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,7 @@ import arrow
 from unittest import TestCase, main
 from lqmt.test.test_data.filters.filter_configs import TESTCONFIG1
 from lqmt.test.test_data.filters.filter_inputs import INPUT1
+from lqmt.lqm.exceptions import ConfigurationError
 from lqmt.lqm.sourcefilter import SourceFilters
 
 
@@ -206,6 +207,38 @@ class TestFilters(TestCase):
         meta['SentTimestamp'] = str(now.shift(years=-3, seconds=-10).timestamp)
         self.assertFalse(self.filters.checkFileAge(meta))
 
+    def test_compiled_filters(self):
+        # configured values are lower cased once into sets
+        self.assertEqual(self.filters._site_includes, frozenset(['site1']))
+        self.assertEqual(self.filters._payload_formats, frozenset(['stix']))
+
+    def test_missing_field(self):
+        meta = json.loads(INPUT1)
+        meta['SentTimestamp'] = str(arrow.utcnow().timestamp)
+        del meta['PayloadType']
+        self.assertFalse(self.filters.checkAllFilters(meta))
+        self.assertFalse(self.filters.checkAllFilters(None))
+
+    def test_invalid_file_age(self):
+        with self.assertRaises(ConfigurationError):
+            SourceFilters({'max_file_age': '2 fortnights'})
+        with self.assertRaises(ConfigurationError):
+            SourceFilters({'max_file_age': 'two weeks'})
+
+    def test_file_age_cutoff(self):
+        meta = json.loads(INPUT1)
+        self.filters._max_file_age = "1 hour"
+        # the cutoff is cached and recomputed when the age changes
+        cutoff = self.filters._getCutoff()
+        self.assertEqual(self.filters._getCutoff(), cutoff)
+        self.filters._max_file_age = "30 min"
+        self.assertGreater(self.filters._getCutoff(), cutoff)
+        # ISO timestamps are accepted as well as epochs
+        meta['SentTimestamp'] = arrow.utcnow().shift(minutes=-10).isoformat()
+        self.assertTrue(self.filters.checkFileAge(meta))
+        meta['SentTimestamp'] = arrow.utcnow().shift(minutes=-40).isoformat()
+        self.assertFalse(self.filters.checkFileAge(meta))
+
 
 if __name__ == '__main__':
     main()
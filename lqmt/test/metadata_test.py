@@ -0,0 +1,109 @@
+import ast
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase, main
+from lqmt.lqm.metadata import parseMetadata, MetadataReader
+
+METADATA = """{'PayloadFormat': 'Cfm13Alert', 'SendingSite': 'ANL', 'PayloadType': 'Alert', 'FileName': 'alert.xml',
+'SentTimestamp': '1500000000', 'DataSensitivity': 'noSensitivity', 'ReconPolicy': 'Touch', 'UploadID': 42}"""
+
+
+class TestParseMetadata(TestCase):
+    """
+    Testing class for parsing metadata files.
+    """
+
+    def test_flat_dict(self):
+        self.assertEqual(parseMetadata(METADATA), ast.literal_eval(METADATA))
+
+    def test_json(self):
+        self.assertEqual(parseMetadata('{"PayloadFormat": "STIX", "Count": 1.5, "More": null}'),
+                         {'PayloadFormat': 'STIX', 'Count': 1.5, 'More': None})
+
+    def test_constants(self):
+        text = "{'a': True, 'b': False, 'c': None, 'd': -3, 'e': 'x',}"
+        self.assertEqual(parseMetadata(text), ast.literal_eval(text))
+
+    def test_empty(self):
+        self.assertEqual(parseMetadata("{ }"), {})
+
+    def test_nested_values(self):
+        text = "{'PayloadFormat': 'STIX', 'Sites': ['ANL', 'ORNL'], 'Escaped': 'it\\'s'}"
+        self.assertEqual(parseMetadata(text), ast.literal_eval(text))
+
+    def test_invalid(self):
+        self.assertRaises(Exception, parseMetadata, "{'PayloadFormat': ")
+        self.assertRaises(Exception, parseMetadata, "{'PayloadFormat': 'STIX'} trailing")
+
+
+class TestMetadataReader(TestCase):
+    """
+    Testing class for the metadata cache.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = os.path.join(self.tmpdir, "cache", "metadata.db")
+        self.metafile = os.path.join(self.tmpdir, ".alert.xml")
+        with open(self.metafile, "w") as f:
+            f.write(METADATA)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_no_cache(self):
+        reader = MetadataReader()
+        self.assertEqual(reader.read(self.metafile)['UploadID'], 42)
+        reader.close()
+
+    def test_cached(self):
+        reader = MetadataReader(self.cache)
+        meta = reader.read(self.metafile)
+        reader.close()
+
+        reader = MetadataReader(self.cache)
+        self.assertEqual(reader.read(self.metafile), meta)
+        self.assertEqual((reader.hits, reader.misses), (1, 0))
+        reader.close()
+
+    def test_changed_file(self):
+        reader = MetadataReader(self.cache)
+        reader.read(self.metafile)
+        reader.close()
+        with open(self.metafile, "w") as f:
+            f.write("{'PayloadFormat': 'STIX'}")
+
+        reader = MetadataReader(self.cache)
+        self.assertEqual(reader.read(self.metafile), {'PayloadFormat': 'STIX'})
+        self.assertEqual((reader.hits, reader.misses), (0, 1))
+        reader.close()
+
+    def test_concurrent_reads(self):
+        metafiles = []
+        for i in range(50):
+            metafiles.append(os.path.join(self.tmpdir, ".alert{0}.xml".format(i)))
+            with open(metafiles[-1], "w") as f:
+                f.write(METADATA)
+        reader = MetadataReader(self.cache)
+        # flush while the other threads keep adding updates
+        reader._batchSize = 7
+        threads = [threading.Thread(target=lambda files: [reader.read(metafile) for metafile in files],
+                                    args=(metafiles[i::4],)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        reader.close()
+
+        # no update was lost
+        reader = MetadataReader(self.cache)
+        for metafile in metafiles:
+            reader.read(metafile)
+        self.assertEqual((reader.hits, reader.misses), (50, 0))
+        reader.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import TestCase, main
+from pan.xapi import PanXapiError
+from lqmt.lqm.data import AlertBatch
+from lqmt.tools.to_paloalto.config import PaloAltoConfig
+from lqmt.tools.to_paloalto.ebl import BlockListFiles
+from lqmt.tools.to_paloalto.tool import ToPaloAlto, Block
+from lqmt.whitelist.master import IndicatorTypes
+
+
+class FakeXapi(object):
+    def __init__(self):
+        self.ops = []
+        self.failures = 0
+
+    def op(self, cmd, cmd_xml=False):
+        self.ops.append(cmd)
+        if self.failures:
+            self.failures -= 1
+            raise PanXapiError("unreachable")
+
+
+class FakeConfig(object):
+    """Configuration of a Palo Alto tool without a device"""
+
+    def __init__(self, tmpdir, ipsPerFile=2, numFiles=3):
+        self._conn = sqlite3.connect(":memory:")
+        self._conn.execute("create table blocks (ip text primary key, detect_time integer(11), "
+                           "start_time integer(11), end_time integer(11), duration integer(11))")
+        self._xapi = FakeXapi()
+        self._files = [os.path.join(tmpdir, "ebl{0}.txt".format(i)) for i in range(numFiles)]
+        self._ipsPerFile = ipsPerFile
+
+    def getName(self):
+        return "pa"
+
+    def isEnabled(self):
+        return True
+
+    def getUnprocessedHandler(self):
+        return None
+
+    def getDBConn(self):
+        return self._conn
+
+    def getXapi(self):
+        return self._xapi
+
+    def getBlockFiles(self):
+        return self._files
+
+    def getBlockLists(self):
+        return ["list{0}".format(i) for i in range(len(self._files))]
+
+    def getIPsPerFile(self):
+        return self._ipsPerFile
+
+    def getMaxIPsToBlock(self):
+        return self._ipsPerFile * len(self._files)
+
+    def getDefaultDuration(self):
+        return 3600
+
+    def getPruneMethod(self):
+        return 'Expiration'
+
+
+class TestBlockListFiles(TestCase):
+    """
+    Testing class for the incremental sync of the EBL files.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.files = [os.path.join(self.tmpdir, "ebl{0}.txt".format(i)) for i in range(3)]
+        self.ebl = BlockListFiles(self.files, 2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _contents(self):
+        contents = []
+        for path in self.files:
+            with open(path) as f:
+                contents.append(f.read().split())
+        return contents
+
+    def test_initial_sync(self):
+        self.assertEqual(self.ebl.sync(["1.1.1.3", "1.1.1.1", "1.1.1.2"]), [0, 1, 2])
+        self.assertEqual(self._contents(), [["1.1.1.1", "1.1.1.2"], ["1.1.1.3"], [BlockListFiles.placeholder]])
+
+    def test_unchanged(self):
+        self.ebl.sync(["1.1.1.1", "1.1.1.2", "1.1.1.3"])
+        self.assertEqual(self.ebl.sync(["1.1.1.1", "1.1.1.2", "1.1.1.3"]), [])
+        # a new instance reads the files written by the previous one
+        self.assertEqual(BlockListFiles(self.files, 2).sync(["1.1.1.1", "1.1.1.2", "1.1.1.3"]), [])
+
+    def test_delta(self):
+        self.ebl.sync(["1.1.1.1", "1.1.1.2", "1.1.1.3"])
+        # only the file with room for the new IP changes
+        self.assertEqual(self.ebl.sync(["1.1.1.1", "1.1.1.2", "1.1.1.3", "1.1.1.0"]), [1])
+        self.assertEqual(self._contents()[1], ["1.1.1.0", "1.1.1.3"])
+        # a removed IP frees room in its file, which the next new IP takes
+        self.assertEqual(self.ebl.sync(["1.1.1.2", "1.1.1.3", "1.1.1.0", "1.1.1.9"]), [0])
+        self.assertEqual(self._contents()[0], ["1.1.1.2", "1.1.1.9"])
+
+    def test_overflow(self):
+        self.ebl.sync(["1.1.1.{0}".format(i) for i in range(8)])
+        self.assertEqual(sum(len(content) for content in self._contents()), 6)
+
+
+class TestToPaloAlto(TestCase):
+    """
+    Testing class for committing blocks to the EBL files.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.config = FakeConfig(self.tmpdir)
+        self.tool = ToPaloAlto(self.config)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_refresh_changed_lists(self):
+        for ip in ("1.1.1.1", "1.1.1.2", "1.1.1.3"):
+            self.tool._blocks[ip] = Block(ip, 100, None)
+        self.tool.commit()
+        self.assertEqual(len(self.config.getXapi().ops), 3)
+        del self.config.getXapi().ops[:]
+        self.tool._blocks["1.1.1.4"] = Block("1.1.1.4", 100, None)
+        self.tool.commit()
+        self.assertEqual(self.config.getXapi().ops, ['request system external-list refresh name "list1"'])
+
+    def test_retry_failed_refresh(self):
+        xapi = self.config.getXapi()
+        xapi.failures = 1
+        self.tool._blocks["1.1.1.1"] = Block("1.1.1.1", 100, None)
+        self.tool.commit()
+        self.assertEqual(len(xapi.ops), 3)
+        # the failed refresh of list0 is retried although its file didn't change, also by a new run
+        del xapi.ops[:]
+        ToPaloAlto(self.config).commit()
+        self.assertEqual(xapi.ops, ['request system external-list refresh name "list0"'])
+        del xapi.ops[:]
+        self.tool.commit()
+        self.assertEqual(xapi.ops, [])
+
+    def _rows(self):
+        return self.config.getDBConn().execute("select ip, detect_time from blocks order by ip").fetchall()
+
+    def test_update_blocks(self):
+        self.tool._blocks["1.1.1.1"] = Block("1.1.1.1", 100, None)
+        self.tool._revokes["1.1.1.2"] = Block("1.1.1.2", 100, None)
+        self.tool.flush()
+        self.tool._blocks["1.1.1.1"] = Block("1.1.1.1", 200, 60)
+        self.tool._blocks["1.1.1.2"] = Block("1.1.1.2", 200, 60)
+        self.tool.flush()
+        self.assertEqual(self._rows(), [("1.1.1.1", 200), ("1.1.1.2", 200)])
+        self.assertEqual((self.tool._totalBlocked, self.tool._totalUpdated), (2, 1))
+        # revokes remove blocks
+        self.tool._revokes["1.1.1.1"] = Block("1.1.1.1", 300, None)
+        self.tool.flush()
+        self.assertEqual(self._rows(), [("1.1.1.2", 200)])
+        self.assertEqual(self.tool._totalRevoked, 1)
+
+    def test_prune(self):
+        for i in range(8):
+            ip = "1.1.1.{0}".format(i)
+            self.tool._blocks[ip] = Block(ip, 100 + i, None if i < 4 else 60)
+        self.tool.flush()
+        # two blocks over the limit of 6 and only four blocks with an expiration
+        self.assertEqual(self.tool._totalPruned, 2)
+        self.assertEqual(len(self._rows()), 6)
+        self.assertEqual(self.tool._pruneByTimeDetected(2), 2)
+        self.assertEqual(self.tool._pruneByTimeAdded(2), 2)
+        self.assertEqual(len(self._rows()), 2)
+
+    def test_expire(self):
+        self.assertIsNone(self.tool.nextExpiry())
+        self.tool._blocks["1.1.1.1"] = Block("1.1.1.1", 100, None)
+        self.tool._blocks["1.1.1.2"] = Block("1.1.1.2", 100, 60)
+        self.tool.commit()
+        endTime = self._rowsEndTime()
+        self.assertEqual(self.tool.nextExpiry(), endTime + 1)
+        del self.config.getXapi().ops[:]
+        self.config.getDBConn().execute("update blocks set end_time=end_time-120")
+        self.tool.expire()
+        self.assertEqual(self._rows(), [("1.1.1.1", 100)])
+        self.assertIsNone(self.tool.nextExpiry())
+        self.assertEqual(self.tool._totalExpired, 1)
+        self.assertEqual(self.config.getXapi().ops, ['request system external-list refresh name "list0"'])
+
+    def test_expire_failed_refresh(self):
+        xapi = self.config.getXapi()
+        # the refreshes of the three new lists and the first retry fail
+        xapi.failures = 4
+        self.tool._blocks["1.1.1.1"] = Block("1.1.1.1", 100, None)
+        self.tool.commit()
+        # the failed refresh is due right away, although no block expires
+        self.assertLessEqual(self.tool.nextExpiry(), time.time())
+        self.assertRaises(PanXapiError, self.tool.expire)
+        del xapi.ops[:]
+        self.tool.expire()
+        self.assertEqual(xapi.ops, ['request system external-list refresh name "list0"'])
+        self.assertIsNone(self.tool.nextExpiry())
+
+    def _rowsEndTime(self):
+        return self.config.getDBConn().execute("select end_time from blocks where ip='1.1.1.2'").fetchone()[0]
+
+    def test_process_batch(self):
+        batch = AlertBatch()
+        for d in ({'indicator': '1.1.1.1', 'indicatorType': 'IPv4Address', 'action1': 'Block',
+                   'detectedTime': '100', 'duration1': '60'},
+                  {'indicator': '1.1.1.2', 'indicatorType': 'IPv4Address', 'action1': 'Revoke', 'detectedTime': '200'},
+                  {'indicator': '1.1.1.2', 'indicatorType': 'IPv4Address', 'action1': 'Revoke', 'detectedTime': '300'},
+                  {'indicator': 'bad.example.com', 'indicatorType': 'DNSHostName', 'action1': 'Revoke'}):
+            batch.addFromDict(d)
+        unprocessed = []
+        self.tool.unprocessed = unprocessed.append
+        self.tool.process_batch(batch)
+        self.assertEqual(self.tool._blocks["1.1.1.1"].getDuration(), 60)
+        self.assertEqual(list(self.tool._revokes), ["1.1.1.2"])
+        self.assertEqual(self.tool._revokes["1.1.1.2"].getDetectedTime(), 300)
+        self.assertEqual([alert.getIndicators() for alert in unprocessed], [[(IndicatorTypes.host, "bad.example.com")]])
+        # alerts processed one by one give the same result
+        tool = ToPaloAlto(self.config)
+        tool.unprocessed = unprocessed.append
+        for alert in batch:
+            tool.process(alert)
+        self.assertEqual(list(tool._revokes), ["1.1.1.2"])
+        self.assertEqual(tool._revokes["1.1.1.2"].getDetectedTime(), 300)
+        self.assertEqual(len(unprocessed), 2)
+
+    def test_set_duration(self):
+        self.tool._blockAddr("1.1.1.1", 100, 60)
+        self.tool._blockAddr("1.1.1.1", 200, 0)
+        self.assertIsNone(self.tool._blocks["1.1.1.1"].getDuration())
+
+    def test_string_fields(self):
+        # the parsers return times and durations as strings
+        batch = AlertBatch()
+        for detected, duration in (("100", "60"), ("300", "120"), ("200", "30")):
+            batch.addFromDict({'indicator': '1.1.1.1', 'indicatorType': 'IPv4Address', 'action1': 'Block',
+                               'detectedTime': detected, 'duration1': duration})
+        self.tool.process_batch(batch)
+        block = self.tool._blocks["1.1.1.1"]
+        self.assertEqual((block.getDetectedTime(), block.getDuration()), (300, 120))
+        self.tool.commit()
+        self.assertEqual(self._rows(), [("1.1.1.1", 300)])
+        self.assertEqual(self.config.getDBConn().execute("select end_time-start_time from blocks").fetchone()[0], 120)
+
+
+class TestMigration(TestCase):
+    """
+    Testing class for updating the schema of existing block databases.
+    """
+
+    def setUp(self):
+        self.config = PaloAltoConfig.__new__(PaloAltoConfig)
+        self.config._logger = logging.getLogger("LQMT.PaloAlto.test")
+        self.config._conn = sqlite3.connect(":memory:")
+
+    def _indexes(self):
+        return sorted(self.config._conn.execute(
+            "select name, sql from sqlite_master where type='index' and tbl_name='blocks' and sql is not null"))
+
+    def test_new_database(self):
+        self.config._migrateDB()
+        self.assertEqual([name for name, sql in self._indexes()], ["detect_time", "end_time", "start_time"])
+        self.assertEqual(self.config._conn.execute("pragma user_version").fetchone()[0], PaloAltoConfig.schemaVersion)
+
+    def test_version_0(self):
+        conn = self.config._conn
+        conn.execute("create table blocks (ip text primary key, detect_time integer(11), start_time integer(11), "
+                     "end_time integer(11), duration integer(11))")
+        conn.execute("create index detect_time on blocks(start_time)")
+        conn.execute("insert into blocks values ('1.1.1.1', 1, 2, 3, 4)")
+        self.config._migrateDB()
+        self.assertIn("(detect_time)", dict(self._indexes())["detect_time"])
+        self.assertEqual(conn.execute("select count(*) from blocks").fetchone()[0], 1)
+
+
+if __name__ == '__main__':
+    main()
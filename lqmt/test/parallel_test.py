@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase, main, mock
+from lqmt.lqm.controller import LQMToolController
+from lqmt.lqm.data import Alert
+from lqmt.lqm.parallel import ParsePool, TransferError, parseAlerts
+from lqmt.whitelist.master import MasterWhitelist
+
+# indicators of the alerts in each file. The first two alerts of "mixed" are whitelisted, the first one by its
+# secondary indicator.
+ALERTS = {
+    'mixed': [("IPv4Address", "10.0.0.1", "IPv4Address", "192.168.1.1"), ("IPv4Address", "192.168.2.5", None, None),
+              ("IPv4Address", "10.0.0.2", None, None), ("IPv6Address", "2001:db8::1", None, None),
+              ("DNSDomainName", "thegoodguys.com", None, None), ("DNSDomainName", "thebadguys.com", None, None)],
+}
+
+
+class FakeParser(object):
+    """
+    Parser creating the alerts of ALERTS, or a single alert for other files. Each alert records the process that
+    parsed it in its comment. The alert of "unpicklable" can't be passed between processes.
+    """
+
+    def parse(self, datafile, metadata):
+        time.sleep(metadata.get('delay', 0))
+        if datafile == "broken":
+            raise ValueError("can't parse " + datafile)
+        alerts = []
+        for indicatorType, indicator, secondaryType, secondary in ALERTS.get(datafile, [("IPv4Address", datafile,
+                                                                                          None, None)]):
+            alert = Alert()
+            alert.setIndicatorType(indicatorType)
+            alert.setIndicator(indicator)
+            alert.setSecondaryIndicatorType(secondaryType)
+            alert.setSecondaryIndicator(secondary)
+            alert.setComment(os.getpid() if datafile != "unpicklable" else threading.Lock())
+            alerts.append(alert)
+        return alerts
+
+
+class FakeProcessingConfig(object):
+    def __init__(self, workers):
+        self.workers = workers
+
+
+class FakeConfig(object):
+    def __init__(self, workers, whitelist):
+        self._processing = FakeProcessingConfig(workers)
+        self._whitelist = whitelist
+        self._parser = FakeParser()
+
+    def getProcessingConfig(self):
+        return self._processing
+
+    def getWhitelist(self):
+        return self._whitelist
+
+    def getParser(self, fmt):
+        return self._parser if fmt == "fake" else None
+
+    def getParserSpecs(self):
+        return {'fake': (FakeParser, None)}
+
+
+class TestParsePool(TestCase):
+    """
+    Testing class for parsing and whitelisting alert files in a pool of processes.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        whitelist = os.path.join(os.path.dirname(__file__), "test_data", "whitelist", "whitelist.txt")
+        self.whitelist = MasterWhitelist(configData={'whitelist': whitelist,
+                                                     'dbfile': os.path.join(self.tmpdir, "whitelist.db")})
+        self.pool = ParsePool(2, {'fake': (FakeParser, None)}, self.whitelist)
+
+    def tearDown(self):
+        self.pool.shutdown()
+        shutil.rmtree(self.tmpdir)
+
+    @staticmethod
+    def _metadata(delay=0):
+        return {'PayloadFormat': "fake", 'delay': delay}
+
+    def test_order(self):
+        # earlier files take longer to parse, so the workers finish them last
+        files = [("10.0.0.{0}".format(i), self._metadata(0.05 * (6 - i))) for i in range(6)]
+        results = [(datafile, result.result()) for datafile, metadata, result in self.pool.imap(files)]
+        self.assertEqual([datafile for datafile, result in results], [datafile for datafile, metadata in files])
+        for datafile, (alerts, whitelisted) in results:
+            self.assertEqual([alert.getIndicators()[0][1] for alert in alerts], [datafile])
+            self.assertNotEqual(alerts[0].getComment(), os.getpid())
+
+    def test_whitelist_mask(self):
+        (datafile, metadata, result), = self.pool.imap([("mixed", self._metadata())])
+        alerts, whitelisted = result.result()
+        self.assertEqual(whitelisted, [alert.isWhitelisted(self.whitelist) for alert in alerts])
+        self.assertEqual(whitelisted, [True, True, False, True, True, False])
+        self.assertEqual(parseAlerts(FakeParser(), self.whitelist, "mixed", metadata)[1], whitelisted)
+
+    def test_broken_file(self):
+        files = [("10.0.0.1", self._metadata()), ("broken", self._metadata()), ("10.0.0.2", self._metadata())]
+        results = list(self.pool.imap(files))
+        self.assertRaises(ValueError, results[1][2].result)
+        # the error only affects its own file and the pool keeps parsing
+        self.assertEqual([result.result()[0][0].getIndicators()[0][1] for i, (datafile, metadata, result)
+                          in enumerate(results) if i != 1], ["10.0.0.1", "10.0.0.2"])
+        (datafile, metadata, result), = self.pool.imap([("10.0.0.3", self._metadata())])
+        self.assertEqual(result.result()[0][0].getIndicators()[0][1], "10.0.0.3")
+
+    def test_unpicklable(self):
+        (datafile, metadata, result), = self.pool.imap([("unpicklable", self._metadata())])
+        self.assertRaises(TransferError, result.result)
+
+    def _controller(self, workers):
+        controller = LQMToolController.__new__(LQMToolController)
+        controller._logger = mock.Mock()
+        controller._config = FakeConfig(workers, self.whitelist)
+        return controller
+
+    def test_single_worker(self):
+        controller = self._controller(1)
+        files = [("10.0.0.1", self._metadata()), ("broken", self._metadata()), ("mixed", self._metadata())]
+        with mock.patch("lqmt.lqm.controller.ParsePool") as pool:
+            parsed = list(controller._parsedFiles(files))
+        # one worker parses in this process without starting a pool
+        self.assertFalse(pool.called)
+        self.assertEqual([data for data, metadata, alerts, whitelisted in parsed], ["10.0.0.1", "mixed"])
+        self.assertEqual(set(alert.getComment() for data, metadata, alerts, whitelisted in parsed
+                             for alert in alerts), {os.getpid()})
+        self.assertEqual(parsed[1][3], [True, True, False, True, True, False])
+
+    def test_multiple_workers(self):
+        controller = self._controller(2)
+        controller._logParseError = mock.Mock()
+        files = [("10.0.0.1", self._metadata()), ("broken", self._metadata()), ("mixed", self._metadata()),
+                 ("unpicklable", self._metadata())]
+        with mock.patch("lqmt.lqm.controller.parseAlerts", wraps=parseAlerts) as local:
+            parsed = list(controller._parsedFiles(files))
+        self.assertEqual([data for data, metadata, alerts, whitelisted in parsed], ["10.0.0.1", "mixed", "unpicklable"])
+        self.assertNotIn(os.getpid(), [alerts[0].getComment() for data, metadata, alerts, whitelisted in parsed[:2]])
+        self.assertEqual(parsed[1][3], [True, True, False, True, True, False])
+        # only the file that couldn't be passed from the pool is parsed again, the broken file is logged once
+        self.assertEqual([call[0][2] for call in local.call_args_list], ["unpicklable"])
+        self.assertEqual([call[0][0] for call in controller._logParseError.call_args_list], ["broken"])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+import itertools
+import threading
+from unittest import TestCase, main
+from lqmt.lqm.checkpoint import FlushThreshold
+from lqmt.lqm.pipeline import Pipeline, _ParsedFile
+
+
+class FakeChain(object):
+    def __init__(self, name, tools, failOn=()):
+        self.name = name
+        self._tools = tools
+        self.failOn = failOn
+        self.received = []
+
+    def isEnabled(self):
+        return True
+
+    def fileBegin(self):
+        pass
+
+    def processFile(self, datafile):
+        self.received.append(datafile)
+        if datafile in self.failOn:
+            raise ValueError("can't process " + datafile)
+
+
+class FakeController(object):
+    """Records what the pipeline passes to the toolchains instead of running tools"""
+
+    def __init__(self, chains, parseError=None):
+        self.toolChains = {'push': chains}
+        self.numAlerts = 0
+        self.processed = []
+        self.errors = []
+        self._parseError = parseError
+
+    def _acceptedFiles(self, alert_files):
+        return alert_files
+
+    def _parsedFiles(self, files):
+        for i, (datafile, metafile) in enumerate(files):
+            if self._parseError is not None and i == self._parseError:
+                raise RuntimeError("parser failed")
+            yield datafile, {}, ["alert"], [False]
+
+    def _process_alerts(self, alerts, whitelisted, chain, datafile, metadata):
+        chain.processFile(datafile)
+
+    def newFlushThreshold(self):
+        return FlushThreshold()
+
+    def _flushChains(self, chains):
+        pass
+
+    def _processed(self, datafile):
+        # records whether every chain had consumed the file when it was post-processed
+        self.processed.append((datafile, all(datafile in chain.received for chain in self.toolChains['push'])))
+
+    def _logParseError(self, data, e):
+        self.errors.append(data)
+
+
+class TestPipeline(TestCase):
+    """
+    Testing class for the staged pipeline between sources, parsers and toolchains.
+    """
+
+    def setUp(self):
+        self.tools = [object() for _ in range(4)]
+        self.files = [("file{0:02}".format(i), None) for i in range(20)]
+
+    def _run(self, pipeline, alert_files):
+        """Run the pipeline in a thread, so a deadlock fails the test instead of hanging it"""
+        errors = []
+
+        def run():
+            try:
+                pipeline.run(alert_files)
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive(), "pipeline didn't finish")
+        return errors
+
+    def test_group_chains(self):
+        t = self.tools
+        chains = [FakeChain("a", [t[0]]), FakeChain("b", [t[1]]), FakeChain("c", [t[2]]),
+                  FakeChain("d", [t[0], t[1]]), FakeChain("e", [t[3]])]
+        groups = Pipeline._groupChains(chains)
+        # d shares a tool with a and with b, so all three are consumed by the same thread
+        self.assertEqual(sorted(sorted(chain.name for chain in group) for group in groups),
+                         [["a", "b", "d"], ["c"], ["e"]])
+
+    def test_discovery_order(self):
+        chains = [FakeChain("a", [self.tools[0]]), FakeChain("b", [self.tools[1]]),
+                  FakeChain("c", [self.tools[0]])]
+        controller = FakeController(chains)
+        self.assertEqual(self._run(Pipeline(controller, 2), iter(self.files)), [])
+        for chain in chains:
+            self.assertEqual(chain.received, [datafile for datafile, metafile in self.files])
+        self.assertEqual(controller.numAlerts, 60)
+
+    def test_post_process_after_all_chains(self):
+        chains = [FakeChain("a", [self.tools[0]]), FakeChain("b", [self.tools[1]], failOn=("file03",)),
+                  FakeChain("c", [self.tools[2]])]
+        controller = FakeController(chains)
+        self._run(Pipeline(controller, 2), iter(self.files))
+        # a file is post-processed once, after the last chain consumed it, unless a chain failed to process it
+        expected = [(datafile, True) for datafile, metafile in self.files if datafile != "file03"]
+        self.assertEqual(sorted(controller.processed), expected)
+        self.assertEqual(controller.errors, ["file03"])
+
+    def test_consumed(self):
+        parsed = _ParsedFile("file", {}, ["alert"], [False], 3)
+        self.assertFalse(parsed.consumed())
+        self.assertFalse(parsed.consumed(failed=True))
+        self.assertFalse(parsed.consumed())
+        parsed = _ParsedFile("file", {}, ["alert"], [False], 2)
+        self.assertFalse(parsed.consumed())
+        self.assertTrue(parsed.consumed())
+
+    def test_slow_chain(self):
+        release = threading.Event()
+
+        class SlowChain(FakeChain):
+            def processFile(self, datafile):
+                release.wait(10)
+                FakeChain.processFile(self, datafile)
+
+        fast = FakeChain("a", [self.tools[0]])
+        chains = [SlowChain("b", [self.tools[1]]), fast]
+        controller = FakeController(chains)
+        thread = threading.Thread(target=Pipeline(controller, 2).run, args=(iter(self.files),))
+        thread.daemon = True
+        thread.start()
+        # the fast chain consumes all files while the slow one is still stuck on the first
+        for _ in range(100):
+            if len(fast.received) == len(self.files):
+                break
+            threading.Event().wait(0.05)
+        self.assertEqual(len(fast.received), len(self.files))
+        self.assertEqual(chains[0].received, [])
+        release.set()
+        thread.join(10)
+        self.assertFalse(thread.is_alive(), "pipeline didn't finish")
+        self.assertEqual(chains[0].received, [datafile for datafile, metafile in self.files])
+        self.assertEqual(len(controller.processed), len(self.files))
+
+    def test_parse_error_aborts(self):
+        chains = [FakeChain("a", [self.tools[0]]), FakeChain("b", [self.tools[1]])]
+        controller = FakeController(chains, parseError=3)
+        # the discovery stage never runs out of files, so it has to be stopped while waiting on its full queue
+        endless = (("file{0}".format(i), None) for i in itertools.count())
+        errors = self._run(Pipeline(controller, 1), endless)
+        self.assertEqual([str(e) for e in errors], ["parser failed"])
+        # the toolchains stop consuming once the pipeline was aborted
+        received = chains[0].received
+        self.assertEqual(received, ["file0", "file1", "file2"][:len(received)])
+
+    def test_discovery_error_aborts(self):
+        def files():
+            yield "file0", None
+            raise OSError("source unavailable")
+
+        controller = FakeController([FakeChain("a", [self.tools[0]])])
+        errors = self._run(Pipeline(controller, 1), files())
+        self.assertEqual([str(e) for e in errors], ["source unavailable"])
+
+
+if __name__ == '__main__':
+    main()
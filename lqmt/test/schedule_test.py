@@ -0,0 +1,103 @@
+from unittest import TestCase, main
+from lqmt.lqm.config import ProcessingConfig
+from lqmt.lqm.exceptions import ConfigurationError
+from lqmt.lqm.schedule import ExpiryScheduler, FileScheduler
+
+
+class TestFileScheduler(TestCase):
+    """
+    Testing class for reordering alert files by their metadata.
+    """
+
+    def setUp(self):
+        self.files = [
+            ("bulk1", {'SendingSite': 'Bulk', 'PayloadType': 'Report', 'SentTimestamp': '1500000300'}),
+            ("urgent2", {'SendingSite': 'ANL', 'PayloadType': 'Alert', 'SentTimestamp': '1500000200'}),
+            ("unknown", {'PayloadType': 'Alert'}),
+            ("urgent1", {'SendingSite': 'anl', 'PayloadType': 'Alert', 'SentTimestamp': '2017-07-14T02:40:00+00:00'}),
+            ("bulk2", {'SendingSite': 'Bulk', 'PayloadType': 'Alert', 'SentTimestamp': 1500000100}),
+        ]
+        self.sitePriority = {'ANL': 1, 'Bulk': 10}
+
+    def _order(self, scheduleBy, window=0, **priorities):
+        scheduler = FileScheduler(scheduleBy, window, **priorities)
+        return [datafile for datafile, metadata in scheduler.order(iter(self.files))]
+
+    def test_site_priority(self):
+        self.assertEqual(self._order(["SendingSite"], sitePriority=self.sitePriority),
+                         ["urgent2", "urgent1", "bulk1", "bulk2", "unknown"])
+
+    def test_site_priority_then_timestamp(self):
+        self.assertEqual(self._order(["SendingSite", "SentTimestamp"], sitePriority=self.sitePriority),
+                         ["urgent1", "urgent2", "bulk2", "bulk1", "unknown"])
+
+    def test_payload_type(self):
+        self.assertEqual(self._order(["PayloadType"], payloadTypePriority={'Alert': 1}),
+                         ["urgent2", "unknown", "urgent1", "bulk2", "bulk1"])
+
+    def test_window(self):
+        # only two files are held at a time, so the first file has to be processed before the last one is found
+        self.assertEqual(self._order(["SentTimestamp"], window=2),
+                         ["urgent2", "bulk1", "urgent1", "bulk2", "unknown"])
+
+    def test_config(self):
+        config = ProcessingConfig({'schedule_by': ['SendingSite'], 'site_priority': {'ANL': 1}})
+        self.assertEqual(config.schedule_window, 1000)
+        self.assertEqual(config.site_priority, {'ANL': 1})
+        self.assertRaises(ConfigurationError, ProcessingConfig, {'schedule_by': ['ReconPolicy']})
+        self.assertRaises(ConfigurationError, ProcessingConfig, {'site_priority': {'ANL': 'high'}})
+
+
+class FakeChain(object):
+    def __init__(self, expiry, enabled=True):
+        self.expiry = expiry
+        self.enabled = enabled
+
+    def isEnabled(self):
+        return self.enabled
+
+    def nextExpiry(self):
+        return self.expiry
+
+
+class TestExpiryScheduler(TestCase):
+    """
+    Testing class for scheduling the expiry of toolchain state.
+    """
+
+    def setUp(self):
+        self.chains = [FakeChain(130), FakeChain(None), FakeChain(110), FakeChain(100, False)]
+        self.scheduler = ExpiryScheduler(self.chains, 5)
+        self.scheduler.update()
+
+    def test_timeout(self):
+        self.assertEqual(self.scheduler.timeout(5, 100), 5)
+        self.assertEqual(self.scheduler.timeout(30, 100), 10)
+        # an expiry that is due waits a second
+        self.assertEqual(self.scheduler.timeout(30, 120), 1)
+        self.assertEqual(ExpiryScheduler([], 5).timeout(30, 100), 30)
+
+    def test_due(self):
+        self.assertEqual(self.scheduler.due(100), [])
+        self.assertEqual(self.scheduler.due(130), [self.chains[2], self.chains[0]])
+        self.assertEqual(self.scheduler.due(200), [])
+        self.scheduler.update()
+        self.assertEqual(self.scheduler.due(200), [self.chains[2], self.chains[0]])
+
+    def test_backoff(self):
+        failing = self.chains[2]
+        # the delay doubles with each failure, up to the maximum of 5 seconds
+        for now, delay in ((110, 1), (111, 2), (113, 4), (117, 5), (122, 5)):
+            self.assertEqual(self.scheduler.due(now), [failing])
+            self.scheduler.failed(failing, now)
+            self.scheduler.update()
+            self.assertEqual(self.scheduler.timeout(30, now), delay)
+            self.assertEqual(self.scheduler.due(now + delay - 0.5), [])
+        self.assertEqual(self.scheduler.due(127), [failing])
+        self.scheduler.succeeded(failing)
+        self.scheduler.update()
+        self.assertEqual(self.scheduler.due(127), [failing])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase, main
+from lqmt.lqm.exceptions import ConfigurationError
+from lqmt.lqm.processed import ProcessedHandler, ProcessHandlerTrackFile, ProcessHandlerTrackDB, ProcessHandlerMove, \
+    ProcessHandlerDelete, ProcessHandlerQueue
+from lqmt.lqm.sourcedir import FilesToProcess, DirectorySource, FilePrefilter
+from lqmt.lqm.sources import ConcurrentFiles
+
+
+class RecordingHandler(ProcessedHandler):
+    """ProcessedHandler recording the directories entered and left"""
+
+    def __init__(self):
+        self.events = []
+
+    def isProcessed(self, fpath):
+        return False
+
+    def enteringDirectory(self, path):
+        self.events.append(('enter', path))
+
+    def leavingDirectory(self, path):
+        self.events.append(('leave', path))
+
+
+class TestFilesToProcess(TestCase):
+    """
+    Testing class for the traversal of the source directories.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.sub = os.path.join(self.tmpdir, "sub")
+        os.mkdir(self.sub)
+        self._pair(self.tmpdir, "a.xml")
+        self._pair(self.tmpdir, "b.xml")
+        self._pair(self.sub, "c.xml")
+        # data file without metadata file, and metadata file without data file
+        self._write(self.tmpdir, "nometa.xml")
+        self._write(self.tmpdir, ".nodata.xml")
+        # directory named like a data file with a metadata file
+        os.mkdir(os.path.join(self.tmpdir, "d.xml"))
+        self._write(self.tmpdir, ".d.xml")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    @staticmethod
+    def _write(path, name):
+        with open(os.path.join(path, name), "w") as f:
+            f.write("{}")
+
+    def _pair(self, path, name):
+        self._write(path, name)
+        self._write(path, "." + name)
+
+    def test_pairs(self):
+        files = sorted(FilesToProcess([self.tmpdir], RecordingHandler()))
+        self.assertEqual(files, [
+            (self.tmpdir + "/a.xml", self.tmpdir + "/.a.xml"),
+            (self.tmpdir + "/b.xml", self.tmpdir + "/.b.xml"),
+            (self.sub + "/c.xml", self.sub + "/.c.xml")
+        ])
+
+    def test_statistics(self):
+        files = FilesToProcess([self.tmpdir, self.sub], RecordingHandler())
+        self.assertEqual(len(list(files)), 4)
+        self.assertEqual(files.numFiles, 4)
+
+    def test_leaves_last_directory(self):
+        handler = RecordingHandler()
+        list(FilesToProcess([self.sub], handler))
+        self.assertEqual(handler.events, [('enter', self.sub), ('leave', self.sub)])
+
+    def test_skips_tracked_files(self):
+        with open(os.path.join(self.tmpdir, "processed.txt"), "w") as f:
+            f.write("a.xml\n")
+        files = sorted(FilesToProcess([self.tmpdir], ProcessHandlerTrackFile("processed.txt")))
+        self.assertNotIn((self.tmpdir + "/a.xml", self.tmpdir + "/.a.xml"), files)
+        self.assertEqual(len(files), 2)
+
+
+
+class TestConcurrentDiscovery(TestCase):
+    """
+    Testing class for traversing the top-level directories of a source concurrently.
+    """
+
+    def setUp(self):
+        self.dirs = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        for i, path in enumerate(self.dirs):
+            for n in range(3):
+                for name in ("{0}-{1}.xml".format(i, n), ".{0}-{1}.xml".format(i, n)):
+                    with open(os.path.join(path, name), "w") as f:
+                        f.write("{}")
+        self.source = DirectorySource({'dirs': self.dirs, 'post_process': 'track',
+                                       'post_process_location': 'processed.txt'})
+
+    def tearDown(self):
+        for path in self.dirs:
+            shutil.rmtree(path)
+
+    def _tracked(self, path):
+        with open(os.path.join(path, "processed.txt")) as f:
+            return sorted(f.read().split())
+
+    def test_all_files(self):
+        files = sorted(self.source.getFilesToProcess(threads=2))
+        self.assertEqual(len(files), 6)
+        self.assertEqual(sum(walker.numFiles for walker in self.source._walkers), 6)
+
+    def test_post_processed_by_own_directory(self):
+        for datafile, metafile in self.source.getFilesToProcess(threads=2):
+            self.source.processed(datafile)
+        self.assertEqual(self._tracked(self.dirs[0]), ["0-0.xml", "0-1.xml", "0-2.xml"])
+        self.assertEqual(self._tracked(self.dirs[1]), ["1-0.xml", "1-1.xml", "1-2.xml"])
+        # tracked files are not found again
+        self.assertEqual(list(self.source.getFilesToProcess(threads=2)), [])
+
+    def test_error(self):
+        def failing():
+            yield "file"
+            raise ValueError("unreadable directory")
+
+        files = ConcurrentFiles([iter(["a", "b"]), failing()], 2)
+        self.assertRaises(ValueError, list, files)
+
+
+class TestTrackDB(TestCase):
+    """
+    Testing class for tracking processed files in a database.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = os.path.join(self.tmpdir, "db", "track.db")
+        for name in ("a.xml", ".a.xml", "b.xml", ".b.xml"):
+            with open(os.path.join(self.tmpdir, name), "w") as f:
+                f.write("{}")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _source(self, **config):
+        config.update({'dirs': [self.tmpdir], 'post_process': 'track', 'track_db': self.db, 'track_backend': 'sqlite'})
+        return DirectorySource(config)
+
+    def test_tracked_files_not_found_again(self):
+        source = self._source(track_batch_size=10)
+        for datafile, metafile in source.getFilesToProcess():
+            source.processed(datafile)
+        source.commit()
+        self.assertEqual(list(self._source().getFilesToProcess()), [])
+
+    def test_batch_committed_when_leaving_directory(self):
+        handler = ProcessHandlerTrackDB(self.db, "batch", 10)
+        handler.enteringDirectory(self.tmpdir)
+        handler.processed(os.path.join(self.tmpdir, "a.xml"))
+        handler.leavingDirectory(self.tmpdir)
+        other = ProcessHandlerTrackDB(self.db)
+        self.assertTrue(other.isProcessed(os.path.join(self.tmpdir, "a.xml")))
+        self.assertFalse(other.isProcessed(os.path.join(self.tmpdir, "b.xml")))
+
+    def test_imports_track_file(self):
+        with open(os.path.join(self.tmpdir, "processed.txt"), "w") as f:
+            f.write("a.xml\n")
+        files = list(self._source(track_import="processed.txt").getFilesToProcess())
+        self.assertEqual(files, [(self.tmpdir + "/b.xml", self.tmpdir + "/.b.xml")])
+
+    def test_invalid_config(self):
+        self.assertRaises(ConfigurationError, self._source, track_sync="sometimes")
+        self.assertRaises(ConfigurationError, self._source, track_batch_size=0)
+        self.assertRaises(ConfigurationError, DirectorySource, {'dirs': [self.tmpdir], 'track_backend': 'csv'})
+        self.assertRaises(ConfigurationError, DirectorySource, {'dirs': [self.tmpdir], 'post_process': 'track',
+                                                                'track_backend': 'sqlite'})
+
+    def test_relative_track_db(self):
+        # resolved against the directory of the user configuration, not the current directory
+        source = DirectorySource({'dirs': [self.tmpdir], 'post_process': 'track', 'track_backend': 'sqlite',
+                                  'track_db': "db/track.db"}, self.tmpdir)
+        self.assertEqual(source.track_db, self.db)
+        self.assertTrue(os.path.exists(self.db))
+
+
+class TestPostProcess(TestCase):
+    """
+    Testing class for moving and deleting processed files.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.files = []
+        for name in ("a.xml", "b.xml"):
+            for fname in (name, "." + name):
+                with open(os.path.join(self.tmpdir, fname), "w") as f:
+                    f.write("{}")
+            self.files.append(os.path.join(self.tmpdir, name))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_move_batch(self):
+        handler = ProcessHandlerMove()
+        handler.enteringDirectory(self.tmpdir)
+        handler.processedBatch(self.files)
+        # moving a file again is ignored
+        handler.processed(self.files[0])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tmpdir, "processed"))),
+                         [".a.xml", ".b.xml", "a.xml", "b.xml"])
+        self.assertEqual(os.listdir(self.tmpdir), ["processed"])
+
+    def test_delete_batch(self):
+        handler = ProcessHandlerDelete()
+        handler.processedBatch(self.files)
+        handler.processed(self.files[1])
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_queue(self):
+        handler = ProcessHandlerQueue(ProcessHandlerMove())
+        handler.enteringDirectory(self.tmpdir)
+        for fpath in self.files:
+            handler.processed(fpath)
+        handler.commit()
+        self.assertEqual(len(os.listdir(os.path.join(self.tmpdir, "processed"))), 4)
+
+    def test_queued_source(self):
+        source = DirectorySource({'dirs': [self.tmpdir], 'post_process': 'delete', 'post_process_queue': True})
+        for datafile, metafile in source.getFilesToProcess():
+            source.processed(datafile)
+        source.commit()
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+
+class TestPrefilter(TestCase):
+    """
+    Testing class for rejecting files on their name and stat fields while traversing.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for name, content in (("a.xml", "{}"), ("b.json", "{}"), ("empty.xml", ""), ("old.xml", "{}")):
+            for fname in (name, "." + name):
+                with open(os.path.join(self.tmpdir, fname), "w") as f:
+                    f.write(content)
+        old = os.path.join(self.tmpdir, "old.xml")
+        os.utime(old, (os.path.getatime(old), os.path.getmtime(old) - 3 * 86400))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _names(self, **config):
+        config.update({'dirs': [self.tmpdir], 'post_process': 'nothing'})
+        source = DirectorySource(config)
+        return sorted(os.path.basename(datafile) for datafile, metafile in source.getFilesToProcess())
+
+    def test_no_prefilter(self):
+        self.assertIsNone(DirectorySource({'dirs': [self.tmpdir]})._prefilter)
+        self.assertEqual(self._names(), ["a.xml", "b.json", "empty.xml", "old.xml"])
+
+    def test_patterns(self):
+        self.assertEqual(self._names(file_includes=["*.xml"], file_excludes=["e*"]), ["a.xml", "old.xml"])
+
+    def test_stat_fields(self):
+        self.assertEqual(self._names(min_file_size=1, max_file_age="2 days"), ["a.xml", "b.json"])
+
+    def test_rejected_count(self):
+        source = DirectorySource({'dirs': [self.tmpdir], 'file_excludes': ["*.json"]})
+        list(source.getFilesToProcess())
+        self.assertEqual(source._walkers[0].numRejected, 1)
+
+    def test_invalid(self):
+        with self.assertRaises(ConfigurationError):
+            FilePrefilter(maxAge="2 fortnights")
+        with self.assertRaises(ConfigurationError):
+            DirectorySource({'dirs': [self.tmpdir], 'file_includes': "*.xml"})
+        with self.assertRaises(ConfigurationError):
+            DirectorySource({'dirs': [self.tmpdir], 'min_file_size': -1})
+
+
+if __name__ == '__main__':
+    main()
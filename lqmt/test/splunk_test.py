@@ -0,0 +1,249 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase, main
+from lqmt.lqm.data import Alert
+from lqmt.lqm.exceptions import ConfigurationError
+from lqmt.tools.to_splunk.config import SplunkConfig
+from lqmt.tools.to_splunk.splunk_api import ApiHandler, BatchDelivery
+from lqmt.tools.to_splunk.tool import ToSplunk
+
+
+class FakeResponse(object):
+    ok = True
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession(object):
+    """Records the requests instead of sending them"""
+
+    def __init__(self):
+        self.requests = []
+
+    def post(self, url, data=None, headers=None, verify=True, timeout=None):
+        self.requests.append((url, data, dict(headers)))
+        return FakeResponse()
+
+    def close(self):
+        pass
+
+
+class TestApiHandler(TestCase):
+    """
+    Testing class for sending batches of messages to Splunk.
+    """
+
+    def _handler(self, **kwargs):
+        handler = ApiHandler("https://splunk", 8088, source="lqmt", sourcetype="cti", index="main", **kwargs)
+        handler.requests = FakeSession()
+        return handler
+
+    def test_hec_batch(self):
+        handler = self._handler(hec_token="abc")
+        handler.send_batch(["a=1", "b=2"])
+        url, data, headers = handler.requests.requests[0]
+        self.assertEqual(url, "https://splunk:8088/services/collector/event")
+        self.assertEqual(headers['Authorization'], "Splunk abc")
+        events = [json.loads(line) for line in data.decode().replace("}{", "}\n{").split("\n")]
+        self.assertEqual(events[1], {'source': 'lqmt', 'sourcetype': 'cti', 'index': 'main', 'event': 'b=2'})
+        self.assertEqual(handler.getTotalMessagesProcessed(), 2)
+
+    def test_compressed_stream(self):
+        # the token skips the login, which needs a Splunk instance
+        handler = self._handler(hec_token="abc", compress=True)
+        handler.hec_token = None
+        handler.send_batch(["a=1", "b=2"])
+        url, data, headers = handler.requests.requests[0]
+        self.assertEqual(url, "https://splunk:8088/services/receivers/stream/?source=lqmt&sourcetype=cti&index=main")
+        self.assertEqual(headers['Content-Encoding'], "gzip")
+        self.assertEqual(gzip.decompress(data), b"a=1\nb=2\n")
+
+    def test_empty_batch(self):
+        handler = self._handler(hec_token="abc")
+        handler.send_batch([])
+        self.assertEqual(handler.requests.requests, [])
+
+
+class TestBatchDelivery(TestCase):
+    """
+    Testing class for delivering batches with retries and a spool.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.spool = os.path.join(self.tmpdir, "spool")
+        self.sent = []
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _send(self, messages):
+        with self.lock:
+            if self.failures:
+                self.failures -= 1
+                raise IOError("unavailable")
+            self.sent.append(messages)
+
+    def _delivery(self):
+        return BatchDelivery(self._send, max_in_flight=2, max_retries=2, backoff=0.001, spool_dir=self.spool)
+
+    def test_deliver(self):
+        delivery = self._delivery()
+        for i in range(5):
+            delivery.submit(["m{0}".format(i)])
+        delivery.close()
+        self.assertEqual(sorted(self.sent), [["m0"], ["m1"], ["m2"], ["m3"], ["m4"]])
+
+    def test_retry(self):
+        self.failures = 2
+        delivery = self._delivery()
+        delivery.submit(["m"])
+        delivery.close()
+        self.assertEqual(self.sent, [["m"]])
+        self.assertFalse(os.path.exists(self.spool))
+
+    def test_spool_and_replay(self):
+        self.failures = 3
+        delivery = self._delivery()
+        delivery.submit(["m1", "m2"])
+        delivery.close()
+        self.assertEqual((self.sent, delivery.failed), ([], 2))
+        self.assertEqual(len(os.listdir(self.spool)), 1)
+        # the next run delivers the spooled batch and removes the spool file
+        delivery = self._delivery()
+        self.assertEqual(delivery.replay(), 1)
+        delivery.close()
+        self.assertEqual(self.sent, [["m1", "m2"]])
+        self.assertEqual(os.listdir(self.spool), [])
+
+    def test_submit_while_unavailable(self):
+        attempts = []
+
+        def send(messages):
+            attempts.append(messages)
+            time.sleep(0.2)
+            raise IOError("timeout")
+
+        delivery = BatchDelivery(send, max_in_flight=1, max_retries=1, backoff=0.001, spool_dir=self.spool,
+                                 slot_timeout=0.05)
+        started = time.monotonic()
+        for i in range(6):
+            delivery.submit(["m{0}".format(i)])
+        # batches without a free thread are spooled instead of waiting for the failing sends
+        self.assertLess(time.monotonic() - started, 1)
+        delivery.wait()
+        # once the first batch failed, Splunk is unavailable and further batches are spooled without being sent
+        delivery.submit(["m6"])
+        delivery.close()
+        self.assertEqual(attempts, [["m0"], ["m0"]])
+        self.assertEqual((delivery.failed, len(os.listdir(self.spool))), (7, 7))
+
+    def test_replay_after_recovery(self):
+        self.failures = 3
+        delivery = BatchDelivery(self._send, max_in_flight=2, max_retries=2, backoff=0.001, spool_dir=self.spool,
+                                 probe_interval=0)
+        delivery.submit(["m1"])
+        delivery.wait()
+        # the probe batch succeeds and the spooled batch is replayed
+        delivery.submit(["m2"])
+        delivery.close()
+        self.assertEqual(sorted(self.sent), [["m1"], ["m2"]])
+        self.assertEqual(os.listdir(self.spool), [])
+
+
+class TestSplunkConfig(TestCase):
+    """
+    Testing class for the batching options of the Splunk tool.
+    """
+
+    def setUp(self):
+        self.config = {'name': 'splunk', 'host': 'https://splunk', 'sourcetype': 'cti', 'index': 'main'}
+
+    def test_hec_token(self):
+        self.config['hec_token'] = "abc"
+        config = SplunkConfig(self.config, None, None)
+        self.assertEqual((config.batch_size, config.batch_timeout, config.compress), (100, 1000, False))
+        self.assertEqual(config.spool_dir, "splunk-spool-splunk")
+
+    def test_credentials_required(self):
+        self.assertRaises(ConfigurationError, SplunkConfig, self.config, None, None)
+
+    def test_batch_size(self):
+        self.config.update({'hec_token': "abc", 'batch_size': 0})
+        self.assertRaises(ConfigurationError, SplunkConfig, self.config, None, None)
+
+    def test_retries(self):
+        self.config.update({'hec_token': "abc", 'max_retries': -1})
+        self.assertRaises(ConfigurationError, SplunkConfig, self.config, None, None)
+
+
+
+class FakeDelivery(object):
+    """Records the submitted batches instead of sending them"""
+
+    def __init__(self):
+        self.batches = []
+        self.submitted = threading.Event()
+        self.failed = 0
+
+    def submit(self, messages):
+        self.batches.append(messages)
+        self.submitted.set()
+
+    def wait(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class TestToSplunk(TestCase):
+    """
+    Testing class for batching the alerts sent to Splunk.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        config = SplunkConfig({'name': 'splunk', 'host': 'https://splunk', 'sourcetype': 'cti', 'index': 'main',
+                               'hec_token': "abc", 'batch_size': 3, 'batch_timeout': 50,
+                               'spool_dir': self.tmpdir}, None, None)
+        self.tool = ToSplunk(config)
+        self.tool._delivery = self.delivery = FakeDelivery()
+
+    def tearDown(self):
+        self.tool.cleanup()
+        shutil.rmtree(self.tmpdir)
+
+    @staticmethod
+    def _alert(indicator):
+        alert = Alert()
+        alert.setFromDict({'indicator': indicator, 'indicatorType': 'IPv4Address'})
+        return alert
+
+    def test_full_batch(self):
+        for i in range(4):
+            self.tool.process(self._alert("10.0.0.{0}".format(i)))
+        self.assertEqual([len(batch) for batch in self.delivery.batches], [3])
+        self.tool.commit()
+        self.assertEqual([len(batch) for batch in self.delivery.batches], [3, 1])
+
+    def test_idle_partial_batch(self):
+        # no further alert arrives, so the batch is sent once its timeout passed
+        self.tool.process(self._alert("10.0.0.1"))
+        self.assertEqual(self.delivery.batches, [])
+        self.assertTrue(self.delivery.submitted.wait(5))
+        self.assertEqual([len(batch) for batch in self.delivery.batches], [1])
+        self.tool.commit()
+        self.assertEqual(len(self.delivery.batches), 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase, main
+from lqmt.lqm.data import Alert
+from lqmt.tools.to_bro.tool import ToBro
+
+
+class FakeBroConfig(object):
+    def __init__(self, file):
+        self.file = file
+        self.header_fields = ["indicator", "indicatorType"]
+        self.null_value = "-"
+
+    def getName(self):
+        return "bro"
+
+    def getUnprocessedHandler(self):
+        return None
+
+
+class TestToBro(TestCase):
+    """
+    Testing class for writing alerts to a Bro intelligence file.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.file = os.path.join(self.tmpdir, "bro", "intel.txt")
+        self.tool = ToBro(FakeBroConfig(self.file))
+
+    def tearDown(self):
+        self.tool.cleanup()
+        shutil.rmtree(self.tmpdir)
+
+    def _lines(self):
+        with open(self.file) as f:
+            return f.read().splitlines()
+
+    def test_commit_writes_rows(self):
+        alert = Alert()
+        alert.setFromDict({'indicator': '1.1.1.1', 'indicatorType': 'IPv4Address'})
+        self.tool.process(alert)
+        # rows are on disk once the tool was committed, e.g. before a checkpoint post-processes the source files
+        self.tool.commit()
+        self.assertEqual(self._lines(), ["#fields\tindicator\tindicatorType", '"1.1.1.1"\t"IPv4Address"'])
+
+
+if __name__ == '__main__':
+    main()
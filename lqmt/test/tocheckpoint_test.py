@@ -0,0 +1,87 @@
+from unittest import TestCase, main
+from lqmt.lqm.data import Alert
+from lqmt.tools.to_checkpoint.tool import ToCheckpoint
+
+
+class FakeUnprocessedHandler(object):
+    def __init__(self):
+        self.alerts = []
+
+    def initialize(self):
+        pass
+
+    def unprocessed(self, alert):
+        self.alerts.append(alert)
+
+
+class FakeCheckpointConfig(object):
+    """Configuration of a Checkpoint tool without a device"""
+
+    def __init__(self, flushToDevice=False):
+        self.flushToDevice = flushToDevice
+        self.rules = {'1.1.1.1': {'in': {'uid': 'in-1'}, 'out': {'uid': 'out-1'}}}
+        self.updates = []
+        self.unprocessed = FakeUnprocessedHandler()
+
+    def getName(self):
+        return "checkpoint"
+
+    def getUnprocessedHandler(self):
+        return self.unprocessed
+
+    def getRules(self):
+        return self.rules
+
+    def getDefaultDuration(self):
+        return 3600
+
+    def getFlushToDevice(self):
+        return self.flushToDevice
+
+    def updateRules(self, blocks, unblockUIDs):
+        self.updates.append((set(block._addr for block in blocks), set(unblockUIDs)))
+
+
+class TestToCheckpoint(TestCase):
+    """
+    Testing class for blocking and revoking IPs on a Checkpoint device.
+    """
+
+    def setUp(self):
+        self.config = FakeCheckpointConfig()
+        self.tool = ToCheckpoint(self.config)
+        self.tool.initialize()
+
+    @staticmethod
+    def _alert(action, indicator, indicatorType="IPv4Address"):
+        alert = Alert()
+        alert.setFromDict({'action1': action, 'indicator': indicator, 'indicatorType': indicatorType})
+        return alert
+
+    def test_block_and_revoke(self):
+        self.tool.process(self._alert('Block', '2.2.2.2'))
+        self.tool.process(self._alert('Revoke', '1.1.1.1'))
+        self.tool.commit()
+        self.assertEqual(self.config.updates, [({'2.2.2.2'}, {'in-1', 'out-1'})])
+        self.assertEqual(self.config.unprocessed.alerts, [])
+
+    def test_revoke_without_ip(self):
+        alert = self._alert('Revoke', 'bad.example.com', 'DNSHostName')
+        self.tool.process(alert)
+        self.assertEqual(self.config.unprocessed.alerts, [alert])
+
+    def test_flush(self):
+        # rules are only sent to the device by a flush when it was enabled
+        self.tool.process(self._alert('Block', '2.2.2.2'))
+        self.tool.flush()
+        self.assertEqual(self.config.updates, [])
+        self.tool.commit()
+        self.assertEqual(self.config.updates, [({'2.2.2.2'}, set())])
+        self.config.flushToDevice = True
+        self.tool.process(self._alert('Block', '3.3.3.3'))
+        self.tool.flush()
+        self.assertEqual(self.config.updates[1:], [({'3.3.3.3'}, set())])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+from unittest import TestCase, main
+from lqmt.lqm.data import AlertBatch
+from lqmt.lqm.tool import Tool, ToolChain
+
+
+class FakeConfig(object):
+    def getName(self):
+        return "fake"
+
+    def isEnabled(self):
+        return True
+
+    def getUnprocessedHandler(self):
+        return None
+
+
+class AlertTool(Tool):
+    """Tool processing one alert at a time"""
+
+    def __init__(self, actions):
+        super().__init__(FakeConfig(), actions)
+        self.dataFormat = ['Alert']
+        self.processed = []
+
+    def process(self, alert, meta=None):
+        self.processed.append(alert.getFields(['indicator'])[0])
+
+
+class BatchTool(AlertTool):
+    """Tool processing whole files at once"""
+
+    def __init__(self, actions):
+        super().__init__(actions)
+        self.batches = 0
+
+    def process_batch(self, alerts):
+        self.batches += 1
+        self.processed.extend(row[0] for row in alerts.getFields(['indicator']))
+
+
+class FileTool(AlertTool):
+    """Tool reprocessing the alert datafile, like FlexText"""
+
+    def __init__(self, actions):
+        super().__init__(actions)
+        self.toolName = "FlexText"
+
+    def process(self, datafile, meta=None):
+        self.processed.append(datafile)
+
+
+class TestToolChain(TestCase):
+    """
+    Testing class for passing parsed alert files to the tools of a toolchain.
+    """
+
+    def setUp(self):
+        self.alerts = AlertBatch()
+        self.alerts.addFromDict({'indicator': '10.10.10.1', 'indicatorType': 'IPv4Address', 'action1': 'Block'})
+        self.alerts.addFromDict({'indicator': '10.10.10.2', 'indicatorType': 'IPv4Address', 'action1': 'Notify'})
+        self.alerts.addFromDict({'indicator': '10.10.10.3', 'indicatorType': 'IPv4Address', 'action1': 'Block'})
+        self.alerts.addFromDict({'indicator': '10.10.10.4', 'indicatorType': 'IPv4Address', 'action1': 'Block'})
+        self.whitelisted = [False, False, True, False]
+
+    def _processFile(self, *tools):
+        chain = ToolChain(list(tools), "test", True)
+        chain.initialize()
+        chain.processFile(self.alerts, self.whitelisted, "alerts.xml", {})
+        return chain
+
+    def test_batch_tool(self):
+        tool = BatchTool(['Block'])
+        chain = self._processFile(tool)
+        self.assertEqual(tool.batches, 1)
+        self.assertEqual(tool.processed, ['"10.10.10.1"', '"10.10.10.4"'])
+        self.assertEqual(chain._alertsProcessed, 2)
+        self.assertEqual(chain._alertsNotProcessed, 1)
+
+    def test_alert_tool(self):
+        tool = AlertTool(['All'])
+        chain = self._processFile(tool)
+        self.assertEqual(tool.processed, ['"10.10.10.1"', '"10.10.10.2"', '"10.10.10.4"'])
+        self.assertEqual(chain._alertsProcessed, 3)
+        self.assertEqual(chain._alertsNotProcessed, 0)
+
+    def test_file_tool(self):
+        tool = FileTool(['All'])
+        self._processFile(tool)
+        self.assertEqual(tool.processed, ["alerts.xml"])
+
+    def test_unsupported_format(self):
+        tool = BatchTool(['All'])
+        tool.dataFormat = ['StixFile']
+        chain = self._processFile(tool)
+        self.assertEqual(tool.processed, [])
+        self.assertEqual(chain._alertsNotProcessed, 3)
+
+    def test_alert_list(self):
+        tool = BatchTool(['Block'])
+        chain = ToolChain([tool], "test", True)
+        chain.initialize()
+        chain.processFile(list(self.alerts), self.whitelisted, "alerts.xml", {})
+        self.assertEqual(tool.batches, 0)
+        self.assertEqual(tool.processed, ['"10.10.10.1"', '"10.10.10.4"'])
+        self.assertEqual(chain._alertsProcessed, 2)
+
+    def test_flush(self):
+        tool = BatchTool(['Block'])
+        flushed = []
+        tool.flush = lambda: flushed.append(list(tool.processed))
+        chain = self._processFile(tool)
+        chain.flush()
+        self.assertEqual(flushed, [['"10.10.10.1"', '"10.10.10.4"']])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase, main, mock, skipIf
+from lqmt.lqm.controller import LQMToolController
+from lqmt.lqm.sourcedir import DirectorySource
+from lqmt.lqm.watch import IN_CLOSE_WRITE, IN_CREATE, IN_ISDIR, InotifyWatcher, PollingWatcher, waitForChanges
+
+try:
+    InotifyWatcher([tempfile.gettempdir()], lambda path: True).close()
+    hasInotify = True
+except (OSError, AttributeError):
+    hasInotify = False
+
+
+class WatcherTests(object):
+    """
+    Tests shared by the watchers. Subclasses set the watcher class.
+    """
+    watcherClass = None
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.sub = os.path.join(self.tmpdir, "sub")
+        os.mkdir(self.sub)
+        self.source = DirectorySource({'dirs': [self.tmpdir], 'post_process': 'track',
+                                       'post_process_location': 'processed.txt'})
+        self.watcher = self.watcherClass([self.tmpdir], lambda path: os.path.basename(path) == "skipped")
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.tmpdir)
+
+    @staticmethod
+    def _pair(path, name):
+        for fname in (name, "." + name):
+            with open(os.path.join(path, fname), "w") as f:
+                f.write("{}")
+
+    def _changes(self):
+        return waitForChanges([self.watcher], 1, threading.Event())[0]
+
+    def test_no_changes(self):
+        self.assertEqual(self._changes(), [])
+
+    def test_new_pair(self):
+        self._pair(self.sub, "a.xml")
+        self.assertEqual(self._changes(), [(self.sub, False)])
+        files = list(self.source.getChangedFiles([(self.sub, False)]))
+        self.assertEqual(files, [(self.sub + "/a.xml", self.sub + "/.a.xml")])
+
+    def test_skipped_directory(self):
+        skipped = os.path.join(self.tmpdir, "skipped")
+        os.mkdir(skipped)
+        self._changes()
+        self._pair(skipped, "a.xml")
+        self.assertEqual(self._changes(), [])
+
+
+class TestPollingWatcher(WatcherTests, TestCase):
+    watcherClass = PollingWatcher
+
+
+@skipIf(not hasInotify, "inotify is not available")
+class TestInotifyWatcher(WatcherTests, TestCase):
+    watcherClass = InotifyWatcher
+
+    def test_ignores_incomplete_pairs(self):
+        with open(os.path.join(self.sub, "a.xml"), "w") as f:
+            f.write("{}")
+        self.assertEqual(self._changes(), [])
+
+    def test_new_directory(self):
+        new = os.path.join(self.tmpdir, "new")
+        os.mkdir(new)
+        self.assertEqual(self._changes(), [(new, True)])
+        # the new directory is watched as well
+        self._pair(new, "a.xml")
+        self.assertEqual(self._changes(), [(new, False)])
+
+    def test_new_directory_tree(self):
+        new = os.path.join(self.tmpdir, "new")
+        os.makedirs(new + "/sub")
+        self._pair(new + "/sub", "a.xml")
+        watcher = self.watcher
+        root = next(wd for wd, path in watcher._paths.items() if path == self.tmpdir)
+
+        def events():
+            yield root, IN_CREATE | IN_ISDIR, "new"
+            # the sub-directory is watched while the events are read, so events of its files may follow
+            sub = next(wd for wd, path in watcher._paths.items() if path == new + "/sub")
+            yield sub, IN_CLOSE_WRITE, "a.xml"
+
+        watcher._readEvents = events
+        # the sub-directory is only traversed with the new directory, so its files aren't found twice
+        self.assertEqual(watcher.changes(), [(new, True)])
+
+
+class TestChangedFiles(TestCase):
+    """
+    Testing class for traversing the changed directories of a source.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.sub = os.path.join(self.tmpdir, "sub")
+        os.mkdir(self.sub)
+        WatcherTests._pair(self.tmpdir, "a.xml")
+        WatcherTests._pair(self.sub, "b.xml")
+        self.source = DirectorySource({'dirs': [self.tmpdir], 'post_process': 'track',
+                                       'post_process_location': 'processed.txt'})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_not_recursive(self):
+        files = list(self.source.getChangedFiles([(self.tmpdir, False)]))
+        self.assertEqual(files, [(self.tmpdir + "/a.xml", self.tmpdir + "/.a.xml")])
+
+    def test_recursive(self):
+        files = sorted(self.source.getChangedFiles([(self.tmpdir, True)]))
+        self.assertEqual(len(files), 2)
+
+    def test_all_files(self):
+        self.assertEqual(len(list(self.source.getChangedFiles(None))), 2)
+
+    def test_statistics(self):
+        for datafile, metafile in self.source.getChangedFiles([(self.tmpdir, False)]):
+            self.source.processed(datafile)
+        list(self.source.getChangedFiles([(self.tmpdir, True)]))
+        self.assertEqual(self.source._numFiles + sum(walker.numFiles for walker in self.source._walkers), 2)
+
+
+class TestFailedFiles(TestCase):
+    """
+    Testing class for queueing the files of watched sources.
+    """
+
+    def setUp(self):
+        self.controller = LQMToolController.__new__(LQMToolController)
+        self.controller._logger = mock.Mock()
+        self.controller._fileSources = {}
+        self.controller._failedFiles = []
+        self.controller._attempts = {}
+        self.controller._filesLock = threading.Lock()
+        self.controller._checkpoints = mock.Mock()
+        self.controller._checkpoints.isEnabled.return_value = False
+        self.source = mock.Mock()
+        self.files = [("a", ".a"), ("b", ".b")]
+
+    def _batch(self, files, processed=()):
+        """Queue the retried and the new files like watch() and post-process the processed files"""
+        queued = list(self.controller._retryFiles()) + list(self.controller._sourceFiles(self.source, files))
+        for datafile in processed:
+            self.controller._processed(datafile)
+        self.controller._collectFailedFiles()
+        return queued
+
+    def test_queued_once(self):
+        files = list(self.controller._sourceFiles(self.source, self.files + [("a", ".a")]))
+        self.assertEqual(files, self.files)
+
+    def test_retry_failed(self):
+        self.assertEqual(self._batch(self.files, processed=["a"]), self.files)
+        # the failed file is processed again although its directory didn't change
+        self.assertEqual(self._batch([]), [("b", ".b")])
+        self.assertEqual(self._batch([("b", ".b")], processed=["b"]), [("b", ".b")])
+        self.assertEqual(self._batch([]), [])
+        self.assertEqual([call[0][0] for call in self.source.processed.call_args_list], ["a", "b"])
+
+    def test_give_up(self):
+        for _ in range(LQMToolController._maxAttempts):
+            self.assertEqual(self._batch([("a", ".a")]), [("a", ".a")])
+        self.assertEqual(self._batch([]), [])
+        self.assertEqual(self.controller._attempts, {})
+
+    def test_rejected(self):
+        list(self.controller._sourceFiles(self.source, self.files))
+        self.controller._rejected("a")
+        self.controller._processed("b")
+        self.controller._collectFailedFiles()
+        self.assertEqual(self.controller._failedFiles, [])
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,6 @@
 import os
+import shutil
+import tempfile
 from unittest import TestCase, main
 import lqmt.whitelist.master as master
 
@@ -11,7 +13,9 @@ class TestWhitelist(TestCase):
     def setUp(self):
         currentdir = os.path.dirname(__file__)
         whitelist = currentdir + "/test_data/whitelist/whitelist.txt"
-        db = currentdir + "/test_data/whitelist/whitelist.db"
+        # the database is created in a temporary directory, so the tests don't leave it in the source tree
+        self.tmpdir = tempfile.mkdtemp()
+        db = os.path.join(self.tmpdir, "whitelist.db")
         configstr = """
         [Whitelist]
             whitelist = '{0}'
@@ -21,6 +25,10 @@ class TestWhitelist(TestCase):
         self.wl = master.MasterWhitelist(configStr=configstr)
         self.indicatorTypes = master.IndicatorTypes
 
+    def tearDown(self):
+        self.wl.conn.close()
+        shutil.rmtree(self.tmpdir)
+
     # IPV4 Addresses
     def test_match_by_ipv4(self):
         self.assertTrue(self.wl.isWhitelisted(self.indicatorTypes.ipv4, '192.168.1.1'))
@@ -51,6 +59,22 @@ class TestWhitelist(TestCase):
     def test_failed_match_by_ipv6(self):
         self.assertFalse(self.wl.isWhitelisted(self.indicatorTypes.ipv6, '6EE2:317F:0AF1:684C:AAC8:43F4:6E49:AAAA'))
 
+    def test_match_ipv6_by_subnet(self):
+        self.assertTrue(self.wl.isWhitelisted(self.indicatorTypes.ipv6, '2001:db8::ff00:42:8329'))
+
+    # IPV6 Subnets
+    def test_match_ipv6_sub_by_inclusion(self):
+        self.assertTrue(self.wl.isWhitelisted(self.indicatorTypes.ipv6subnet, '2001:db8:0:1::/64'))
+
+    def test_match_contiguous_ipv6_sub(self):
+        self.assertTrue(self.wl.isWhitelisted(self.indicatorTypes.ipv6subnet, '2001:db8::/47'))
+
+    def test_failed_match_large_ipv6_sub(self):
+        self.assertFalse(self.wl.isWhitelisted(self.indicatorTypes.ipv6subnet, '2001:db8::/46'))
+
+    def test_failed_match_ipv6_sub(self):
+        self.assertFalse(self.wl.isWhitelisted(self.indicatorTypes.ipv6subnet, '2001:db9::/48'))
+
     # Domains
     def test_match_domain(self):
         self.assertTrue(self.wl.isWhitelisted(self.indicatorTypes.domain, 'thegoodguys.com'))
@@ -58,6 +82,13 @@ class TestWhitelist(TestCase):
     def test_failed_match_domain(self):
         self.assertFalse(self.wl.isWhitelisted(self.indicatorTypes.domain, 'badguy.com'))
 
+    def test_match_domain_case_insensitive(self):
+        self.assertTrue(self.wl.isWhitelisted(self.indicatorTypes.domain, 'TheGoodGuys.COM'))
+
+    def test_failed_match_domain_by_suffix(self):
+        # the whitelisted domain has to match on a label boundary
+        self.assertFalse(self.wl.isWhitelisted(self.indicatorTypes.domain, 'notthegoodguys.com'))
+
     # Host
     def test_match_host_by_domain(self):
         self.assertTrue(self.wl.isWhitelisted(self.indicatorTypes.host, 'oneof.thegoodguys.com'))
@@ -78,5 +109,88 @@ class TestWhitelist(TestCase):
             self.wl.isWhitelisted(self.indicatorTypes.url, 'http://www.badsite.com/blah?someparm=9&parm2=foo#anchor'))
 
 
+    # Batches
+    def test_batch(self):
+        indicators = [(self.indicatorTypes.ipv4, '192.168.1.1'), (self.indicatorTypes.ipv4, '192.168.1.2'),
+                      (self.indicatorTypes.host, 'oneof.thegoodguys.com'), (self.indicatorTypes.ipv4, '192.168.1.1')]
+        self.assertEqual(self.wl.areWhitelisted(indicators), [True, False, True, True])
+
+    def test_batch_unknown_type(self):
+        indicators = [(None, '192.168.1.1'), (self.indicatorTypes.filehash, 'abcdef')]
+        self.assertEqual(self.wl.areWhitelisted(indicators), [False, False])
+
+    def test_empty_batch(self):
+        self.assertEqual(self.wl.areWhitelisted([]), [])
+
+
+
+class TestWhitelistUpdate(TestCase):
+    """
+    Testing class for updating the whitelist database when the whitelist file changes.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.whitelist = os.path.join(self.tmpdir, "whitelist.txt")
+        shutil.copy(os.path.join(os.path.dirname(__file__), "test_data/whitelist/whitelist.txt"), self.whitelist)
+        self.config = {'whitelist': self.whitelist, 'dbfile': os.path.join(self.tmpdir, "whitelist.db")}
+        self.indicatorTypes = master.IndicatorTypes
+        self.wl = master.MasterWhitelist(configData=self.config)
+
+    def tearDown(self):
+        self.wl.conn.close()
+        shutil.rmtree(self.tmpdir)
+
+    def _rewrite(self, old, new, keepStat=False):
+        stat = os.stat(self.whitelist)
+        with open(self.whitelist) as f:
+            content = f.read()
+        with open(self.whitelist, "w") as f:
+            f.write(content.replace(old, new))
+        if keepStat:
+            os.utime(self.whitelist, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.wl.conn.close()
+        self.wl = master.MasterWhitelist(configData=self.config)
+
+    def test_changed_entries(self):
+        self._rewrite("192.168.1.251", "192.168.1.252\n192.168.1.253")
+        self.assertFalse(self.wl.isWhitelisted(self.indicatorTypes.ipv4, '192.168.1.251'))
+        self.assertTrue(self.wl.isWhitelisted(self.indicatorTypes.ipv4, '192.168.1.252'))
+        self.assertTrue(self.wl.isWhitelisted(self.indicatorTypes.ipv4, '192.168.1.253'))
+        self.assertTrue(self.wl.isWhitelisted(self.indicatorTypes.ipv4, '192.168.1.1'))
+
+    def test_changed_subnets(self):
+        self._rewrite("192.168.2/24", "192.168.4.0/24")
+        self.assertFalse(self.wl.isWhitelisted(self.indicatorTypes.ipv4, '192.168.2.5'))
+        self.assertTrue(self.wl.isWhitelisted(self.indicatorTypes.ipv4, '192.168.4.5'))
+        self.assertTrue(self.wl.isWhitelisted(self.indicatorTypes.ipv4, '192.168.3.5'))
+
+    def test_unchanged_file_not_reloaded(self):
+        # same size and modification time, so the file is not read again
+        self._rewrite("192.168.1.251", "192.168.1.252", keepStat=True)
+        self.assertTrue(self.wl.isWhitelisted(self.indicatorTypes.ipv4, '192.168.1.251'))
+        self.assertFalse(self.wl.isWhitelisted(self.indicatorTypes.ipv4, '192.168.1.252'))
+
+    def test_upgrade_old_database(self):
+        # databases of older versions have no fileinfo table and didn't store the IPv6Subnet section
+        self.wl.conn.execute("delete from ipv6sn")
+        self.wl.conn.execute("drop table fileinfo")
+        self.wl.conn.execute("pragma user_version=0")
+        self.wl.conn.commit()
+        self.wl.conn.close()
+        self.wl = master.MasterWhitelist(configData=self.config)
+        self.assertTrue(self.wl.isWhitelisted(self.indicatorTypes.ipv6subnet, '2001:db8:0:1::/64'))
+        self.assertTrue(self.wl.isWhitelisted(self.indicatorTypes.ipv4, '192.168.1.251'))
+
+    def test_read_only(self):
+        self.wl.conn.execute("delete from fileinfo")
+        self.wl.conn.commit()
+        wl = master.MasterWhitelist(configData=self.config, readOnly=True)
+        self.assertTrue(wl.isWhitelisted(self.indicatorTypes.ipv4, '192.168.1.251'))
+        # the database is only read, so the removed file info is not written again
+        self.assertEqual(self.wl.conn.execute("select count(*) from fileinfo").fetchone()[0], 0)
+        self.assertRaises(Exception, wl.conn.execute, "delete from md5")
+
+
 if __name__ == '__main__':
     main()
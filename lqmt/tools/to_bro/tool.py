@@ -50,6 +50,20 @@ class ToBro(Tool):
         self.writer.writerow(row)
         self._logger.debug("File written: {0}".format(self._config.file))
 
+    def process_batch(self, batch):
+        """
+        Processes all alerts of an AlertBatch at once, writing one row per alert.
+        """
+        self.openfile()
+        self.start_writer()
+
+        null_value = self._config.null_value
+        rows = [[replace_empty(c, null_value) for c in row] for row in batch.getFields(self.header_keys)]
+
+        # write to file
+        self.writer.writerows(rows)
+        self._logger.debug("File written: {0}".format(self._config.file))
+
     def openfile(self):
         """
         Creates and opens the file specified in the user configuration, specifically the file_destination variable.
@@ -95,7 +109,16 @@ class ToBro(Tool):
         return header_keys
 
     def commit(self):
-        pass
+        """
+        Writes the rows buffered by the file to disk. A checkpoint post-processes the source files once the toolchains
+        were committed, so their rows must not be lost if LQMT stops afterwards.
+        """
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
 
     def cleanup(self):
-        pass
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.writer = None
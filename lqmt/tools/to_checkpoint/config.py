@@ -39,6 +39,8 @@ class CheckpointConfig(ToolConfig):
             self._defaultDuration = 3 * 24 * 3600
             self._logger.warning(
                 "default_duration not specified in the configuration, setting default_duration to 86400 seconds")
+        # rules are only sent to the device by a flush when enabled, otherwise a flush doesn't push partial state
+        self._flushToDevice = configData.get('flush_to_device', False)
 
         if (hasError):
             self.disable()
@@ -143,3 +145,6 @@ class CheckpointConfig(ToolConfig):
 
     def getDefaultDuration(self):
         return self._defaultDuration
+
+    def getFlushToDevice(self):
+        return self._flushToDevice
@@ -23,6 +23,8 @@ class ToCheckpoint(Tool):
         self._totalBlocked = 0
         self._totalRevoked = 0
         self._modified = False
+        # set once the rules on the device have been changed by a commit
+        self._staleRules = False
         self._cp = config
 
     def initialize(self):
@@ -30,6 +32,10 @@ class ToCheckpoint(Tool):
         self._rules = self._cp.getRules()
 
     def process(self, alert):
+        if self._staleRules:
+            # an earlier commit of a long-running process changed the rules, so retrieve them again
+            self._rules = self._cp.getRules()
+            self._staleRules = False
         self._totalProcessed += 1
         action = alert.getAction()
         if action == AlertAction.get('Block'):
@@ -39,8 +45,20 @@ class ToCheckpoint(Tool):
 
     def commit(self):
         # Possibly look for the refresh process before writing file?
+        if not self._blocks and not self._unblockUIDs:
+            return
         self._logger.info("Updating checkpoint")
         self._cp.updateRules(self._blocks, self._unblockUIDs)
+        self._blocks = set()
+        self._blockIPs = set()
+        self._unblockUIDs = set()
+        self._modified = False
+        self._staleRules = True
+
+    def flush(self):
+        # rules can only be written to the device, so the ones collected so far are only sent when enabled
+        if self._config.getFlushToDevice():
+            self.commit()
 
     def cleanup(self):
         self._logger.info(
@@ -69,7 +87,7 @@ class ToCheckpoint(Tool):
         return duration
 
     def _revoke(self, alert):
-        addr = alert.getIPToBlock()
+        addr = alert.getIPToRevoke()
         if addr is None:
             self.unprocessed(alert)
             return
@@ -30,6 +30,14 @@ class ToCSV(Tool):
             self._fp.flush()
         return alert
 
+    def process_batch(self, batch):
+        """Write all alerts of the AlertBatch to the file at once"""
+        if self._fp is None and not self._openFile():
+            self.disable()
+        if self.isEnabled():
+            self._fp.writelines(",".join(row) + "\n" for row in batch.getFields(self._config.fields))
+            self._fp.flush()
+
     def commit(self):
         pass
 
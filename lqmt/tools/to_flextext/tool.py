@@ -95,7 +95,10 @@ class ToFlexText(Tool):
             self._config.header_line = False
 
     def commit(self):
-        pass
+        """Writes the rows buffered by the file to disk, before a checkpoint post-processes the source files"""
+        if self._file_obj is not None:
+            self._file_obj.flush()
+            os.fsync(self._file_obj.fileno())
 
     def cleanup(self):
         if self._file_obj is not None:
@@ -22,3 +22,4 @@ class MBLConfig(ToolConfig):
         self.sourcetype = self.validation('sourcetype', str, default="")
         self.index = self.validation('index', str)
         self.override_parser = self.validation('override_parser', str, default="MBL")
+        self.flush_to_device = self.validation('flush_to_device', bool, default=False)
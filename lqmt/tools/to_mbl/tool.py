@@ -1,4 +1,5 @@
 import logging
+from collections import OrderedDict
 from lqmt.lqm.tool import Tool
 from lqmt.lqm.data import AlertAction
 from lqmt.tools.to_splunk.splunk_api import ApiHandler
@@ -7,6 +8,9 @@ import hashlib
 
 
 class ToMBL(Tool):
+    # number of hashes of sent alerts that are remembered. The least recently seen hashes are forgotten first.
+    maxSent = 100000
+
     def __init__(self, config):
         """
         ToMBL tool. Used to push data to MBL using the Splunk Web API.
@@ -15,6 +19,9 @@ class ToMBL(Tool):
         super().__init__(config, [AlertAction.get('All')])
         self._logger = logging.getLogger("LQMT.ToolName.{0}".format(self.getName()))
         self.alerts = {}
+        # hashes of the alerts sent by earlier commits, so alerts are only sent once. Bounded, because the tool is
+        # committed after each batch of new files in watch mode.
+        self._sent = OrderedDict()
         self.sourcetype_lexicon = ['block', 'spearphish', 'malware']
 
         self._parser = FlexTransformParser({'mbl': 'resources/sampleConfigurations/MBL.cfg'})
@@ -48,7 +55,9 @@ class ToMBL(Tool):
 
             # put alert data into a dictionary. key is generated from a hash of the list
             key_hash = self.compute_hash(str(mbl_alert))
-            if key_hash not in self.alerts:
+            if key_hash in self._sent:
+                self._sent.move_to_end(key_hash)
+            elif key_hash not in self.alerts:
                 self.alerts[key_hash] = mbl_alert
 
     def commit(self):
@@ -66,6 +75,17 @@ class ToMBL(Tool):
             if sourcetype in self.sourcetype_lexicon:
                 self.splunk_handler.send_message(message, sourcetype=sourcetype)
 
+        for key_hash in self.alerts:
+            self._sent[key_hash] = None
+        while len(self._sent) > self.maxSent:
+            self._sent.popitem(last=False)
+        self.alerts = {}
+
+    def flush(self):
+        """Send the alerts collected so far, if flush_to_device is enabled"""
+        if self._config.flush_to_device:
+            self.commit()
+
     def cleanup(self):
         pass
 
@@ -102,20 +102,34 @@ class PaloAltoConfig(ToolConfig):
     def getDBConn(self):
         return self._conn
 
+    # version of the schema of the blocks database, stored in its user_version
+    schemaVersion = 1
+
     def _ensureDBExists(self):
         dbfile = os.path.join(self._db_location, "{0}.db".format(self.getName()))
         if (not os.path.exists(self._db_location)):
             os.makedirs(self._db_location, 0o755, True)
-        if (not os.path.exists(dbfile)):
-            conn = sqlite3.connect(dbfile)
-            c = conn.cursor()
-            c.execute(
-                "create table blocks (ip text primary key, detect_time integer(11), start_time integer(11), end_time integer(11), duration integer(11))")
-            c.execute("create index detect_time on blocks(start_time)")
-            c.execute("create index start_time on blocks(start_time)")
-            c.execute("create index end_time on blocks(end_time)")
-            conn.close()
-        self._conn = sqlite3.connect(dbfile)
+        self._conn = sqlite3.connect(dbfile, check_same_thread=False)
+        self._conn.execute("pragma journal_mode=wal")
+        self._migrateDB()
+
+    def _migrateDB(self):
+        """Create the blocks table or bring the schema of an existing database up to date"""
+        version = self._conn.execute("pragma user_version").fetchone()[0]
+        if version >= self.schemaVersion:
+            return
+        with self._conn:
+            self._conn.execute(
+                "create table if not exists blocks (ip text primary key, detect_time integer(11), "
+                "start_time integer(11), end_time integer(11), duration integer(11))")
+            # databases of earlier versions have an index named detect_time on start_time
+            self._conn.execute("drop index if exists detect_time")
+            self._conn.execute("create index detect_time on blocks(detect_time)")
+            self._conn.execute("create index if not exists start_time on blocks(start_time)")
+            self._conn.execute("create index if not exists end_time on blocks(end_time)")
+            self._conn.execute("pragma user_version={0}".format(self.schemaVersion))
+        self._logger.info("Updated the schema of the blocks database from version {0} to {1}".format(
+            version, self.schemaVersion))
 
     def _getIPsPerBL(self):
         #        self._xapi.op("<show><system><state><filter>cfg.general.max-address</filter></state></system></show>")
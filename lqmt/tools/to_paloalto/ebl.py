@@ -0,0 +1,114 @@
+import logging
+import os
+
+
+class BlockListFiles(object):
+    """
+    The external block list (EBL) files of a Palo Alto device. The IPs written to each file are kept, so that a sync
+    only rewrites the files whose content changed. An IP stays in the file it was written to until it is removed, and
+    new IPs are added to the first files that have room for them.
+    A rewritten file is marked as pending with a marker file next to it until its block list was refreshed on the
+    device, so a failed refresh is retried by the next commit or the next run.
+    """
+
+    # suffix of the marker files of the block lists that have to be refreshed
+    pendingSuffix = ".refresh"
+
+    # the device doesn't accept empty EBL files, so an empty file contains this single valid IP
+    placeholder = "131.131.131.131"
+
+    def __init__(self, files, ipsPerFile):
+        """
+        :param files: Paths of the EBL files
+        :param ipsPerFile: Maximum number of IPs in a file
+        """
+        self._logger = logging.getLogger("LQMT.PaloAlto.EBL")
+        self._files = files
+        self._ipsPerFile = ipsPerFile
+        # set of IPs of each file, read from the files by the first sync
+        self._contents = None
+
+    def _read(self, path):
+        """Return the set of IPs in the file, or None if it can't be read"""
+        try:
+            with open(path) as f:
+                ips = set(line.strip() for line in f)
+        except OSError:
+            return None
+        ips.discard("")
+        if ips == {self.placeholder}:
+            return set()
+        return ips
+
+    def _write(self, path, ips):
+        """Replace the file atomically, so the device never fetches a partially written file"""
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            if ips:
+                f.write("\n".join(sorted(ips)))
+                f.write("\n")
+            else:
+                f.write(self.placeholder + "\n")
+        os.replace(tmp, path)
+
+    def sync(self, ips):
+        """
+        Update the files to contain the blocked IPs.
+        :param ips: Iterable of all blocked IPs
+        :return: Returns the sorted indexes of the files that were rewritten
+        """
+        if self._contents is None:
+            self._contents = [self._read(path) for path in self._files]
+        current = set(ips)
+        changed = set()
+        placed = set()
+        for index, content in enumerate(self._contents):
+            if content is None:
+                # missing files are written even if they stay empty
+                content = self._contents[index] = set()
+                changed.add(index)
+            # IPs that are no longer blocked, IPs that are already in an earlier file and IPs beyond the capacity
+            # of the file are removed. The latter are added back to files with room below.
+            stale = content - current
+            stale.update(content & placed)
+            if len(content) - len(stale) > self._ipsPerFile:
+                stale.update(sorted(content - stale)[self._ipsPerFile:])
+            if stale:
+                content -= stale
+                changed.add(index)
+            placed.update(content)
+
+        added = sorted(current - placed)
+        for index, content in enumerate(self._contents):
+            if not added:
+                break
+            room = self._ipsPerFile - len(content)
+            if room > 0:
+                content.update(added[:room])
+                del added[:room]
+                changed.add(index)
+        if added:
+            self._logger.warning("{0} blocked IPs don't fit into the block list files".format(len(added)))
+
+        for index in sorted(changed):
+            # the marker is created first, so the refresh isn't missed if LQMT stops after the file was written
+            self._markPending(index)
+            self._write(self._files[index], self._contents[index])
+        return sorted(changed)
+
+    def _markPending(self, index):
+        with open(self._files[index] + self.pendingSuffix, "w"):
+            pass
+
+    def pending(self):
+        """
+        :return: Returns the sorted indexes of the files whose block lists have to be refreshed
+        """
+        return [index for index, path in enumerate(self._files) if os.path.exists(path + self.pendingSuffix)]
+
+    def refreshed(self, index):
+        """Called once the block list of the file was refreshed on the device"""
+        try:
+            os.remove(self._files[index] + self.pendingSuffix)
+        except FileNotFoundError:
+            pass
@@ -4,6 +4,7 @@ import pan.xapi
 import time
 import datetime
 from lqmt.lqm.data import AlertAction
+from lqmt.tools.to_paloalto.ebl import BlockListFiles
 
 class Block:
     """Class to hold information on blocks/revokes"""
@@ -27,6 +28,9 @@ class Block:
     def getDuration(self):
         return self._duration
 
+    def setDuration(self, duration):
+        self._duration=duration
+
 class ToPaloAlto(Tool):
     '''
     '''
@@ -47,9 +51,9 @@ class ToPaloAlto(Tool):
         self._logger = logging.getLogger("LQMT.PaloAlto.{0}".format(self.getName()))
         self._blocks=dict()
         self._revokes=dict()
-        # max per query controls the number of ips per query that are handled.  This is done to ensure that sqlite
-        # and python don't have issues if there a significant number of ips to process at once 
-        self._maxPerQuery=100
+        self._blockFiles=BlockListFiles(self._config.getBlockFiles(),self._config.getIPsPerFile())
+        # time of the last commit that failed to refresh a block list, None if all block lists were refreshed
+        self._refreshFailed=None
 
     def initialize(self):
         super().initialize()
@@ -63,19 +67,75 @@ class ToPaloAlto(Tool):
         elif (action==AlertAction.get('Revoke')):
             self._revoke(alert)
 
+    def process_batch(self, batch):
+        """Process all alerts of an AlertBatch. Blocks and revokes are taken straight from the columns of the batch."""
+        block=AlertAction.get('Block')
+        revoke=AlertAction.get('Revoke')
+        rows=zip(batch.getActions(),batch.getIndicatorTypes(),batch.getColumn('indicator'),
+                 batch.getColumn('detectedTime'),batch.getColumn('duration1'))
+        for i,(action,indicatorType,indicator,detected,duration) in enumerate(rows):
+            self._totalProcessed=self._totalProcessed+1
+            if(action == block):
+                # same as Alert.getIPToBlock
+                if(indicatorType == "IPv4Address" and indicator != None):
+                    self._blockAddr(indicator,detected,duration)
+                else:
+                    self.unprocessed(batch[i])
+            elif(action == revoke):
+                # same as Alert.getIPToRevoke
+                if(indicatorType == "IPv4Address" and indicator != None):
+                    self._revokeAddr(indicator,detected)
+                else:
+                    self.unprocessed(batch[i])
+
     def commit(self):
         """Commit the changes to the device."""
         # update the database with the new blocks/revokes
-        self._updateDB()
+        self.flush()
         # write the blocks to the EBL files
-        self._writeBlocks(self._config.getBlockFiles())
-        for ebl in self._config.getBlockLists():
-            # tell the device to refresh teach EBL
+        self._writeBlocks()
+        blockLists=self._config.getBlockLists()
+        # tell the device to refresh each EBL that changed, or whose refresh failed before
+        self._refreshFailed=None
+        for i in self._blockFiles.pending():
             try:
-                self._xapi.op("request system external-list refresh name \"{0}\"".format(ebl),cmd_xml=True)
+                self._xapi.op("request system external-list refresh name \"{0}\"".format(blockLists[i]),cmd_xml=True)
             except pan.xapi.PanXapiError as exc:
-                self._logger.error("Unable to refresh EBL: {0}".format(ebl))
+                self._logger.error("Unable to refresh EBL: {0}".format(blockLists[i]))
                 self._logger.error(str(exc))
+                self._refreshFailed=time.time()
+            else:
+                self._blockFiles.refreshed(i)
+
+    def nextExpiry(self):
+        """
+        Return the first second at which a block in the database has expired. Block lists whose refresh failed are
+        refreshed again right away.
+        """
+        self._cur.execute("select min(end_time) from blocks")
+        endTime=self._cur.fetchone()[0]
+        if(endTime!=None):
+            # blocks are expired once their end time is in the past
+            endTime=endTime+1
+        if(self._refreshFailed!=None and (endTime==None or self._refreshFailed<endTime)):
+            return self._refreshFailed
+        return endTime
+
+    def expire(self):
+        """
+        Remove the expired blocks and refresh the EBLs they were in. No alerts are pending between two commits.
+        Raises an error if a block list couldn't be refreshed, so the controller retries it later.
+        """
+        self.commit()
+        if(self._refreshFailed!=None):
+            raise pan.xapi.PanXapiError("Unable to refresh the block lists of {0}".format(self.getName()))
+
+    def flush(self):
+        """Write the blocks/revokes collected so far to the database. The EBL files are written by commit."""
+        self._updateDB()
+        # the changes are in the database now, so start collecting the next ones
+        self._blocks=dict()
+        self._revokes=dict()
 
     def cleanup(self):
         self._logger.info("Processed {0} alerts.  New blocks: {1}  Updated Blocks: {2} New revoke: {3} Expired: {4} Pruned: {5}".format(self._totalProcessed,self._totalBlocked,self._totalUpdated,self._totalRevoked,self._totalExpired,self._totalPruned))
@@ -95,33 +155,18 @@ class ToPaloAlto(Tool):
                     del self._revokes[addr]
                 else:
                     del self._blocks[addr]
-        # remove any revoked ips from the database
-        if(len(self._revokes) > 0):
-            todel=[]
-            for r in self._revokes.values():
-                todel.append(r.getAddr())
-            self._totalRevoked=self._deleteIPsFromDB(todel)
-        else:
-            self._totalRevoked=0
         ctime=int(time.time())
-        blocks=0
-        if(len(self._blocks) > 0):
-            # if there are blocks,
-            # first remove any IPs that already are in the DB (so there are no duplicates)
-            # this doesn't currently check to see if an existing block would expire later than a new one 
-            # or if the one already in the database was detected before the one about to be added.
-            todel=[]
-            for b in self._blocks.values():
-                todel.append(b.getAddr())
-            self._totalUpdated=self._deleteIPsFromDB(todel)
-
-            toadd=list(self._blocks.values())
-            # Add the IPs to the DB in _maxPerQuery-sized chunks.
-            while(toadd):
-                thisadd=toadd[:self._maxPerQuery]
-                del toadd[:self._maxPerQuery]
+        # all changes are written in a single transaction, so the database is only synced once per flush
+        with self._conn:
+            # remove any revoked ips from the database
+            if(len(self._revokes) > 0):
+                self._totalRevoked=self._totalRevoked+self._deleteIPsFromDB([r.getAddr() for r in self._revokes.values()])
+            if(len(self._blocks) > 0):
+                # if there are blocks, update the IPs that already are in the DB and add the others (so there are no duplicates)
+                # this doesn't currently check to see if an existing block would expire later than a new one
+                # or if the one already in the database was detected before the one about to be added.
                 parms=[]
-                for b in thisadd:
+                for b in self._blocks.values():
                     # if the end time is None, then it is an infinite block and will not be removed until
                     # it is either revoked or removed due to pruning because there are more IPs than the device can handle
                     dur=b.getDuration()
@@ -129,73 +174,65 @@ class ToPaloAlto(Tool):
                         endTime=None
                     else:
                         endTime=ctime+dur
-                    parms.append( (b.getAddr(),b.getDetectedTime(),ctime,dur,endTime) )
-                self._cur.executemany("insert into blocks (ip,detect_time,start_time,duration,end_time) values (?,?,?,?,?)", parms)
-                blocks=blocks+self._cur.rowcount
-                self._conn.commit()
-        self._totalBlocked=blocks-self._totalUpdated
-
-        # now remove any that have expired
-        self._cur.execute("delete from blocks where end_time < ?",(ctime,))
-        self._conn.commit()
-        self._totalExpired=self._cur.rowcount
-
-        # now that the DB is updated, check to see if it needs to be pruned
-        nr=self._getNumRecs()
-        toPrune=nr - self._config.getMaxIPsToBlock()
-        if(toPrune>0):
-            pm=self._config.getPruneMethod()
-            # got some pruning to do
-            if(pm=='Expiration'):
-                self._pruneByExpiration(toPrune,ctime)
-            elif (pm=='Added'):
-                self._pruneByTimeAdded(toPrune,ctime)
-            elif (pm=='Detected'):
-                self._pruneByTimeDetected(toPrune,ctime)
-        if(toPrune-self._totalPruned > 0):
-            #still have more to prune, so use time added as a fall-back
-            self._logger.info("Primary pruning method did not remove enough.  Using TimeAdded to prune more")
-            tp=self._totalPruned
-            self._pruneByTimeAdded(toPrune-self._totalPruned,ctime)
-            self._totalPruned=self._totalPruned+tp
+                    parms.append( (b.getDetectedTime(),ctime,dur,endTime,b.getAddr()) )
+                self._cur.executemany("update blocks set detect_time=?,start_time=?,duration=?,end_time=? where ip=?", parms)
+                updated=self._cur.rowcount
+                self._cur.executemany("insert or ignore into blocks (detect_time,start_time,duration,end_time,ip) values (?,?,?,?,?)", parms)
+                self._totalUpdated=self._totalUpdated+updated
+                self._totalBlocked=self._totalBlocked+self._cur.rowcount
+
+            # now remove any that have expired
+            self._cur.execute("delete from blocks where end_time < ?",(ctime,))
+            self._totalExpired=self._totalExpired+self._cur.rowcount
+
+            # now that the DB is updated, check to see if it needs to be pruned
+            toPrune=self._getNumRecs() - self._config.getMaxIPsToBlock()
+            if(toPrune>0):
+                pm=self._config.getPruneMethod()
+                # got some pruning to do
+                pruned=0
+                if(pm=='Expiration'):
+                    pruned=self._pruneByExpiration(toPrune,ctime)
+                elif (pm=='Added'):
+                    pruned=self._pruneByTimeAdded(toPrune)
+                elif (pm=='Detected'):
+                    pruned=self._pruneByTimeDetected(toPrune)
+                if(toPrune-pruned > 0):
+                    #still have more to prune, so use time added as a fall-back
+                    self._logger.info("Primary pruning method did not remove enough.  Using TimeAdded to prune more")
+                    pruned=pruned+self._pruneByTimeAdded(toPrune-pruned)
+                self._totalPruned=self._totalPruned+pruned
 
     def _deleteIPsFromDB(self,todel):
-        """Delete the ips specified in todel from the database."""
-        cnt=0
-        #self._maxPerQuery limits the number of items in one deletion as a safeguard against a very large query
-        while(todel):
-            thisdel=todel[:self._maxPerQuery]
-            del todel[:self._maxPerQuery]
-            self._cur.execute("delete from blocks where ip in ('{0}')".format("','".join(thisdel)))
-            self._conn.commit()
-            cnt=cnt+self._cur.rowcount
-        return cnt
+        """Delete the ips specified in todel from the database. The deletes are committed by the caller."""
+        self._cur.executemany("delete from blocks where ip=?", [(ip,) for ip in todel])
+        return self._cur.rowcount
 
     def _pruneByExpiration(self,toPrune,ctime):
             # delete blocks starting from the soonest to expire until we have reached the limit
             todel=[]
             self._logger.warning("Pruning {0} blocks by expiration:".format(toPrune))
-            for r in self._cur.execute("select ip,end_time from blocks where end_time is not null order by end_time limit {0}".format(toPrune)):
+            for r in self._cur.execute("select ip,end_time from blocks where end_time is not null order by end_time limit ?",(toPrune,)).fetchall():
                 todel.append(r[0])
                 expire=datetime.datetime.fromtimestamp(r[1]).strftime("%c")
                 self._logger.warning("ip: {0} expiration: {1}: {2} seconds early".format(r[0],expire,r[1]-ctime))
-            self._totalPruned=self._deleteIPsFromDB(todel)
+            return self._deleteIPsFromDB(todel)
 
     def _pruneByTimeAdded(self,toPrune):
             # delete blocks starting from the least recently added until we have reached the limit
             todel=[]
-            for r in self._cur.execute("select ip,start_time,end_time from blocks order by start_time limit {0}".format(toPrune)):
+            for r in self._cur.execute("select ip,start_time,end_time from blocks order by start_time limit ?",(toPrune,)).fetchall():
                 todel.append(r[0])
-                self._logger.warning("Prune: removing block before expiration for ip: {0} expiration: {1}".format(r[0],r[1]))
-            self._totalPruned=self._deleteIPsFromDB(todel)
+                self._logger.warning("Prune: removing block before expiration for ip: {0} expiration: {1}".format(r[0],r[2]))
+            return self._deleteIPsFromDB(todel)
 
     def _pruneByTimeDetected(self,toPrune):
             # delete blocks starting from the least recently detected until we have reached the limit
             todel=[]
-            for r in self._cur.execute("select ip,detect_time,end_time from blocks order by detect_time limit {0}".format(toPrune)):
+            for r in self._cur.execute("select ip,detect_time,end_time from blocks order by detect_time limit ?",(toPrune,)).fetchall():
                 todel.append(r[0])
-                self._logger.warning("Prune: removing block before expiration for ip: {0} expiration: {1}".format(r[0],r[1]))
-            self._totalPruned=self._deleteIPsFromDB(todel)
+                self._logger.warning("Prune: removing block before expiration for ip: {0} expiration: {1}".format(r[0],r[2]))
+            return self._deleteIPsFromDB(todel)
 
     def _getNumRecs(self):
         """Return the number of records in the database"""
@@ -205,21 +242,25 @@ class ToPaloAlto(Tool):
 
     def _revoke(self,alert):
         """Revoke the block of the IP specified in the alert."""
-        addr=alert.getIPToBlock()
+        addr=alert.getIPToRevoke()
         if(addr == None):
             # this alert will be unprocessed - put it in the unprocessed file
             self.unprocessed(alert)
             return
+        return self._revokeAddr(addr,alert.getDetectedTime())
+
+    def _revokeAddr(self,addr,detected):
+        """Revoke the block of the ip."""
         if(self.is_valid_ipv4(addr) or self.is_valid_ipv6(addr)):
-            if (addr in self._blocks.keys()):
+            if (addr in self._revokes.keys()):
                 r=self._revokes[addr]
-                # if tyis is a newer revoke than one already in the list
-                if(alert.getDetectedTime() > r.getDetectedTime() ):
+                # if this is a newer revoke than one already in the list
+                if(int(detected) > r.getDetectedTime() ):
                     # update the detected time
-                    r.setDetectedTime(alert.getDetectedTime())
+                    r.setDetectedTime(int(detected))
             else:
                 #otherwise just add it to the revoke list
-                self._revokes[addr]=Block(addr,alert.getDetectedTime(),None)
+                self._revokes[addr]=Block(addr,detected,None)
             return True
         return False
 
@@ -230,57 +271,38 @@ class ToPaloAlto(Tool):
             # this alert will be unprocessed - put it in the unprocessed file
             self.unprocessed(alert)
             return
+        return self._blockAddr(addr,alert.getDetectedTime(),alert.getDuration1())
+
+    def _blockAddr(self,addr,detected,duration):
+        """Block the ip for the duration (the alert's duration1)."""
         if(self.is_valid_ipv4(addr) or self.is_valid_ipv6(addr)):
             if (addr in self._blocks.keys()):
                 # is this a newer block than we have seen during this round of processing?
                 b=self._blocks[addr]
-                if(int(alert.getDetectedTime()) > b.getDetectedTime() ):
+                if(int(detected) > b.getDetectedTime() ):
                     # if so, update the detected time and duration
-                    b.setDetectedTime(alert.getDetectedTime())
-                    b.setDuration(self._getDuration(alert))
+                    b.setDetectedTime(int(detected))
+                    b.setDuration(self._getDuration(duration))
             else:
                 #otherwise add it to the blocks list
-                self._blocks[addr]=Block(addr,alert.getDetectedTime(),self._getDuration(alert))
+                self._blocks[addr]=Block(addr,detected,self._getDuration(duration))
             return True
         return False
 
-    def _getDuration(self, alert):
+    def _getDuration(self, duration):
         """Return duration.  If the duration is 0, that means infintite.  If it is None, then use the default duration"""
-        duration=alert.getDuration1()
         if(duration==None):
             return self._config.getDefaultDuration()
-        if(int(duration)==0):
+        # the parsers return the duration as a string
+        duration=int(duration)
+        if(duration==0):
             return None
         return duration
 
-    def _writeBlocks(self,ipFiles):
-        """Write the blocked IPs to the files.  At this point, the database should have no more than can be handled by the device."""
-        ipsPerFile=self._config.getIPsPerFile()
-        blockFiles=self._config.getBlockFiles()
-        curFileIdx=0
-        f=None
-        n=0
-        # retrieve the blocked ips from the database
-        for r in self._cur.execute("select ip from blocks order by ip"):
-            #strat a new file if necessary
-            if(n>=ipsPerFile or f==None):
-                if(f!=None):
-                    f.close()
-                    curFileIdx=curFileIdx+1
-                f=open(blockFiles[curFileIdx],"w")
-                n=0
-            f.write(r[0]+"\n")
-            n=n+1
-        if(f!=None):
-            f.close()
-            curFileIdx=curFileIdx+1
-
-        # The palo alto Dynamic Block Lists mechanism doesn't like non-existent or empty EBL files, so make sure there is a "dummy" ip in all that would be empty
-        for fn in blockFiles[curFileIdx:]:
-            # the PA will have issues with a file with no entries, so write a single VALID ip
-            f=open(fn,"w")
-            f.write("131.131.131.131\n")
-            f.close()
+    def _writeBlocks(self):
+        """Write the blocked IPs to the EBL files.  At this point, the database should have no more than can be handled by the device.
+        Only the files whose IPs changed are rewritten and marked to be refreshed."""
+        return self._blockFiles.sync(r[0] for r in self._cur.execute("select ip from blocks"))
 
     def fileBegin(self):
         # No special processing when a new file is started
@@ -1,4 +1,5 @@
 import logging
+from lqmt.lqm.exceptions import ConfigurationError
 from lqmt.lqm.tool import ToolConfig
 
 
@@ -10,10 +11,28 @@ class SplunkConfig(ToolConfig):
 
         self.host = self.validation('host', str, required=True)
         self.port = self.validation('port', int, default=8089)
-        self.username = self.validation('username', str, required=True)
-        self.password = self.validation('password', str, required=True)
+        self.hec_token = self.validation('hec_token', str, default="")
+        # the HTTP Event Collector is authenticated with its token
+        self.username = self.validation('username', str, required=not self.hec_token, default="")
+        self.password = self.validation('password', str, required=not self.hec_token, default="")
         self.cert_check = self.validation('cert_check', bool, default=True)
         self.source = self.validation('source', str, default="lqmt")
         self.sourcetype = self.validation('sourcetype', str, required=True)
         self.index = self.validation('index', str, required=False)
         self.fields = self.validation('fields', list, default=["all"])
+        self.batch_size = self.validation('batch_size', int, default=100)
+        self.batch_timeout = self.validation('batch_timeout', int, default=1000)
+        self.compress = self.validation('compress', bool, default=False)
+        self.max_in_flight = self.validation('max_in_flight', int, default=4)
+        self.max_retries = self.validation('max_retries', int, default=3)
+        self.retry_backoff = self.validation('retry_backoff', int, default=500)
+        self.request_timeout = self.validation('request_timeout', int, default=30)
+        self.spool_dir = self.validation('spool_dir', str, default="splunk-spool-{0}".format(self.getName()))
+        for key in ('batch_size', 'max_in_flight', 'request_timeout'):
+            if getattr(self, key) < 1:
+                raise ConfigurationError("The '{0}' parameter of the Splunk tool '{1}' must be at least 1".format(
+                    key, self.getName()))
+        for key in ('max_retries', 'retry_backoff'):
+            if getattr(self, key) < 0:
+                raise ConfigurationError("The '{0}' parameter of the Splunk tool '{1}' can't be negative".format(
+                    key, self.getName()))
@@ -1,7 +1,14 @@
+import gzip
+import json
 import logging
+import os
 import requests
+import threading
 import time
+import uuid
 import xmltodict
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
 from xml.etree import ElementTree
 
 
@@ -47,8 +54,10 @@ class ApiHandler:
     """
 
     def __init__(self, host=None, port=None, username=None, password=None, splunk_token="", cert_check=True,
-                 source=None, sourcetype=None, index=None, timeout_duration=0):
+                 source=None, sourcetype=None, index=None, timeout_duration=0, hec_token=None, compress=False,
+                 pool_size=10, request_timeout=None):
         self._messages_processed = 0
+        self._lock = threading.Lock()
         self._logger = logging.getLogger("LQMT.Splunk.ApiCaller")
         self.host = host
         self.port = port
@@ -59,20 +68,34 @@ class ApiHandler:
         self.url = self.host + ":" + str(self.port)
         self.username = username
         self.password = password
-        self.requests = requests
+        # requests are sent through a session, so connections are kept alive and reused
+        self.requests = requests.Session()
+        self.requests.mount("https://", HTTPAdapter(pool_maxsize=pool_size))
+        self.requests.mount("http://", HTTPAdapter(pool_maxsize=pool_size))
+        self.request_timeout = request_timeout
         self.authenticated = False
         self.splunk_token = {'Authorization': splunk_token}
         self.service = {
             'auth': "/services/auth/login/",
             'stream': "/services/receivers/stream/",
+            'collector': "/services/collector/event",
             'search': "/services/search/jobs"}
         self.headers = {}
+        self.hec_token = hec_token
+        self.compress = compress
+        self.event_fields = {key: value for key, value in
+                             (('source', source), ('sourcetype', sourcetype), ('index', index)) if value}
         self.job_id = ""
         self.response = ""
         self.query = None
         self.timeout_duration = timeout_duration
         self.dispatch_states = ['QUEUED', 'PARSING', 'RUNNING', 'PAUSED', 'FINALIZING', 'FAILED', 'DONE']
 
+        # The HTTP Event Collector is authenticated with its token instead of a session token
+        if self.hec_token:
+            self.headers.update({'Authorization': "Splunk " + self.hec_token})
+            self.authenticated = True
+
         # Call authentication function when class object is created.
         self.authenticate()
 
@@ -82,7 +105,7 @@ class ApiHandler:
 
     def __exit__(self):
         self._logger.debug("Total messages processed: {0}".format(self._messages_processed))
-        self.requests.post(url=self.url, headers={'Connection': 'close'}, verify=self.cert_check)
+        self.requests.close()
 
     def authenticate(self):
         """
@@ -156,6 +179,40 @@ class ApiHandler:
         #                    "\nURL Used: '{0}'; "
         #                    "\nStatus code returned: '{1}';".format(url, r.status_code))
 
+    def send_batch(self, messages):
+        """
+        Method for sending several messages to Splunk in a single request. If a HEC token was provided, the messages
+        are sent as events to the HTTP Event Collector. Otherwise they are streamed to the receivers endpoint, one
+        message per line.
+        :param messages: List of messages to be sent to splunk
+        """
+        if not messages:
+            return
+
+        if not self.authenticated:
+            self.authenticate()
+
+        headers = self.headers
+        if self.hec_token:
+            url = self.url + self.service['collector']
+            data = "".join(json.dumps(dict(self.event_fields, event=message)) for message in messages)
+        else:
+            url = self.url + self.service['stream'] + "?{0}{1}{2}".format(self.source, self.sourcetype, self.index)
+            data = "\n".join(messages) + "\n"
+        data = data.encode("utf-8")
+        if self.compress:
+            data = gzip.compress(data)
+            headers = dict(headers, **{'Content-Encoding': 'gzip'})
+
+        r = self.requests.post(url, data=data, headers=headers, verify=self.cert_check, timeout=self.request_timeout)
+
+        # If parsed successfully, tally and move on. Otherwise raise status
+        if r.ok:
+            with self._lock:
+                self._messages_processed += len(messages)
+        else:
+            r.raise_for_status()
+
     def send_post_request(self, message, url):
 
         self.response = self.requests.post(url, data=message, headers=self.headers, verify=self.cert_check)
@@ -193,7 +250,7 @@ class ApiHandler:
         if self.response.ok:
             while job_status != "DONE":
                 self._logger.debug("Fetching Job - Job still pending.")
-                status_response = requests.get(self.url + "/services/search/jobs/" + job_id + "/",
+                status_response = self.requests.get(self.url + "/services/search/jobs/" + job_id + "/",
                                                auth=(self.username, self.password),
                                                verify=self.cert_check)
 
@@ -217,7 +274,7 @@ class ApiHandler:
 
         self._logger.debug("Job Finished. Fetching results.")
         payload = {'output_mode': 'csv'}
-        job_result = requests.get(self.url + "/services/search/jobs/" + job_id + "/results/",
+        job_result = self.requests.get(self.url + "/services/search/jobs/" + job_id + "/results/",
                                   auth=(self.username, self.password), verify=False, params=payload)
 
         return job_result
@@ -254,4 +311,201 @@ class ApiHandler:
             if '@name' in item:
                 if item['@name'] == "dispatchState":
                     value = item['#text']
-        return value
\ No newline at end of file
+        return value
+
+
+class BatchDelivery(object):
+    """
+    Delivers batches of messages on a pool of threads, so a slow or unavailable Splunk instance doesn't hold up the
+    toolchain. Failed batches are retried with exponential backoff. Batches that still fail, and batches for which no
+    thread frees up in time, are written to a spool directory. Spooled batches are sent again once a delivery succeeds
+    and by the next run.
+    After a batch failed all its retries, Splunk is considered unavailable: batches are spooled without being sent,
+    except for one probe batch every probe_interval seconds, until a batch is delivered again.
+    """
+
+    def __init__(self, send, max_in_flight=4, max_retries=3, backoff=0.5, spool_dir=None, slot_timeout=1,
+                 probe_interval=30):
+        """
+        :param send: Function sending a list of messages, raising an exception if they weren't accepted
+        :param max_in_flight: Maximum number of batches being sent at once
+        :param max_retries: Number of times a failed batch is sent again
+        :param backoff: Seconds to wait before the first retry. The wait doubles with each retry.
+        :param spool_dir: Directory failed batches are written to, or None to drop them. Without a spool directory,
+        submitting a batch waits until a thread is free.
+        :param slot_timeout: Seconds to wait for a free thread before a batch is spooled
+        :param probe_interval: Seconds between two probes while Splunk is unavailable
+        """
+        self._logger = logging.getLogger("LQMT.Splunk.Delivery")
+        self._send = send
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._spool_dir = spool_dir
+        self._slot_timeout = slot_timeout
+        self._probe_interval = probe_interval
+        # one more thread than slots, for replaying the spool
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight + 1)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._futures = set()
+        self._lock = threading.Lock()
+        # when the next probe may be sent while Splunk is unavailable, or None while it is available
+        self._next_probe = None
+        self._replaying = False
+        # whether batches were spooled since the last replay
+        self._spooled = False
+        self.failed = 0
+
+    def submit(self, messages, spool_file=None):
+        """
+        Sends the messages on the pool. While Splunk is unavailable or no thread frees up within slot_timeout seconds,
+        the messages are spooled instead.
+        :param messages: List of messages
+        :param spool_file: Spool file the messages were read from. It is removed once they were delivered.
+        """
+        if not self._isAvailable():
+            self._fail(messages, spool_file)
+            return
+        if not self._slots.acquire(timeout=self._slot_timeout if self._spool_dir else None):
+            self._logger.warning("No free thread to send {0} messages to Splunk".format(len(messages)))
+            self._fail(messages, spool_file)
+            return
+        self._run(self._deliver, messages, spool_file, slot=True)
+
+    def _run(self, function, *args, slot=False):
+        try:
+            future = self._executor.submit(function, *args)
+        except Exception:
+            if slot:
+                self._slots.release()
+            raise
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(lambda f: self._done(f, slot))
+
+    def _done(self, future, slot):
+        with self._lock:
+            self._futures.discard(future)
+        if slot:
+            self._slots.release()
+
+    def _isAvailable(self):
+        """Return whether batches may be sent. While Splunk is unavailable, this is True once per probe_interval."""
+        with self._lock:
+            if self._next_probe is None:
+                return True
+            if time.monotonic() >= self._next_probe:
+                self._next_probe = time.monotonic() + self._probe_interval
+                return True
+            return False
+
+    def _deliver(self, messages, spool_file):
+        """Send the messages, retrying failures. Returns whether they were delivered."""
+        for attempt in range(self._max_retries + 1):
+            try:
+                self._send(messages)
+            except Exception as e:
+                with self._lock:
+                    unavailable = self._next_probe is not None
+                if attempt < self._max_retries and not unavailable:
+                    delay = self._backoff * 2 ** attempt
+                    self._logger.warning("Sending {0} messages to Splunk failed ({1}). Retrying in {2} seconds".format(
+                        len(messages), e, delay))
+                    time.sleep(delay)
+                else:
+                    self._logger.error("Sending {0} messages to Splunk failed: {1}".format(len(messages), e))
+                    break
+            else:
+                if spool_file is not None:
+                    os.remove(spool_file)
+                self._available()
+                return True
+        with self._lock:
+            if self._next_probe is None:
+                self._logger.warning("Splunk is unavailable. Spooling batches until it accepts a probe batch again.")
+                self._next_probe = time.monotonic() + self._probe_interval
+        self._fail(messages, spool_file)
+        return False
+
+    def _available(self):
+        """Called after a batch was delivered. Replays the batches spooled while Splunk was unavailable or busy."""
+        with self._lock:
+            if self._next_probe is not None:
+                self._logger.info("Splunk is available again")
+            self._next_probe = None
+            replay = self._spooled and not self._replaying
+        if replay:
+            self.replay()
+
+    def _fail(self, messages, spool_file):
+        # messages replayed from the spool stay in their spool file
+        if spool_file is not None:
+            return
+        with self._lock:
+            self.failed += len(messages)
+        self._spool(messages)
+
+    def _spool(self, messages):
+        if not self._spool_dir:
+            self._logger.error("Dropped {0} messages. No spool directory is configured.".format(len(messages)))
+            return
+        try:
+            os.makedirs(self._spool_dir, 0o755, True)
+            path = os.path.join(self._spool_dir, "{0}-{1}.json".format(int(time.time()), uuid.uuid4().hex))
+            with open(path + ".tmp", "w") as f:
+                json.dump(messages, f)
+            os.replace(path + ".tmp", path)
+            with self._lock:
+                self._spooled = True
+            self._logger.info("Spooled {0} messages to {1}".format(len(messages), path))
+        except OSError as e:
+            self._logger.error("Unable to spool {0} messages: {1}".format(len(messages), e))
+
+    def replay(self):
+        """
+        Sends the batches in the spool directory again on the pool, one after the other.
+        :return: Returns the number of spool files found
+        """
+        if not self._spool_dir or not os.path.isdir(self._spool_dir):
+            return 0
+        paths = [os.path.join(self._spool_dir, name) for name in sorted(os.listdir(self._spool_dir))
+                 if name.endswith(".json")]
+        with self._lock:
+            if not paths or self._replaying:
+                return 0
+            self._replaying = True
+            self._spooled = False
+        self._logger.info("Replaying {0} spooled batches".format(len(paths)))
+        self._run(self._replay, paths)
+        return len(paths)
+
+    def _replay(self, paths):
+        try:
+            for path in paths:
+                if not self._isAvailable():
+                    break
+                try:
+                    with open(path) as f:
+                        messages = json.load(f)
+                except FileNotFoundError:
+                    continue
+                except (OSError, ValueError) as e:
+                    self._logger.error("Unable to read spool file {0}: {1}".format(path, e))
+                    continue
+                if not self._deliver(messages, path):
+                    break
+        finally:
+            with self._lock:
+                self._replaying = False
+
+    def wait(self):
+        """Waits until all submitted batches were delivered or spooled"""
+        while True:
+            with self._lock:
+                futures = set(self._futures)
+            if not futures:
+                return
+            wait(futures)
+
+    def close(self):
+        self.wait()
+        self._executor.shutdown()
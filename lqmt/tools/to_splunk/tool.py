@@ -1,8 +1,9 @@
 import logging
 import requests
+import threading
 from lqmt.lqm.tool import Tool
 from lqmt.lqm.data import AlertAction
-from lqmt.tools.to_splunk.splunk_api import ApiHandler, create_message
+from lqmt.tools.to_splunk.splunk_api import ApiHandler, BatchDelivery, create_message
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 
 
@@ -28,20 +29,81 @@ class ToSplunk(Tool):
             cert_check=self._config.cert_check,
             source=self._config.source,
             sourcetype=self._config.sourcetype,
-            index=self._config.index
+            index=self._config.index,
+            hec_token=self._config.hec_token,
+            compress=self._config.compress,
+            pool_size=self._config.max_in_flight,
+            request_timeout=self._config.request_timeout
         )
+        self._delivery = BatchDelivery(
+            self.handler.send_batch,
+            max_in_flight=self._config.max_in_flight,
+            max_retries=self._config.max_retries,
+            backoff=self._config.retry_backoff / 1000,
+            spool_dir=self._config.spool_dir
+        )
+        # messages waiting to be sent, and the timer sending them once the first of them waited batch_timeout
+        self._batch = []
+        self._timer = None
+        # the timer sends the batch from its own thread
+        self._lock = threading.Lock()
 
     def initialize(self):
         super().initialize()
+        # deliver the batches that failed in previous runs
+        self._delivery.replay()
 
     def process(self, alert):
         """
-        Process function. Handles the processing of data for the tool. 
+        Process function. Handles the processing of data for the tool. Messages are sent in batches of batch_size
+        messages, or once the first message of a batch waited for batch_timeout milliseconds, also when no further
+        alerts arrive.
         """
-        self.handler.send_message(create_message(alert))
+        message = create_message(alert)
+        with self._lock:
+            self._batch.append(message)
+            if len(self._batch) == 1:
+                self._timer = threading.Timer(self._config.batch_timeout / 1000, self._batchTimedOut, (self._batch,))
+                self._timer.daemon = True
+                self._timer.start()
+            if len(self._batch) < self._config.batch_size:
+                return
+            batch = self._takeBatch()
+        self._delivery.submit(batch)
+
+    def _batchTimedOut(self, batch):
+        with self._lock:
+            # the batch may have been sent while the timer was waiting for the lock
+            if batch is not self._batch:
+                return
+            batch = self._takeBatch()
+        self._delivery.submit(batch)
+
+    def _takeBatch(self):
+        """Returns the waiting messages and starts a new batch. Called with the lock held."""
+        batch, self._batch = self._batch, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _sendBatch(self):
+        with self._lock:
+            batch = self._takeBatch()
+        if batch:
+            self._delivery.submit(batch)
+
+    def flush(self):
+        self._sendBatch()
 
     def commit(self):
-        pass
+        # wait until the batches were delivered or spooled, so the alert files can be post-processed
+        self._sendBatch()
+        self._delivery.wait()
 
     def cleanup(self):
+        self._sendBatch()
+        self._delivery.close()
+        if self._delivery.failed:
+            self._logger.warning("{0} messages couldn't be sent to Splunk".format(self._delivery.failed))
         self.handler.__exit__()
@@ -3,30 +3,49 @@ from .whitelist import Whitelist
 class DomainWL(Whitelist):
     """Domain whitelist.
     This class stores its whitelisted domains in the domian table.  If a domain is in the table it is whitelisted.
+    Lookups are done against an in-memory trie of the domains' labels in reverse order (com -> example -> www), so a
+    lookup only walks as many nodes as the indicator has labels.
     """
+    _table="domain"
+    _columns=("domain",)
+
+    # key marking a trie node as the end of a whitelisted domain. Labels are never None, so it can't collide.
+    _END=None
+
+    def __init__(self):
+        self._trie={}
+
+    @staticmethod
+    def _labels(domain):
+        """Return the labels of the domain, top-level label first. Domains are case insensitive."""
+        return reversed(domain.strip().strip('.').lower().split('.'))
 
     @staticmethod
     def getCreateTable():
         """Create the table to hold the domains"""
         return "create table domain (domain char(256))"
 
-    @staticmethod
-    def storeDB(conn,domains):
-        """Overwrite the domains in the table with the specified domains (string) in the database."""
+    def load(self,conn):
+        """Load the domains from the table into the trie"""
         c=conn.cursor()
-        vals=[]
-        for domain in domains:
-            vals.append( (domain,) )
-        c.execute("delete from domain")
-        c.executemany("insert into domain(domain) values (?)",iter(vals))
+        c.execute("select domain from domain")
+        trie={}
+        for rec in c.fetchall():
+            node=trie
+            for label in DomainWL._labels(rec[0]):
+                node=node.setdefault(label,{})
+            node[DomainWL._END]=True
         c.close()
+        self._trie=trie
 
     def isWhitelisted(self,conn,indicatorType,indicator):
         """Return whether or not the indicator of type indicatorType is whitelisted by this whitelist.
         This will check for all subdomains as well."""
-        c=conn.cursor()
-        # sqlite: || is concatenation
-        c.execute("select domain from domain where ? like '%' || domain",(("%"+indicator),))
-        rec=c.fetchone()
-        c.close()
-        return rec != None
+        node=self._trie
+        for label in DomainWL._labels(indicator):
+            node=node.get(label)
+            if node is None:
+                return False
+            if DomainWL._END in node:
+                return True
+        return False
@@ -3,30 +3,27 @@ from .whitelist import Whitelist
 class HostWL(Whitelist):
     """Domain whitelist.
     This class stores its whitelisted hosts in the host table.  If a host is in the table it is whitelisted.
+    Lookups are done against an in-memory set of the hosts.
     """
+    _table="host"
+    _columns=("host",)
+
+    def __init__(self):
+        self._hosts=set()
+
     @staticmethod
     def getCreateTable():
         """Create the table to hold the hostnames"""
         return "create table host (host char(256))"
 
-    @staticmethod
-    def storeDB(conn,hosts):
-        """Overwrite the hosts in the table with the specified hosts (string) in the database."""
+    def load(self,conn):
+        """Load the hosts from the table into memory"""
         c=conn.cursor()
-        vals=[]
-        for host in hosts:
-            vals.append( (host,) )
-        c.execute("delete from host")
-        c.executemany("insert into host(host) values (?)",iter(vals))
+        c.execute("select host from host")
+        self._hosts=set(rec[0] for rec in c.fetchall())
         c.close()
 
     def isWhitelisted(self,conn,indicatorType,indicator):
         """Return whether or not the indicator of type indicatorType is whitelisted by this whitelist.
-        This checks the indicator against the hosts in the table and requires an exact match to be considered whitelisted."""
-        c=conn.cursor()
-        c.execute("select host from host where host=?",(indicator,))
-        rec=c.fetchone()
-        c.close()
-        return rec != None
-
-        
\ No newline at end of file
+        This checks the indicator against the loaded hosts and requires an exact match to be considered whitelisted."""
+        return indicator in self._hosts
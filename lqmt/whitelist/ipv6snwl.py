@@ -1,26 +1,26 @@
-from .whitelist import Whitelist
-from netaddr import IPNetwork,IPSet
+from .subnetwl import SubnetWL
+from netaddr import IPNetwork
 
-class IPv6SubnetWL(Whitelist):
+class IPv6SubnetWL(SubnetWL):
     """IPv6 Subnet whitelist.
-    This class is not yet implemented
+    This class stores its whitelisted IPv6 subnets in the ipv6sn table.
+    This stores the CIDR and the max and min ip specified by the CIDR. IPv6 addresses don't fit into an SQLite integer,
+    so the max and min ip are stored as zero padded hex strings, which sort the same way as the addresses.
     """
+    _table="ipv6sn"
 
     @staticmethod
     def getCreateTable():
-        return "create table ipv6sn (cidr char(40), minip integer(60), maxip integer(60) )"
+        """Create the table to hold the subnet information"""
+        return "create table ipv6sn (cidr char(43), minip char(32), maxip char(32) )"
 
     @staticmethod
-    def storeDB(conn,subnets):
-        """Overwrite the subnet info in the table with the specified subnets (string) in the database."""
-        c = conn.cursor()
-        vals = []
-        for sn in subnets:
-            cidr = IPNetwork(sn);
-            vals.append((str(cidr), cidr.first, cidr.last))
-        c.execute("delete from ipv6sn")
-        c.executemany("insert into ipv6sn(cidr,minip,maxip) values (?,?,?)", iter(vals))
-        c.close()
+    def _encodeBound(ip):
+        return "{0:032x}".format(ip)
 
-    def isWhitelisted(self,conn,indicatorType,indicator):
-        raise NotImplementedError
+    @staticmethod
+    def _bounds(rec):
+        # derived from the CIDR, since tables created by older versions declare the bounds as integers and SQLite may
+        # have converted the stored hex strings
+        cidr=IPNetwork(rec[0])
+        return cidr.first,cidr.last
@@ -14,6 +14,7 @@ import io
 
 import sqlite3
 import toml
+from urllib.request import pathname2url
 
 sys.path.append('tpl/toml')
 
@@ -35,10 +36,21 @@ class IndicatorTypes(object):
 class MasterWhitelist(object):
     """The master whitelist object.
     This class is responsible for maintaining the database of all the whitelists
-    and it is the central point for checking for whitelisted indicators
+    and it is the central point for checking for whitelisted indicators.
+    The database is the persistent store of the whitelists. Checks are done against in-memory indexes of each whitelist
+    that are loaded from the database when the master whitelist is created.
     """
+    # sections of the whitelist file and the whitelists they are stored in
+    _sections = [('Domain', DomainWL), ('Host', HostWL), ('IPv4Address', IPv4WL), ('IPv4Subnet', IPv4SubnetWL),
+                 ('IPv6Address', IPv6WL), ('IPv6Subnet', IPv6SubnetWL), ('URL', URLWL)]
+    # version of the database schema and content, stored in its user_version. Version 1 stores the IPv6Subnet section.
+    _schemaVersion = 1
 
-    def __init__(self, configData=None, configFile=None, configStr=None):
+    def __init__(self, configData=None, configFile=None, configStr=None, readOnly=False):
+        """
+        :param readOnly: Only load the whitelists from the existing database, without updating it from the whitelist
+        file. Used by the processes of the parser pool, once the controller's whitelist updated the database.
+        """
         self._logger = logging.getLogger("LQMT.Whitelist")
         if configData is not None:
             self._loadConfig(configData)
@@ -47,13 +59,22 @@ class MasterWhitelist(object):
         elif configStr is not None:
             self._loadConfigFromStr(configStr)
 
-        self._updateDB()
+        if readOnly:
+            self.conn = sqlite3.connect("file:{0}?mode=ro".format(pathname2url(os.path.abspath(self.db))), uri=True)
+        else:
+            self._updateDB()
         self._whitelists = {IndicatorTypes.ipv4: IPv4WL(), IndicatorTypes.ipv6: IPv6WL(),
                             IndicatorTypes.ipv4subnet: IPv4SubnetWL(), IndicatorTypes.ipv6subnet: IPv6SubnetWL(),
                             IndicatorTypes.domain: DomainWL(), IndicatorTypes.host: HostWL(),
                             IndicatorTypes.url: URLWL()}
+        self._loadWhitelists()
         self._initMapping()
 
+    def _loadWhitelists(self):
+        """Load all whitelists into memory so whitelist checks don't need to query the database"""
+        for wl in self._whitelists.values():
+            wl.load(self.conn)
+
     def _initMapping(self):
         """Create the mapping of indicator types to the types of whitelists they will be checked against"""
         self._indicatorMapping = {
@@ -81,41 +102,56 @@ class MasterWhitelist(object):
         self.db = configData['dbfile']
         self.whitelistFile = configData['whitelist']
 
+    def getConfig(self):
+        """
+        :return: Returns the configuration needed to recreate this whitelist, e.g. in another process
+        """
+        return {'dbfile': self.db, 'whitelist': self.whitelistFile}
+
     def _updateDB(self):
         """
         Updates the whitelist database if it detects a change in the whitelist.txt file.
+        The file is only hashed if its modification time or size changed since the database was last updated.
         """
         if not os.path.exists(self.db):
             # Create it if not already there
             self._createDB()
         self.conn = sqlite3.connect(self.db)
+        self._upgradeDB()
         connection = self.conn.cursor()
+        # compare the modification time and size of the whitelist text file against the file last loaded
+        stat = os.stat(self.whitelistFile)
+        connection.execute("select mtime, size from fileinfo")
+        rec = connection.fetchone()
+        if rec is not None and rec[0] == stat.st_mtime_ns and rec[1] == stat.st_size:
+            connection.close()
+            return
         # compute the md5 hash of the whitelist text file
         md5_hash = hashlib.md5()
-        wlf = open(self.whitelistFile, "rb")
-        md5_hash.update(wlf.read())
+        with open(self.whitelistFile, "rb") as wlf:
+            md5_hash.update(wlf.read())
         md5 = md5_hash.hexdigest()
         # and compare it against the md5 of the last file loaded
         connection.execute("select md5 from md5")
         rec = connection.fetchone()
-        connection.close()
         if rec is None or rec[0] != md5:
             # if it is not the same, then reload the whitelist file
             self._reloadDB(md5)
+        connection.execute("delete from fileinfo")
+        connection.execute("insert into fileinfo values (?, ?)", (stat.st_mtime_ns, stat.st_size))
+        self.conn.commit()
+        connection.close()
 
     def _reloadDB(self, md5):
         """
-        Reloads all database tables with new values from the whitelist.txt file
+        Updates all database tables with the values from the whitelist.txt file. Only the values that were added to or
+        removed from a section of the file are written.
         :param md5: used to update the md5 table with the newly calculated md5
         """
         whitelist = self._loadWhitelistFile()
-        DomainWL.storeDB(self.conn, whitelist['Domain'])
-        HostWL.storeDB(self.conn, whitelist['Host'])
-        IPv4WL.storeDB(self.conn, whitelist['IPv4Address'])
-        IPv4SubnetWL.storeDB(self.conn, whitelist['IPv4Subnet'])
-        IPv6WL.storeDB(self.conn, whitelist['IPv6Address'])
-        # IPv6SubnetWL.storeDB(self.conn,whitelist['IPv6Subnet'])
-        URLWL.storeDB(self.conn, whitelist['URL'])
+        for section, wl in self._sections:
+            added, removed = wl.storeDB(self.conn, whitelist.get(section, []))
+            self._logger.debug("Whitelist section {0}: {1} added, {2} removed".format(section, added, removed))
         connection = self.conn.cursor()
         connection.execute("delete from md5")
         connection.execute("insert into md5 values (?)", (md5,))
@@ -156,6 +192,22 @@ class MasterWhitelist(object):
         connection.close()
         conn.close()
 
+    def _upgradeDB(self):
+        """Adds the tables and indexes missing from databases created by older versions"""
+        connection = self.conn.cursor()
+        connection.execute("create table if not exists fileinfo (mtime integer, size integer)")
+        for section, wl in self._sections:
+            connection.execute(wl.getCreateIndex())
+        connection.execute("pragma user_version")
+        version = connection.fetchone()[0]
+        if version < self._schemaVersion:
+            # older versions didn't store all sections, so the whitelist file has to be reloaded even if it didn't change
+            connection.execute("delete from fileinfo")
+            connection.execute("delete from md5")
+            connection.execute("pragma user_version={0}".format(self._schemaVersion))
+        self.conn.commit()
+        connection.close()
+
     def isWhitelisted(self, indicatorType, indicator):
         """Return whether or not the specified indicator/indicatorType is whitelisted"""
         rv = False
@@ -172,3 +224,22 @@ class MasterWhitelist(object):
                     self._logger.error("Exception occurred while performing whitelist check")
                     self._logger.error(str(e))
         return rv
+
+    def areWhitelisted(self, indicators):
+        """
+        Checks a batch of indicators, e.g. all indicators of a parsed alert file, against the whitelists.
+        Indicators that occur more than once in the batch are only checked once.
+        :param indicators: List of (indicatorType, indicator) tuples
+        :return: Returns a list with whether or not each of the indicators is whitelisted. Indicators of a type without
+        whitelist are not whitelisted.
+        """
+        checked = {}
+        rv = []
+        for key in indicators:
+            whitelisted = checked.get(key)
+            if whitelisted is None:
+                indicatorType, indicator = key
+                whitelisted = indicatorType in self._indicatorMapping and self.isWhitelisted(indicatorType, indicator)
+                checked[key] = whitelisted
+            rv.append(whitelisted)
+        return rv
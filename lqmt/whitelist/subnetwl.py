@@ -0,0 +1,63 @@
+from bisect import bisect_right
+from .whitelist import Whitelist
+from netaddr import IPNetwork
+
+class SubnetWL(Whitelist):
+    """Abstract superclass for the subnet whitelists.
+    Subclasses store their whitelisted subnets in the table named by _table. This stores the CIDR and the max and min ip
+    specified by the CIDR.
+    Lookups are done with a binary search over the address ranges loaded from the table. Overlapping and adjacent
+    subnets are merged into a single range, so an indicator is whitelisted if it falls into exactly one range.
+    """
+    _columns=("cidr","minip","maxip")
+
+    def __init__(self):
+        self._starts=[]
+        self._ends=[]
+
+    @staticmethod
+    def _encodeBound(ip):
+        """Return the value stored in the database for the integer value of an address"""
+        return ip
+
+    @staticmethod
+    def _bounds(rec):
+        """Return the integer min and max ip of a (cidr,minip,maxip) record of the table"""
+        return rec[1],rec[2]
+
+    @staticmethod
+    def _key(value):
+        return str(IPNetwork(value))
+
+    @classmethod
+    def _row(cls,key):
+        cidr=IPNetwork(key)
+        return key,cls._encodeBound(cidr.first),cls._encodeBound(cidr.last)
+
+    def load(self,conn):
+        """Load the subnets from the table into memory as a sorted list of non-overlapping address ranges."""
+        c=conn.cursor()
+        c.execute("select cidr,minip,maxip from {0}".format(self._table))
+        starts=[]
+        ends=[]
+        for minip,maxip in sorted(self._bounds(rec) for rec in c.fetchall()):
+            if ends and minip<=ends[-1]+1:
+                # overlaps or is adjacent to the previous range, so extend it
+                ends[-1]=max(ends[-1],maxip)
+            else:
+                starts.append(minip)
+                ends.append(maxip)
+        c.close()
+        self._starts=starts
+        self._ends=ends
+
+    def isWhitelisted(self,conn,indicatorType,indicator):
+        """Return whether or not the indicator of type indicatorType is whitelisted by this whitelist.
+        If the indicator is a single address, it is whitelisted if it is included in any CIDR.
+        If the indicator is a network spec, it is whitelisted if all of the addresses it represents are included in any CIDR
+        """
+        sn=IPNetwork(indicator)
+        # find the last range starting at or before the first address of the indicator. Since the ranges are merged,
+        # the indicator is whitelisted only if that range also contains its last address.
+        i=bisect_right(self._starts,sn.first)-1
+        return i>=0 and sn.last<=self._ends[i]
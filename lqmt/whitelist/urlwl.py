@@ -1,31 +1,28 @@
 from .whitelist import Whitelist
 
 class URLWL(Whitelist):
-    """IPv4 address whitelist.
-    This class stores its whitelisted URLs  in the url table.
+    """URL whitelist.
+    This class stores its whitelisted URLs  in the url table. Lookups are done against an in-memory set of the URLs.
     """
+    _table="url"
+    _columns=("url",)
+
+    def __init__(self):
+        self._urls=set()
 
     @staticmethod
     def getCreateTable():
         """Create the table to hold the URLs"""
         return "create table url (url char(256))"
 
-    @staticmethod
-    def storeDB(conn,urls):
-        """Overwrite the URLs in the table with the specified URLs (string) in the database."""
+    def load(self,conn):
+        """Load the URLs from the table into memory"""
         c=conn.cursor()
-        vals=[]
-        for url in urls:
-            vals.append( (url,) )
-        c.execute("delete from url")
-        c.executemany("insert into url(url) values (?)",iter(vals))
+        c.execute("select url from url")
+        self._urls=set(rec[0] for rec in c.fetchall())
         c.close()
 
     def isWhitelisted(self,conn,indicatorType,indicator):
         """Return whether or not the indicator of type indicatorType is whitelisted by this whitelist.
-        This checks the indicator against the URLs in the table and requires an exact match to be considered whitelisted."""
-        c=conn.cursor()
-        c.execute("select url from url where url=?",(indicator,))
-        rec=c.fetchone()
-        c.close()
-        return rec != None
+        This checks the indicator against the loaded URLs and requires an exact match to be considered whitelisted."""
+        return indicator in self._urls
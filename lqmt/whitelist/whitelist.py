@@ -1,9 +1,51 @@
-
 class Whitelist(object):
     """
     Abstract superclass for all whitelist types
     """
-    
+    # table the whitelisted values are stored in and its columns. The first column holds the whitelisted value.
+    _table = None
+    _columns = ()
+
+    @staticmethod
+    def _key(value):
+        """Return the value as it is stored in the first column of the table"""
+        return value
+
+    @classmethod
+    def _row(cls, key):
+        """Return the values of all columns of the table for the stored value key"""
+        return (key,)
+
+    @classmethod
+    def getCreateIndex(cls):
+        """Create the index on the stored values, used when removing values from the table"""
+        return "create index if not exists {0}_{1} on {0}({1})".format(cls._table, cls._columns[0])
+
+    @classmethod
+    def storeDB(cls, conn, values):
+        """
+        Update the table to hold the specified values (string) in the database. Only the values that were added or
+        removed since the table was last updated are written.
+        :return: Returns a tuple of the number of added and removed values
+        """
+        c = conn.cursor()
+        c.execute("select {0} from {1}".format(cls._columns[0], cls._table))
+        stored = set(rec[0] for rec in c.fetchall())
+        wanted = set(cls._key(value) for value in values)
+        added = wanted - stored
+        removed = stored - wanted
+        c.executemany("delete from {0} where {1}=?".format(cls._table, cls._columns[0]),
+                      ((key,) for key in removed))
+        c.executemany("insert into {0}({1}) values ({2})".format(cls._table, ",".join(cls._columns),
+                                                                 ",".join("?" * len(cls._columns))),
+                      (cls._row(key) for key in added))
+        c.close()
+        return len(added), len(removed)
+
+    def load(self, conn):
+        """Load the whitelisted values from the database into memory, so that lookups don't need to query the database"""
+        pass
+
     def isWhitelisted(self,conn,indicatorType,indicator):
         """Return whether or not the indicator of type indicatorType is whitelisted by this whitelist"""
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError